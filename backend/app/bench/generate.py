@@ -0,0 +1,179 @@
+"""
+Fill the schema of db/init.sql with synthetic Jira data for benchmarks.
+
+    cd backend/app
+    python -m bench.generate --issues 20000 --truncate
+
+Issues are spread over the projects of config.PRODUCT_MAPPING. Every issue walks
+a Markov chain of statuses with log-normal dwell times, gets reassigned a few
+times, and stories collect code-review results whenever they enter review.
+For a given --seed the data only depends on the day it is generated. The
+tables derived from the data and the result cache are emptied. Restart the
+backend afterwards: its startup extends work_segments and rebuilds
+interval_working_hours and status_daily_counts.
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+import asyncpg
+import config
+
+PROJECTS = [project for projects in config.PRODUCT_MAPPING.values() for project in projects]
+
+OWNERS = [f"Developer {n:02d}" for n in range(1, 31)]
+REVIEWERS = OWNERS[:10]
+
+# status -> [(next status, probability)]; issues stop in a status without successors
+STORY_CHAIN = {
+    "To Do": [("in progress", 0.92), ("Closed", 0.08)],
+    "in progress": [("Code Review", 0.75), ("Blocked", 0.12), ("To Do", 0.13)],
+    "Blocked": [("in progress", 1.0)],
+    "Code Review": [("Test", 0.8), ("in progress", 0.2)],
+    "Test": [("Closed", 0.85), ("in progress", 0.15)],
+}
+BUG_CHAIN = {
+    "Open": [("in progress", 0.9), ("Closed", 0.1)],
+    "in progress": [("Resolved", 0.85), ("Open", 0.15)],
+    "Resolved": [("Closed", 0.8), ("Reopened", 0.2)],
+    "Reopened": [("in progress", 1.0)],
+}
+# Median hours spent in a status before moving on
+DWELL_HOURS = {"To Do": 60, "Open": 30, "in progress": 20, "Blocked": 30, "Code Review": 6, "Test": 10, "Resolved": 24, "Reopened": 4}
+
+STORY_POINTS = [1, 2, 3, 5, 8, 13]
+PRIORITIES = [("Highest", 0.05), ("High", 0.2), ("Medium", 0.5), ("Low", 0.2), ("Lowest", 0.05)]
+ROOT_CAUSES = ["Requirement", "Design", "Coding", "Configuration", "Test Environment", "Third Party", None]
+CODE_REVIEW_RESULTS = [("Passed", 0.7), ("Not Passed", 0.3)]
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def walk(rng, chain, first_status, created, now):
+    """Status changes (from, to, at) of one issue; stops at a final status or at now."""
+    changes = [(None, first_status, created)]
+    status, at = first_status, created
+    while status in chain:
+        at = (at + timedelta(hours=rng.lognormvariate(0, 1) * DWELL_HOURS[status])).replace(microsecond=0)
+        if at >= now:
+            break
+        next_status = weighted(rng, chain[status])
+        changes.append((status, next_status, at))
+        status = next_status
+    return changes
+
+
+def generate(issues: int, seed: int, years: float = 2.0):
+    """All rows per table, as lists of tuples in the column order of COLUMNS."""
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=365 * years)
+    rows = {table: [] for table in COLUMNS}
+
+    for n in range(issues):
+        issue_id = str(100000 + n)
+        project = rng.choice(PROJECTS)
+        issue_type = "story" if rng.random() < 0.7 else "bug"
+        created = start + timedelta(seconds=rng.randrange(int((now - start).total_seconds())))
+        owner = rng.choice(OWNERS)
+
+        if issue_type == "story":
+            changes = walk(rng, STORY_CHAIN, "To Do", created, now)
+        else:
+            changes = walk(rng, BUG_CHAIN, "Open", created, now)
+        status = changes[-1][1]
+        resolutiondate = changes[-1][2] if status == "Closed" else None
+
+        rows["issues"].append((
+            issue_id, f"{project}-{n}", f"Synthetic {issue_type} {n}", owner, issue_type, project,
+            created, resolutiondate, "Done" if resolutiondate else None,
+        ))
+        for from_status, to_status, changed_at in changes[1:]:
+            rows["status_history"].append((issue_id, changed_at, from_status, to_status))
+
+        # Reassignments within the issue's lifetime
+        end = resolutiondate or now
+        assignee = rng.choice(OWNERS)
+        for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+            new_assignee = rng.choice(OWNERS)
+            changed_at = created + (end - created) * rng.random()
+            rows["assignee_history"].append((issue_id, changed_at.replace(microsecond=0), assignee, new_assignee))
+            assignee = new_assignee
+
+        if issue_type == "story":
+            reviews = [
+                (changed_at, weighted(rng, CODE_REVIEW_RESULTS))
+                for _, to_status, changed_at in changes
+                if to_status == "Code Review"
+            ]
+            for changed_at, result in reviews:
+                rows["code_review_history"].append((issue_id, changed_at, result))
+            if reviews:
+                failed = [review for review in reviews if review[1] == "Not Passed"]
+                verdict = failed[-1] if failed else reviews[-1]
+                rows["code_review_verdicts"].append((issue_id, project, verdict[1], verdict[0]))
+            rows["stories"].append((
+                issue_id, rng.choice(STORY_POINTS), status, assignee, rng.choice(REVIEWERS),
+                reviews[-1][1] if reviews else "None",
+            ))
+        else:
+            rows["bugs"].append((issue_id, status, assignee, rng.choice(ROOT_CAUSES), weighted(rng, PRIORITIES)))
+
+    return rows
+
+
+COLUMNS = {
+    "issues": ["issue_id", "key", "summary", "owner", "issue_type", "project", "created", "resolutiondate", "resolution"],
+    "stories": ["issue_id", "story_points", "status", "assignee", "code_reviewer", "code_review_status"],
+    "bugs": ["issue_id", "status", "assignee", "bug_root_cause", "priority"],
+    "status_history": ["issue_id", "changed_at", "from_status", "to_status"],
+    "assignee_history": ["issue_id", "changed_at", "from_assignee", "to_assignee"],
+    "code_review_history": ["issue_id", "changed_at", "code_review_status"],
+    "code_review_verdicts": ["issue_id", "project", "code_review_status", "changed_at"],
+}
+
+# Filled by the backend from the tables above
+DERIVED_TABLES = ["interval_working_hours", "status_daily_counts", "result_cache"]
+
+
+async def load(database_url: str, rows, truncate: bool):
+    connection = await asyncpg.connect(database_url)
+    try:
+        async with connection.transaction():
+            if truncate:
+                await connection.execute(f"TRUNCATE {', '.join(COLUMNS)}")
+            for table, columns in COLUMNS.items():
+                await connection.copy_records_to_table(table, records=rows[table], columns=columns)
+            # Everything derived from the old data goes: the backend rebuilds the
+            # interval and daily count tables at startup when they are empty, and
+            # a new epoch makes running workers drop their cached results too
+            await connection.execute(f"TRUNCATE {', '.join(DERIVED_TABLES)}")
+            await connection.execute(
+                """
+                INSERT INTO data_generations (scope, generation) VALUES ('epoch', 1)
+                ON CONFLICT (scope) DO UPDATE SET generation = data_generations.generation + 1
+                """
+            )
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--issues", type=int, default=10000)
+    parser.add_argument("--years", type=float, default=2.0, help="span of the created dates")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", default=config.DATABASE_URL)
+    parser.add_argument("--truncate", action="store_true", help="empty the tables first")
+    args = parser.parse_args()
+
+    rows = generate(args.issues, args.seed, args.years)
+    asyncio.run(load(args.database_url, rows, args.truncate))
+    print(", ".join(f"{table}: {len(records)}" for table, records in rows.items()))
+
+
+if __name__ == "__main__":
+    main()
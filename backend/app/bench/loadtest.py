@@ -0,0 +1,242 @@
+"""
+Drive the analytics endpoints of a running backend and write a latency report.
+
+    cd backend/app
+    python -m bench.loadtest --base-url http://localhost:8000 --concurrency 8 \
+        --requests 200 --output bench-$(git rev-parse --short HEAD).json \
+        --compare bench-previous.json
+
+Each endpoint gets --requests requests from --concurrency workers. The report
+holds p50/p95/p99 latency, throughput and errors per endpoint, plus the peak
+RSS (VmHWM) of the backend process when it runs on this machine (--pid, or
+found by its uvicorn command line). With --cold every request carries a
+distinct date_to, so the result cache and conditional GETs never hit.
+
+Latencies and throughput only count 200 responses. An endpoint whose warm-up
+request fails is not measured; it is reported with its warm-up error, and the
+run exits with status 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import httpx
+
+ENDPOINTS = [
+    ("/average-times", {"limit": 1000}),
+    ("/average-times/summary", {}),
+    ("/stories", {}),
+    ("/code-review-history", {}),
+    ("/timestatus/stories", {}),
+    ("/timestatus/bugs", {}),
+    ("/timestatus/weekly", {}),
+    ("/bugs/created-vs-resolved", {"date_from": "{year_ago}", "date_to": "{today}", "bucket": "week"}),
+    ("/metrics/bugs", {"dimension": ["project", "priority"], "bucket": "month"}),
+    ("/bugs/bugs-per-day", {}),
+    ("/bugs/bugs-per-week", {}),
+    ("/bugsproduct/bugs-per-day", {}),
+    ("/bugsrootcause/rootcause", {}),
+    ("/bugsrootcauseresolution/rootcausewithrd", {}),
+    ("/bugspriorityproject/priority", {}),
+    ("/flow/lead-time", {"dimension": ["product"], "bucket": "quarter"}),
+    ("/flow/cycle-time", {"dimension": ["product", "issue_type"]}),
+]
+
+# Endpoints whose date_to filter can be varied to defeat caching
+DATE_FILTERED = {"/average-times", "/average-times/summary", "/stories", "/code-review-history",
+                 "/timestatus/stories", "/timestatus/bugs", "/timestatus/weekly", "/metrics/bugs",
+                 "/flow/lead-time", "/flow/cycle-time"}
+
+
+def request_params(path, params, cold, rng):
+    today = datetime.now().date()
+    params = {
+        key: value.format(today=today, year_ago=today - timedelta(days=365)) if isinstance(value, str) else value
+        for key, value in params.items()
+    }
+    if cold and path in DATE_FILTERED:
+        params["date_to"] = (datetime.now() + timedelta(days=1, seconds=rng.randrange(10**6))).isoformat()
+    return params
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    index = (len(values) - 1) * q
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+def rounded(value):
+    return round(value, 2) if value is not None else None
+
+
+async def run_endpoint(client, path, params, requests, concurrency, cold, rng):
+    """Latency percentiles and throughput of the successful (200) responses."""
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(request_params(path, params, cold, rng))
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            query = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=query)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if response.status_code != 200:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": rounded(percentile(latencies, 0.50)),
+        "p95_ms": rounded(percentile(latencies, 0.95)),
+        "p99_ms": rounded(percentile(latencies, 0.99)),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+def find_backend_pid():
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ")
+        except OSError:
+            continue
+        if b"uvicorn" in cmdline and b"main:app" in cmdline:
+            return int(pid)
+    return None
+
+
+def memory_kb(pid):
+    """Peak (VmHWM) and current (VmRSS) resident set size of a local process, in kB."""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmHWM", "VmRSS"):
+                    memory[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, previous, threshold):
+    """Print p95 and throughput per endpoint next to a previous report; flag regressions."""
+    print(f"{'endpoint':45} {'p95 ms':>18} {'rps':>16}")
+    for path, result in report["endpoints"].items():
+        if result.get("p95_ms") is None:
+            print(f"{path:45} {'failed':>18}")
+            continue
+        before = previous["endpoints"].get(path)
+        if before is None or before.get("p95_ms") is None:
+            print(f"{path:45} {result['p95_ms']:>18} {result['throughput_rps']:>16}")
+            continue
+        change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(
+            f"{path:45} {before['p95_ms']:>8} -> {result['p95_ms']:<8}"
+            f" {before['throughput_rps']:>6} -> {result['throughput_rps']:<6} {change:+.0f}%{flag}"
+        )
+
+
+async def warm_up(client, path, params):
+    """None when the endpoint answers 200, otherwise what went wrong."""
+    try:
+        response = await client.get(path, params=params)
+    except httpx.HTTPError as error:
+        return f"{type(error).__name__}: {error}"
+    if response.status_code != 200:
+        return f"HTTP {response.status_code}"
+    return None
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    endpoints = [(path, params) for path, params in ENDPOINTS if not args.endpoint or path in args.endpoint]
+    pid = args.pid or find_backend_pid()
+    report = {
+        "label": args.label or git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "cold": args.cold,
+        "endpoints": {},
+    }
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for path, params in endpoints:
+            # One warm-up request so connection setup isn't measured; an endpoint
+            # that fails it would only measure how fast errors come back
+            warmup_error = await warm_up(client, path, request_params(path, params, args.cold, rng))
+            if warmup_error:
+                report["endpoints"][path] = {"requests": 0, "errors": 1, "warmup_error": warmup_error}
+                print(f"{path:45} skipped, warm-up failed: {warmup_error}")
+                continue
+            result = await run_endpoint(client, path, params, args.requests, args.concurrency, args.cold, rng)
+            report["endpoints"][path] = result
+            print(f"{path:45} p50 {result['p50_ms']!s:>8} p95 {result['p95_ms']!s:>8} p99 {result['p99_ms']!s:>8} ms"
+                  f"  {result['throughput_rps']:>7} rps  {result['errors']} errors")
+    if pid:
+        memory = memory_kb(pid)
+        report["server_rss_peak_kb"] = memory.get("VmHWM")
+        report["server_rss_kb"] = memory.get("VmRSS")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--endpoint", action="append", help="only these paths (repeatable)")
+    parser.add_argument("--cold", action="store_true", help="vary date_to so caches never hit")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--pid", type=int, help="backend process for the RSS measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", help="report label, defaults to the git commit")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p95 increase (%%) flagged as regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    if "server_rss_peak_kb" in report:
+        print(f"backend peak RSS: {report['server_rss_peak_kb']} kB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f), args.threshold)
+    if any("warmup_error" in result for result in report["endpoints"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
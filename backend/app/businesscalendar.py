@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import numpy as np
+import config
+from intervalcache import invalidate_days
+
+
+def _seconds(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 3600 + int(minutes) * 60
+
+
+def _to_datetime64(values):
+    """
+    Convert timestamps to naive datetime64[ns]. Time-zone aware input is
+    converted to UTC first, matching pd.to_datetime(..., utc=True) in the routers.
+    """
+    import pandas as pd
+
+    values = pd.DatetimeIndex(pd.to_datetime(values))
+    if values.tz is not None:
+        values = values.tz_convert(None)
+    return values.to_numpy(dtype="datetime64[ns]")
+
+
+class BusinessCalendar:
+    """
+    Working time definition (workday, breaks, weekend, holidays) plus a
+    cumulative working-seconds index with one entry per day.
+
+    cumulative[i] is the working time of all days before first_day + i, so the
+    working time up to an instant is one index lookup plus the worked part of
+    its own day, and any interval is two lookups and a subtraction.
+    """
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        day_start, day_end = (_seconds(value) for value in settings["workday"])
+        breaks = sorted((_seconds(start), _seconds(end)) for start, end in settings.get("breaks", []))
+
+        # Working windows of a business day, in seconds since midnight
+        self.windows = []
+        current = day_start
+        for break_start, break_end in breaks:
+            if break_start > current:
+                self.windows.append((current, min(break_start, day_end)))
+            current = max(current, break_end)
+        if current < day_end:
+            self.windows.append((current, day_end))
+        self.seconds_per_day = sum(end - start for start, end in self.windows)
+
+        self.weekmask = settings.get("weekmask", "Mon Tue Wed Thu Fri")
+        self.holidays = np.array(sorted(settings.get("holidays", {})), dtype="datetime64[D]")
+        self.version = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+
+        first_year = int(str(self.holidays.min())[:4]) if len(self.holidays) else 2024
+        last_year = int(str(self.holidays.max())[:4]) if len(self.holidays) else 2024
+        self._build_index(np.datetime64(f"{first_year}-01-01"), np.datetime64(f"{last_year + 1}-01-01"))
+
+    def _build_index(self, first_day, end_day):
+        first_day = first_day.astype("datetime64[D]")
+        days = np.arange(first_day, end_day.astype("datetime64[D]") + 1, dtype="datetime64[D]")
+        workday = np.is_busday(days, weekmask=self.weekmask, holidays=self.holidays)
+        cumulative = np.concatenate(([0], np.cumsum(workday * self.seconds_per_day)))[:-1]
+        self.first_day, self.workday, self.cumulative = first_day, workday, cumulative
+
+    def _ensure_range(self, first_day, last_day):
+        end_day = self.first_day + len(self.cumulative) - 1
+        if first_day < self.first_day or last_day > end_day:
+            self._build_index(min(first_day, self.first_day), max(last_day, end_day))
+
+    def seconds_into_day(self, time_of_day):
+        """Working seconds elapsed on a business day up to the given time of day (seconds)."""
+        elapsed = np.zeros_like(time_of_day, dtype=float)
+        for window_start, window_end in self.windows:
+            elapsed += np.clip(time_of_day, window_start, window_end) - window_start
+        return elapsed
+
+    def working_seconds_at(self, times):
+        """Working seconds between the start of the index and each timestamp in times."""
+        times = np.asarray(times, dtype="datetime64[ns]")
+        days = times.astype("datetime64[D]")
+        if len(days):
+            self._ensure_range(days.min(), days.max())
+        index = (days - self.first_day).astype(np.int64)
+        time_of_day = (times - days) / np.timedelta64(1, "s")
+        return self.cumulative[index] + self.seconds_into_day(time_of_day) * self.workday[index]
+
+    def working_hours(self, start_times, end_times):
+        """
+        Calculate the working hours between start_times[i] and end_times[i],
+        excluding weekends, holidays and breaks. Missing values and intervals
+        that end before they start count as 0.
+        """
+        start = _to_datetime64(start_times)
+        end = _to_datetime64(end_times)
+        valid = ~(np.isnat(start) | np.isnat(end)) & (end > start)
+        hours = np.zeros(len(start))
+        if valid.any():
+            seconds = self.working_seconds_at(end[valid]) - self.working_seconds_at(start[valid])
+            hours[valid] = seconds / 3600.0
+        return hours
+
+    def day_segments(self, first_day, last_day):
+        """
+        Working-time segments (start, end, working seconds before start) for every
+        business day in [first_day, last_day], in order.
+        """
+        first_day = np.datetime64(first_day, "D")
+        last_day = np.datetime64(last_day, "D")
+        self._ensure_range(first_day, last_day)
+        offset = (first_day - self.first_day).astype(int)
+        days = np.arange(first_day, last_day + 1, dtype="datetime64[D]")
+        segments = []
+        for day, workday, before in zip(days, self.workday[offset:], self.cumulative[offset:]):
+            if not workday:
+                continue
+            midnight = day.astype("datetime64[s]")
+            before = float(before)
+            for window_start, window_end in self.windows:
+                segments.append((
+                    (midnight + np.timedelta64(window_start, "s")).astype(object),
+                    (midnight + np.timedelta64(window_end, "s")).astype(object),
+                    before,
+                ))
+                before += window_end - window_start
+        return segments
+
+
+# (calendar version, first day, last day) of the work_segments table as last
+# synced by this process
+_segments_cover = None
+
+
+async def _segments_current(connection, calendar: "BusinessCalendar", first_day, last_day) -> bool:
+    current = await connection.fetchrow(
+        "SELECT MIN(segment_start) AS first, MAX(segment_end) AS last, MIN(calendar_version) AS version FROM work_segments"
+    )
+    return (
+        current["version"] == calendar.version
+        and current["first"] is not None
+        and np.datetime64(current["first"], "D") <= first_day
+        and np.datetime64(current["last"], "D") >= last_day - 7
+    )
+
+
+async def sync_work_segments(connection, calendar: "BusinessCalendar"):
+    """
+    Write the calendar into the work_segments table used by the working_hours()
+    SQL function. The table covers the oldest status change up to a year ahead
+    and is only rewritten when the calendar version or the range changed;
+    returns whether it was.
+    """
+    global _segments_cover
+    first_change = await connection.fetchval("SELECT MIN(changed_at) FROM status_history")
+    today = np.datetime64("today", "D")
+    first_day = min(np.datetime64(first_change, "D") if first_change else today, calendar.first_day)
+    last_day = today + 366
+
+    if await _segments_current(connection, calendar, first_day, last_day):
+        _segments_cover = (calendar.version, first_day, last_day)
+        return False
+
+    segments = calendar.day_segments(first_day, last_day)
+    async with connection.transaction():
+        # Workers starting together must not interleave their rewrites, and the
+        # ones that waited find the table already rewritten
+        await connection.execute("SELECT pg_advisory_xact_lock(hashtext('work_segments'))")
+        if await _segments_current(connection, calendar, first_day, last_day):
+            _segments_cover = (calendar.version, first_day, last_day)
+            return False
+
+        # Days whose working windows differ between the stored and the new calendar;
+        # only cached intervals touching those days have to be recomputed
+        old_segments = {
+            (row["segment_start"], row["segment_end"])
+            for row in await connection.fetch("SELECT segment_start, segment_end FROM work_segments")
+        }
+        new_segments = {(start, end) for start, end, _ in segments}
+        changed_days = {start.date() for start, _ in old_segments ^ new_segments}
+
+        await connection.execute("DELETE FROM work_segments")
+        await connection.copy_records_to_table(
+            "work_segments",
+            records=[(start, end, before, calendar.version) for start, end, before in segments],
+            columns=["segment_start", "segment_end", "seconds_before", "calendar_version"],
+        )
+        await invalidate_days(connection, changed_days, calendar.version)
+    _segments_cover = (calendar.version, first_day, last_day)
+    return True
+
+
+async def extend_work_segments(connection, calendar: "BusinessCalendar", first_change):
+    """
+    Make sure work_segments covers the days from first_change up to today
+    before working hours of newly ingested status changes are computed; outside
+    the table working_hours() counts nothing. Syncs call this for every issue,
+    so the range this process last saw is checked before the database.
+    """
+    day = np.datetime64(first_change, "D")
+    if _segments_cover is not None:
+        version, first_day, last_day = _segments_cover
+        if version == calendar.version and first_day <= day and last_day > np.datetime64("today", "D"):
+            return False
+    return await sync_work_segments(connection, calendar)
+
+
+def load_calendar(path: str = None) -> BusinessCalendar:
+    path = path or config.CALENDAR_FILE
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    with open(path, encoding="utf-8") as f:
+        return BusinessCalendar(json.load(f))
+
+
+_calendar = None
+
+
+def get_calendar() -> BusinessCalendar:
+    global _calendar
+    if _calendar is None:
+        _calendar = load_calendar()
+    return _calendar
+
+
+def calculate_working_hours(start_times, end_times):
+    """Working hours per interval according to the configured business calendar."""
+    return get_calendar().working_hours(start_times, end_times)
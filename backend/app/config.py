@@ -6,3 +6,36 @@ JIRA_BASE_URL = os.getenv("JIRA_BASE_URL")
 JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
 JIRA_EMAIL = os.getenv("JIRA_EMAIL")
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Product mapping (product -> projects): the seed of the products table in
+# db/init.sql, used when the backend runs without a database
+PRODUCT_MAPPING = {
+    "RTMS": ["FFF", "SLY", "EXW"],
+    "PTM/ROM": ["PB", "SMY"],
+    "RSB/FLEET": ["AAV"],
+    "Integration": ["ISY"]
+}
+
+# Business calendar (working hours, breaks, holidays) used for working-time metrics
+CALENDAR_FILE = os.getenv("CALENDAR_FILE", "calendar.json")
+
+# In-process cache of analytics endpoint results, invalidated by every sync
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024))
+# Upper bound on an entry's age; open status intervals run until NOW()
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 600))
+# Second tier shared by all workers (UNLOGGED result_cache table), and how often
+# a worker reloads the data_generations counters written by syncs in others
+RESULT_CACHE_SHARED = os.getenv("RESULT_CACHE_SHARED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_SHARED_MAX_BYTES = int(os.getenv("RESULT_CACHE_SHARED_MAX_BYTES", 256 * 1024 * 1024))
+RESULT_CACHE_GENERATION_POLL = float(os.getenv("RESULT_CACHE_GENERATION_POLL", 1.0))
+
+# Request profiling: requests / queries slower than these are logged with their
+# timings (and SQL); PROFILE_REQUESTS allows ?profile=1 or X-Profile: 1
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 1000))
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", 500))
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "false").lower() in ("1", "true", "yes")
+
+# asyncpg pool opened at startup; min_size connections are open before /ready
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 5))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 20))
@@ -0,0 +1,49 @@
+import time
+from contextlib import asynccontextmanager
+import asyncpg
+import config
+from profiling import record_query, timed
+
+DATABASE_URL = config.DATABASE_URL
+
+# Connection pool of the running app, opened and closed by the lifespan in
+# main.py. Scripts and tests that never start the app connect per query.
+pool = None
+
+
+async def open_pool():
+    global pool
+    pool = await asyncpg.create_pool(
+        DATABASE_URL, min_size=config.DB_POOL_MIN_SIZE, max_size=config.DB_POOL_MAX_SIZE
+    )
+    return pool
+
+
+async def close_pool():
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+
+@asynccontextmanager
+async def connection():
+    source = pool
+    with timed("db-connect"):
+        conn = await (source.acquire() if source is not None else asyncpg.connect(DATABASE_URL))
+    try:
+        yield conn
+    finally:
+        if source is not None:
+            await source.release(conn)
+        else:
+            await conn.close()
+
+
+async def fetch_from_db(query: str, *args):
+    async with connection() as conn:
+        started = time.perf_counter()
+        with timed("db"):
+            data = await conn.fetch(query, *args)
+        record_query(query, args, len(data), time.perf_counter() - started)
+    return data
@@ -0,0 +1,161 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import Query
+from pydantic import BaseModel
+import config
+
+# Projects per product from the products table, loaded at startup by
+# load_products(). It starts from config.PRODUCT_MAPPING so scripts and tests
+# without a database see the same products. Updated in place, so modules that
+# imported it see the reload.
+PRODUCT_PROJECTS = {}
+
+
+def set_products(project_to_product: dict):
+    PRODUCT_PROJECTS.clear()
+    for project, product in sorted(project_to_product.items()):
+        PRODUCT_PROJECTS.setdefault(product, []).append(project)
+
+
+async def load_products(connection):
+    rows = await connection.fetch("SELECT project, product FROM products")
+    set_products({row["project"]: row["product"] for row in rows})
+
+
+set_products({project: product for product, projects in config.PRODUCT_MAPPING.items() for project in projects})
+
+
+class AnalyticsFilters(BaseModel):
+    project: Optional[List[str]] = None
+    product: Optional[List[str]] = None
+    owner: Optional[List[str]] = None
+    status: Optional[List[str]] = None
+    issue_type: Optional[List[str]] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+
+
+class Page(BaseModel):
+    limit: Optional[int] = None
+    after_changed_at: Optional[datetime] = None
+    after_issue_id: Optional[str] = None
+    after_id: Optional[int] = None
+
+
+def naive(value: Optional[datetime]):
+    """
+    Timestamps are stored without time zone (see parse_jira_timestamp),
+    so drop any offset the client sent before binding it.
+    """
+    return value.replace(tzinfo=None) if value is not None else None
+
+
+def analytics_filters(
+    project: Optional[List[str]] = Query(None),
+    product: Optional[List[str]] = Query(None),
+    owner: Optional[List[str]] = Query(None),
+    status: Optional[List[str]] = Query(None),
+    issue_type: Optional[List[str]] = Query(None),
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
+) -> AnalyticsFilters:
+    return AnalyticsFilters(
+        project=project,
+        product=product,
+        owner=owner,
+        status=status,
+        issue_type=issue_type,
+        date_from=naive(date_from),
+        date_to=naive(date_to),
+    )
+
+
+def keyset_page(
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    after_changed_at: Optional[datetime] = Query(None),
+    after_issue_id: Optional[str] = Query(None),
+    after_id: Optional[int] = Query(None),
+) -> Page:
+    """
+    Keyset pagination on (changed_at, issue_id, id); an issue can change
+    status several times within the same timestamp, so the row id breaks ties.
+    The cursor for the next page is the changed_at/issue_id/id of the last row
+    of the current one.
+    """
+    return Page(
+        limit=limit, after_changed_at=naive(after_changed_at), after_issue_id=after_issue_id, after_id=after_id
+    )
+
+
+def projects_for_products(products):
+    return [project for product in products for project in PRODUCT_PROJECTS.get(product, [])]
+
+
+class WhereClause:
+    """
+    Collects conditions and their asyncpg ($n) parameters. Several clauses
+    of the same query share one params list so the numbering stays consistent.
+    """
+
+    def __init__(self, params=None):
+        self.conditions = []
+        self.params = params if params is not None else []
+
+    def param(self, value):
+        self.params.append(value)
+        return f"${len(self.params)}"
+
+    def add(self, condition: str, *values):
+        # condition uses {} for each bound value, e.g. "i.created >= {}"
+        self.conditions.append(condition.format(*[self.param(value) for value in values]))
+
+    def any_of(self, column: str, values):
+        if values:
+            self.add(f"{column} = ANY({{}})", list(values))
+
+    def sql(self, keyword="WHERE"):
+        if not self.conditions:
+            return ""
+        return f"{keyword} " + " AND ".join(self.conditions)
+
+
+def add_issue_filters(where: WhereClause, filters: AnalyticsFilters, issue="i"):
+    """Issue-level filters; safe to apply below a PARTITION BY issue_id window."""
+    where.any_of(f"{issue}.project", filters.project)
+    add_product_filter(where, filters, f"{issue}.project")
+    where.any_of(f"{issue}.owner", filters.owner)
+    where.any_of(f"{issue}.issue_type", filters.issue_type)
+
+
+def add_product_filter(where: WhereClause, filters: AnalyticsFilters, project_column: str):
+    if filters.product:
+        where.add(f"{project_column} IN (SELECT project FROM products WHERE product = ANY({{}}))", filters.product)
+
+
+def add_date_range(where: WhereClause, filters: AnalyticsFilters, column: str):
+    if filters.date_from is not None:
+        where.add(f"{column} >= {{}}", filters.date_from)
+    if filters.date_to is not None:
+        where.add(f"{column} < {{}}", filters.date_to)
+
+
+def add_keyset(where: WhereClause, page: Page, changed_at: str, issue_id: str, row_id: str):
+    if page.after_changed_at is None:
+        return
+    if page.after_id is None:
+        # Cursor without an id: continue after every row of that changed_at/issue_id
+        where.add(f"({changed_at}, {issue_id}) > ({{}}, {{}})", page.after_changed_at, page.after_issue_id or "")
+    else:
+        where.add(
+            f"({changed_at}, {issue_id}, {row_id}) > ({{}}, {{}}, {{}})",
+            page.after_changed_at, page.after_issue_id or "", page.after_id,
+        )
+
+
+def keyset_order(where: WhereClause, page: Page, changed_at: str, issue_id: str, row_id: str):
+    if page.limit is None and page.after_changed_at is None:
+        return ""
+    sql = f"ORDER BY {changed_at}, {issue_id}, {row_id}"
+    if page.limit is not None:
+        sql += f" LIMIT {where.param(page.limit)}"
+    return sql
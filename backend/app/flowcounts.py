@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import date
+
+# Daily status counts for the cumulative flow diagram.
+#
+# status_daily_counts holds, per project, day and status, the number of issues
+# in that status at the end of the day, from the project's first event up to
+# today. Every status change is a delta (-1 for the status left, +1 for the one
+# entered) to all days from its date on, so new changes are applied as they are
+# ingested without replaying the history; an issue enters its first status on
+# the day it was created. A missing row means zero.
+
+# Events of the whole history; the first status of an issue is the from_status
+# of its earliest change, or its current status when it has none
+ALL_EVENTS = """
+    WITH first_change AS (
+        SELECT DISTINCT ON (issue_id) issue_id, from_status
+        FROM status_history
+        ORDER BY issue_id, changed_at
+    )
+    SELECT i.project, i.created::date AS day, COALESCE(f.from_status, s.status, b.status) AS status, 1 AS delta
+    FROM issues i
+    LEFT JOIN first_change f ON f.issue_id = i.issue_id
+    LEFT JOIN stories s ON s.issue_id = i.issue_id
+    LEFT JOIN bugs b ON b.issue_id = i.issue_id
+    UNION ALL
+    SELECT i.project, sh.changed_at::date, sh.to_status, 1
+    FROM status_history sh JOIN issues i ON i.issue_id = sh.issue_id
+    UNION ALL
+    SELECT i.project, sh.changed_at::date, sh.from_status, -1
+    FROM status_history sh JOIN issues i ON i.issue_id = sh.issue_id
+"""
+
+# Day the counts were last carried forward to, per process
+_extended_through = None
+
+
+async def rebuild_counts(connection):
+    """Recompute the whole table from status_history."""
+    async with connection.transaction():
+        await connection.execute("TRUNCATE status_daily_counts")
+        await connection.execute(
+            f"""
+            WITH daily AS (
+                SELECT project, day, status, SUM(delta) AS delta
+                FROM ({ALL_EVENTS}) events
+                WHERE status IS NOT NULL
+                GROUP BY project, day, status
+            ),
+            series AS (
+                SELECT project, status, MIN(day) AS first_day
+                FROM daily
+                GROUP BY project, status
+            )
+            INSERT INTO status_daily_counts (project, day, status, issues)
+            SELECT s.project, g.day::date, s.status,
+                SUM(COALESCE(d.delta, 0)) OVER (PARTITION BY s.project, s.status ORDER BY g.day)
+            FROM series s
+            CROSS JOIN LATERAL generate_series(
+                s.first_day, GREATEST(CURRENT_DATE, (SELECT MAX(day) FROM daily)), interval '1 day'
+            ) AS g(day)
+            LEFT JOIN daily d ON d.project = s.project AND d.status = s.status AND d.day = g.day::date
+            """
+        )
+
+
+def counts_current() -> bool:
+    return _extended_through == date.today()
+
+
+async def extend_counts(connection):
+    """Carry every project's last day forward to today; a no-op once done today."""
+    global _extended_through
+    if counts_current():
+        return
+    today = date.today()
+    await connection.execute(
+        """
+        INSERT INTO status_daily_counts (project, day, status, issues)
+        SELECT c.project, g.day::date, c.status, c.issues
+        FROM (SELECT project, MAX(day) AS last_day FROM status_daily_counts GROUP BY project) l
+        JOIN status_daily_counts c ON c.project = l.project AND c.day = l.last_day
+        CROSS JOIN LATERAL generate_series(l.last_day + 1, CURRENT_DATE, interval '1 day') AS g(day)
+        ON CONFLICT (project, day, status) DO NOTHING
+        """
+    )
+    _extended_through = today
+
+
+async def backfill_counts(connection):
+    """Build the table on first run (or after it was emptied), then bring it up to today."""
+    empty = await connection.fetchval("SELECT NOT EXISTS (SELECT 1 FROM status_daily_counts)")
+    if empty:
+        await rebuild_counts(connection)
+    await extend_counts(connection)
+
+
+async def apply_status_changes(connection, project: str, changes):
+    """
+    Add newly ingested status changes of a project. changes are
+    (day, from_status, to_status); from_status None when an issue enters its
+    first status.
+    """
+    deltas = defaultdict(int)
+    for day, from_status, to_status in changes:
+        if from_status == to_status:
+            continue
+        if from_status is not None:
+            deltas[(day, from_status)] -= 1
+        if to_status is not None:
+            deltas[(day, to_status)] += 1
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    await extend_counts(connection)
+    days, statuses = zip(*deltas)
+    await connection.execute(
+        """
+        WITH deltas AS (
+            SELECT * FROM unnest($2::date[], $3::text[], $4::int[]) AS d(day, status, delta)
+        ),
+        last_day AS (
+            SELECT GREATEST(CURRENT_DATE, MAX(day)) AS day FROM status_daily_counts WHERE project = $1
+        )
+        INSERT INTO status_daily_counts (project, day, status, issues)
+        SELECT $1, g.day::date, d.status, SUM(d.delta)
+        FROM deltas d
+        CROSS JOIN last_day l
+        CROSS JOIN LATERAL generate_series(d.day, GREATEST(l.day, d.day), interval '1 day') AS g(day)
+        GROUP BY g.day, d.status
+        ON CONFLICT (project, day, status) DO UPDATE
+        SET issues = status_daily_counts.issues + EXCLUDED.issues
+        """,
+        project,
+        list(days),
+        list(statuses),
+        list(deltas.values()),
+    )
@@ -0,0 +1,86 @@
+# Persisted working hours of closed status intervals.
+#
+# A closed interval (one status change to the next) never changes, so its
+# working hours are computed once, stored in interval_working_hours tagged with
+# the calendar version, and summed from there. Only intervals that are still
+# open (ending at NOW()) or not cached yet are computed at request time.
+
+# Closed intervals of status_history, optionally restricted to one issue
+CLOSED_INTERVALS = """
+    SELECT issue_id, changed_at_start, changed_at_end
+    FROM (
+        SELECT
+            issue_id,
+            changed_at AS changed_at_start,
+            LEAD(changed_at) OVER (PARTITION BY issue_id ORDER BY changed_at) AS changed_at_end
+        FROM status_history
+        {where}
+    ) intervals
+    WHERE changed_at_end IS NOT NULL
+"""
+
+
+async def refresh_issue_intervals(connection, issue_id: str, calendar_version: str):
+    """Cache the closed intervals of one issue after its status history changed."""
+    intervals = CLOSED_INTERVALS.format(where="WHERE issue_id = $1")
+    # A late-arriving change can split an interval; drop entries that no longer exist
+    await connection.execute(
+        f"""
+        DELETE FROM interval_working_hours c
+        WHERE c.issue_id = $1
+          AND (c.changed_at_start, c.changed_at_end) NOT IN (
+              SELECT changed_at_start, changed_at_end FROM ({intervals}) current_intervals
+          )
+        """,
+        issue_id,
+    )
+    await connection.execute(
+        f"""
+        INSERT INTO interval_working_hours (issue_id, changed_at_start, changed_at_end, working_hours, calendar_version)
+        SELECT issue_id, changed_at_start, changed_at_end, working_hours(changed_at_start, changed_at_end), $2
+        FROM ({intervals}) current_intervals
+        ON CONFLICT (issue_id, changed_at_start, changed_at_end) DO NOTHING
+        """,
+        issue_id,
+        calendar_version,
+    )
+
+
+async def backfill_intervals(connection, calendar_version: str):
+    """Cache every closed interval that has no entry yet (first run, or after invalidation)."""
+    intervals = CLOSED_INTERVALS.format(where="")
+    return await connection.execute(
+        f"""
+        INSERT INTO interval_working_hours (issue_id, changed_at_start, changed_at_end, working_hours, calendar_version)
+        SELECT t.issue_id, t.changed_at_start, t.changed_at_end, working_hours(t.changed_at_start, t.changed_at_end), $1
+        FROM ({intervals}) t
+        LEFT JOIN interval_working_hours c
+            ON c.issue_id = t.issue_id
+            AND c.changed_at_start = t.changed_at_start
+            AND c.changed_at_end = t.changed_at_end
+        WHERE c.issue_id IS NULL
+        ON CONFLICT (issue_id, changed_at_start, changed_at_end) DO NOTHING
+        """,
+        calendar_version,
+    )
+
+
+async def invalidate_days(connection, days, calendar_version: str):
+    """
+    Drop cached intervals overlapping days whose working time changed, and
+    re-tag the remaining entries, which are still valid, with the new version.
+    """
+    if days:
+        await connection.execute(
+            """
+            DELETE FROM interval_working_hours c
+            USING unnest($1::date[]) AS d(day)
+            WHERE c.changed_at_start < d.day + 1
+              AND c.changed_at_end > d.day
+            """,
+            sorted(days),
+        )
+    await connection.execute(
+        "UPDATE interval_working_hours SET calendar_version = $1 WHERE calendar_version <> $1",
+        calendar_version,
+    )
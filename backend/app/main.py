@@ -1,35 +1,143 @@
-import os
-import requests
-import asyncio
-from fastapi import FastAPI, HTTPException
-import asyncpg
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 from datetime import datetime
-from sqlalchemy import create_engine, select, Table, MetaData
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-import pandas as pd
 from routes.timestatus import router as timestatus_router
 from routes.bugscreatevsresolved import router as bugscreatevsresolved
 from routes.bugscreatevsresolvedproduct import router as bugscreatevsresolvedproduct
 from routes.bugsrootcause import router as bugsrootcause
 from routes.bugspriorityproject import router as bugspriorityproject
 from routes.bugsrootcauseresolution import router as bugsrootcauseresolution
+from routes.metrics import router as metrics_router
+from routes.flow import router as flow_router
 
 
 
 import config
+import db
+from db import fetch_from_db
+from businesscalendar import calculate_working_hours, extend_work_segments, get_calendar, sync_work_segments
+from intervalcache import backfill_intervals, refresh_issue_intervals
+from flowcounts import apply_status_changes, backfill_counts
+from migrations import migrate
+from resultcache import cached, data_generation, etag
+from profiling import log_if_slow, profile_call, profile_requested, start_request
+from fastjson import FastJSONResponse
+from columnar import COLUMNAR_RESPONSES, rows_response
+from filters import (
+    AnalyticsFilters, Page, WhereClause, analytics_filters, keyset_page,
+    add_issue_filters, add_product_filter, add_date_range, add_keyset, keyset_order,
+    load_products, PRODUCT_PROJECTS,
+)
+
+# Database connection pool, set by the lifespan
+db_pool = None
+# Flipped by the lifespan once the pool is open and the calendar tables are in sync
+ready = False
+
+
+async def backfill_derived_tables(connection, segments_rewritten: bool):
+    """
+    Fill interval_working_hours and status_daily_counts where they are
+    incomplete: on the first start, and (for the intervals) after a calendar
+    change dropped entries. Syncs keep both complete otherwise.
+    """
+    async with connection.transaction():
+        # Workers starting together wait for the first one, then find nothing to do
+        await connection.execute("SELECT pg_advisory_xact_lock(hashtext('backfill_derived_tables'))")
+        intervals_empty = await connection.fetchval("SELECT NOT EXISTS (SELECT 1 FROM interval_working_hours)")
+        if segments_rewritten or intervals_empty:
+            await backfill_intervals(connection, get_calendar().version)
+        await backfill_counts(connection)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global db_pool, ready
+    db_pool = await db.open_pool()
+    async with db_pool.acquire() as connection:
+        # Bring databases created from an older init.sql up to date
+        await migrate(connection)
+        # Keep the calendar table behind the working_hours() SQL function in sync
+        segments_rewritten = await sync_work_segments(connection, get_calendar())
+        await backfill_derived_tables(connection, segments_rewritten)
+        await load_products(connection)
+    await data_generation.refresh(force=True)
+    ready = True
+    yield
+    ready = False
+    await db.close_pool()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add Routes to main application
-app.include_router(timestatus_router, prefix="/timestatus", tags=["timestatus"])
-app.include_router(bugscreatevsresolved, prefix="/bugs", tags=["bugs"])
-app.include_router(bugscreatevsresolvedproduct, prefix="/bugsproduct", tags=["bugsproduct"])
-app.include_router(bugsrootcause, prefix="/bugsrootcause", tags=["bugsrootcause"])
-app.include_router(bugsrootcauseresolution, prefix="/bugsrootcauseresolution", tags=["bugsrootcauseresolution"])
-app.include_router(bugspriorityproject, prefix="/bugspriorityproject", tags=["bugspriorityproject"])
+ROUTERS = {
+    "/timestatus": timestatus_router,
+    "/bugs": bugscreatevsresolved,
+    "/bugsproduct": bugscreatevsresolvedproduct,
+    "/bugsrootcause": bugsrootcause,
+    "/bugsrootcauseresolution": bugsrootcauseresolution,
+    "/bugspriorityproject": bugspriorityproject,
+    "/metrics": metrics_router,
+    "/flow": flow_router,
+}
+for prefix, router in ROUTERS.items():
+    app.include_router(router, prefix=prefix, tags=[prefix.lstrip("/")])
+
+# Paths of the cached analytics endpoints, which support conditional GET
+CONDITIONAL_PATHS = None
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    global CONDITIONAL_PATHS
+    if CONDITIONAL_PATHS is None:
+        routes = [("", route) for route in app.routes]
+        routes += [(prefix, route) for prefix, router in ROUTERS.items() for route in router.routes]
+        CONDITIONAL_PATHS = {
+            prefix + route.path for prefix, route in routes if getattr(getattr(route, "endpoint", None), "cache_name", None)
+        }
+    if request.method != "GET" or request.url.path not in CONDITIONAL_PATHS:
+        return await call_next(request)
+
+    # Computed before the endpoint runs; a sync finishing meanwhile only makes the tag stale
+    await data_generation.refresh()
+    tag = etag(request)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or tag in [value.strip() for value in if_none_match.split(",")]):
+        return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept"})
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = tag
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Vary"] = "Accept"
+    return response
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # Outside the conditional GET middleware, so 304s are timed too
+    if profile_requested(request):
+        start_request(profiling=True)
+        return await profile_call(call_next, request)
+    timings = start_request()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = timings.server_timing()
+    log_if_slow(request.method, request.url.path, timings)
+    return response
+
+
+# Compress responses for clients that accept it (outermost middleware); brotli
+# when brotli-asgi is installed, which itself falls back to gzip
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=1000)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Load environment variables
 JIRA_BASE_URL = config.JIRA_BASE_URL
@@ -37,19 +145,19 @@ JIRA_API_TOKEN = config.JIRA_API_TOKEN
 JIRA_EMAIL = config.JIRA_EMAIL
 DATABASE_URL = config.DATABASE_URL
 
-# Database connection pool
-db_pool = None
-
 
-@app.on_event("startup")
-async def startup():
-    global db_pool
-    db_pool = await asyncpg.create_pool(DATABASE_URL)
+@app.get("/ready")
+async def readiness():
+    """200 once the database pool is open and startup has finished, 503 before."""
+    if not ready:
+        raise HTTPException(status_code=503, detail="Starting")
+    return {"status": "ready"}
 
 
-@app.on_event("shutdown")
-async def shutdown():
-    await db_pool.close()
+@app.get("/products", response_model=Dict[str, List[str]])
+async def get_products():
+    """Projects per product, from the products table as loaded at startup."""
+    return PRODUCT_PROJECTS
 
 
 async def insert_issue_data(issue, type, project_key):
@@ -72,7 +180,8 @@ async def insert_issue_data(issue, type, project_key):
             resolution = None
         else:
             resolution = issue["fields"]["resolution"]["name"]
-        await connection.execute(
+        # xmax = 0 only for a freshly inserted row
+        issue_inserted = await connection.fetchval(
             """
             INSERT INTO issues (issue_id, key, summary, owner, issue_type, project, created, resolutiondate, resolution)
             VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
@@ -80,6 +189,7 @@ async def insert_issue_data(issue, type, project_key):
             SET created = EXCLUDED.created, 
                     resolutiondate = EXCLUDED.resolutiondate, 
                     resolution = EXCLUDED.resolution
+            RETURNING xmax = 0
             """,
             issue["id"],
             issue["key"],
@@ -148,6 +258,27 @@ async def insert_issue_data(issue, type, project_key):
                             item["toString"],
                             changed_at,
                         )
+                        # Keep the per-issue verdict current: a "Not Passed" result
+                        # wins over any other, otherwise the most recent one does
+                        await connection.execute(
+                            """
+                            INSERT INTO code_review_verdicts (issue_id, project, code_review_status, changed_at)
+                            VALUES ($1, $2, $3, $4)
+                            ON CONFLICT (issue_id) DO UPDATE
+                            SET project = EXCLUDED.project,
+                                code_review_status = EXCLUDED.code_review_status,
+                                changed_at = EXCLUDED.changed_at
+                            WHERE (CASE WHEN EXCLUDED.code_review_status LIKE '%Not Passed%' THEN 1 ELSE 2 END)
+                                    < (CASE WHEN code_review_verdicts.code_review_status LIKE '%Not Passed%' THEN 1 ELSE 2 END)
+                               OR ((CASE WHEN EXCLUDED.code_review_status LIKE '%Not Passed%' THEN 1 ELSE 2 END)
+                                    = (CASE WHEN code_review_verdicts.code_review_status LIKE '%Not Passed%' THEN 1 ELSE 2 END)
+                                   AND EXCLUDED.changed_at > code_review_verdicts.changed_at)
+                            """,
+                            issue["id"],
+                            project_key,
+                            item["toString"],
+                            changed_at,
+                        )
         elif type == "bug":
             # Insert or update the bug in the bugs table
             customfield_value = (
@@ -177,22 +308,49 @@ async def insert_issue_data(issue, type, project_key):
                 issue["fields"]["priority"]["name"],
             )
 
-        # Insert status history
+        # Insert status history, collecting the changes not seen before
+        status_changes = []
         for history in issue["changelog"]["histories"]:
             for item in history["items"]:
                 if item["field"] == "status":
                     changed_at = parse_jira_timestamp(history["created"])
-                    await connection.execute(
+                    inserted = await connection.fetchval(
                         """
                         INSERT INTO status_history (issue_id, from_status, to_status, changed_at)
                         VALUES ($1, $2, $3, $4)
                         ON CONFLICT (issue_id, from_status, to_status, changed_at) DO NOTHING
+                        RETURNING id
                         """,
                         issue["id"],
                         item["fromString"],
                         item["toString"],
                         changed_at,
                     )
+                    if inserted is not None:
+                        status_changes.append((changed_at, item["fromString"], item["toString"]))
+
+        # Cache working hours of the issue's closed status intervals; only new
+        # changes add or split intervals, and the calendar table behind
+        # working_hours() has to reach back to them first
+        if status_changes:
+            await extend_work_segments(
+                connection, get_calendar(), min(changed_at for changed_at, _, _ in status_changes)
+            )
+            await refresh_issue_intervals(connection, issue["id"], get_calendar().version)
+
+        # Update the daily status counts of the cumulative flow diagram; a new
+        # issue enters the status its first change started from on its creation day
+        if issue_inserted:
+            if status_changes:
+                first_status = min(status_changes, key=lambda change: change[0])[1]
+            else:
+                first_status = issue["fields"]["status"]["name"]
+            status_changes.append((created, None, first_status))
+        await apply_status_changes(
+            connection,
+            project_key,
+            [(changed_at.date(), from_status, to_status) for changed_at, from_status, to_status in status_changes],
+        )
 
         # Insert assignee history
         for history in issue["changelog"]["histories"]:
@@ -207,10 +365,21 @@ async def insert_issue_data(issue, type, project_key):
                         """,
                         issue["id"],
                         item["fromString"] if item["fromString"] is not None else "None",
-                        item["toString"],
+                        item["toString"] if item["toString"] is not None else "None",
                         changed_at,
                     )
 
+
+async def publish_sync(projects):
+    """
+    Mark cached analytics results of the synced projects stale, in every worker.
+    Called once when a sync has finished, so no result is cached under a
+    generation that looks final while the sync is still writing.
+    """
+    if projects:
+        async with db_pool.acquire() as connection:
+            await data_generation.publish(connection, set(projects))
+
 def parse_jira_timestamp(timestamp_str):
     """
     Parse Jira's timestamp string into a naive datetime object.
@@ -221,15 +390,18 @@ def parse_jira_timestamp(timestamp_str):
 
 
 @app.get("/fetch-jira-data/{project_key}/story")
-async def fetch_jira_data(project_key: str):
+async def fetch_jira_data_project_story(project_key: str):
     """
     Fetch all issues from a Jira project and store them in the database.
     """
+    import requests
+
     url = f"{JIRA_BASE_URL}/rest/api/3/search"
     auth = (JIRA_EMAIL, JIRA_API_TOKEN)
     start_at = 0
     max_results = 100
     total_issues = 0
+    synced_projects = set()
 
     while True:
         params = {
@@ -250,6 +422,7 @@ async def fetch_jira_data(project_key: str):
 
         for issue in issues:
             await insert_issue_data(issue, "story", project_key)
+            synced_projects.add(project_key)
 
         # Check if we've fetched all issues
         if start_at + len(issues) >= data.get("total", 0):
@@ -258,18 +431,22 @@ async def fetch_jira_data(project_key: str):
         # Update startAt for the next page
         start_at += max_results
 
+    await publish_sync(synced_projects)
     return {"message": f"Fetched and stored data for {total_issues} issues in project {project_key}"}
 
 @app.get("/fetch-jira-data/{project_key}/bug")
-async def fetch_jira_data(project_key: str):
+async def fetch_jira_data_project_bug(project_key: str):
     """
     Fetch all issues from a Jira project and store them in the database.
     """
+    import requests
+
     url = f"{JIRA_BASE_URL}/rest/api/3/search"
     auth = (JIRA_EMAIL, JIRA_API_TOKEN)
     start_at = 0
     max_results = 100
     total_issues = 0
+    synced_projects = set()
 
     while True:
         params = {
@@ -290,6 +467,7 @@ async def fetch_jira_data(project_key: str):
 
         for issue in issues:
             await insert_issue_data(issue, "bug", project_key)
+            synced_projects.add(project_key)
 
         # Check if we've fetched all issues
         if start_at + len(issues) >= data.get("total", 0):
@@ -298,9 +476,15 @@ async def fetch_jira_data(project_key: str):
         # Update startAt for the next page
         start_at += max_results
 
+    await publish_sync(synced_projects)
     return {"message": f"Fetched and stored data for {total_issues} issues in project {project_key}"}
 
+# Low-cardinality columns, dictionary-encoded in Arrow/Parquet responses
+CATEGORICAL = ("project", "product", "status", "from_status", "owner", "current_status", "code_review_status")
+
 class IssueStatusHistory(BaseModel):
+    # status_history row id, the tiebreaker of the keyset cursor (after_id)
+    id: int
     issue_id: str
     key: str
     project: str
@@ -311,17 +495,29 @@ class IssueStatusHistory(BaseModel):
     story_points: int
     owner: str
     current_status: str
-
-async def fetch_from_db(query: str):
-    conn = await asyncpg.connect(DATABASE_URL)
-    data = await conn.fetch(query)
-    await conn.close()
-    return data
-
-@app.get("/average-times", response_model=List[IssueStatusHistory])
-async def get_average_times():
-    query = """
+    working_hours: float
+
+@app.get("/average-times", response_model=List[IssueStatusHistory], responses=COLUMNAR_RESPONSES)
+@cached("average-times")
+async def get_average_times(
+    request: Request,
+    filters: AnalyticsFilters = Depends(analytics_filters),
+    page: Page = Depends(keyset_page),
+):
+    # Issue-level filters go inside the CTE (they don't change LEAD over an issue's
+    # history), status / date range / keyset cursor are applied on the intervals.
+    params = []
+    issue_where = WhereClause(params)
+    add_issue_filters(issue_where, filters)
+    where = WhereClause(params)
+    where.any_of("t.status", filters.status)
+    add_date_range(where, filters, "t.changed_at_start")
+    add_keyset(where, page, "t.changed_at_start", "t.issue_id", "t.id")
+    order = keyset_order(where, page, "t.changed_at_start", "t.issue_id", "t.id")
+    query = f"""
+        WITH transitions AS (
             SELECT
+            sh.id,
             s.issue_id,
             i.key,
             i.project,
@@ -336,24 +532,106 @@ async def get_average_times():
             status_history sh
         JOIN issues i ON sh.issue_id = i.issue_id
         JOIN stories s ON s.issue_id = i.issue_id
+        {issue_where.sql()}
+        )
+        SELECT * FROM transitions t
+        {where.sql()}
+        {order}
     """
-    data = await fetch_from_db(query)
-    #return data
-    return [
-        {
-            "issue_id": record["issue_id"],
-            "key":record["key"],
-            "project":record["project"],
-            "status": record["status"],
-            "from_status": record["from_status"],
-            "changed_at_start": record["changed_at_start"],
-            "changed_at_end": record["changed_at_end"],
-            "story_points": record["story_points"],
-            "owner": record["owner"],
-            "current_status": record["current_status"]
-        }
-        for record in data
-    ]
+    data = await fetch_from_db(query, *params)
+    working_hours = calculate_working_hours(
+        [record["changed_at_start"] for record in data],
+        [record["changed_at_end"] for record in data],
+    )
+    rows = [dict(record, working_hours=round(float(hours), 2)) for record, hours in zip(data, working_hours)]
+    return rows_response(request, rows, IssueStatusHistory, CATEGORICAL)
+
+class StatusTimeAggregate(BaseModel):
+    owner: Optional[str] = None
+    story_points: Optional[int] = None
+    status: str
+    count: int
+    avg_hours: float
+    p50_hours: float
+    p90_hours: float
+    avg_working_hours: float
+
+class StatusTimeSummary(BaseModel):
+    by_owner_status: List[StatusTimeAggregate]
+    by_story_points_status: List[StatusTimeAggregate]
+    by_owner_story_points_status: List[StatusTimeAggregate]
+
+# GROUPING(owner, story_points) of each grouping set -> response field
+SUMMARY_GROUPINGS = {
+    1: "by_owner_status",
+    2: "by_story_points_status",
+    0: "by_owner_story_points_status",
+}
+
+@app.get("/average-times/summary", response_model=StatusTimeSummary)
+@cached("average-times-summary")
+async def get_average_times_summary(filters: AnalyticsFilters = Depends(analytics_filters)):
+    """
+    Time spent per status, averaged per owner, per story points and per owner and
+    story points, with counts and percentiles. The intervals are the same as in
+    /average-times; hours are elapsed (wall-clock) time, working hours follow the
+    business calendar.
+    """
+    params = []
+    issue_where = WhereClause(params)
+    add_issue_filters(issue_where, filters)
+    where = WhereClause(params)
+    where.any_of("t.status", filters.status)
+    add_date_range(where, filters, "t.changed_at_start")
+    query = f"""
+        WITH transitions AS (
+            SELECT
+            s.issue_id,
+            sh.to_status AS status,
+            sh.changed_at AS changed_at_start,
+            COALESCE(LEAD(sh.changed_at) OVER (PARTITION BY s.issue_id ORDER BY sh.changed_at), NOW() AT TIME ZONE 'UTC') AS changed_at_end,
+            s.story_points,
+            i.owner
+        FROM
+            status_history sh
+        JOIN issues i ON sh.issue_id = i.issue_id
+        JOIN stories s ON s.issue_id = i.issue_id
+        {issue_where.sql()}
+        ),
+        intervals AS (
+            SELECT
+                t.owner,
+                t.story_points,
+                t.status,
+                EXTRACT(EPOCH FROM t.changed_at_end - t.changed_at_start) / 3600.0 AS hours,
+                COALESCE(c.working_hours, working_hours(t.changed_at_start, t.changed_at_end)) AS working_hours
+            FROM transitions t
+            LEFT JOIN interval_working_hours c
+                ON c.issue_id = t.issue_id
+                AND c.changed_at_start = t.changed_at_start
+                AND c.changed_at_end = t.changed_at_end
+            {where.sql()}
+        )
+        SELECT
+            GROUPING(owner, story_points) AS grouping,
+            owner,
+            story_points,
+            status,
+            COUNT(*) AS count,
+            ROUND(AVG(hours)::numeric, 2)::float AS avg_hours,
+            ROUND((percentile_cont(0.5) WITHIN GROUP (ORDER BY hours))::numeric, 2)::float AS p50_hours,
+            ROUND((percentile_cont(0.9) WITHIN GROUP (ORDER BY hours))::numeric, 2)::float AS p90_hours,
+            ROUND(AVG(working_hours)::numeric, 2)::float AS avg_working_hours
+        FROM intervals
+        GROUP BY GROUPING SETS ((owner, status), (story_points, status), (owner, story_points, status))
+        ORDER BY grouping, owner, story_points, status
+    """
+    data = await fetch_from_db(query, *params)
+    summary = {name: [] for name in SUMMARY_GROUPINGS.values()}
+    for record in data:
+        row = dict(record)
+        summary[SUMMARY_GROUPINGS[row.pop("grouping")]].append(row)
+    return FastJSONResponse(summary)
 
 class Story(BaseModel):
     issue_id: str
@@ -363,9 +641,14 @@ class Story(BaseModel):
     story_points: int
     owner: str
 
-@app.get("/stories", response_model=List[Story])
-async def get_average_times():
-    query = """
+@app.get("/stories", response_model=List[Story], responses=COLUMNAR_RESPONSES)
+@cached("stories")
+async def get_stories(request: Request, filters: AnalyticsFilters = Depends(analytics_filters)):
+    where = WhereClause()
+    add_issue_filters(where, filters)
+    where.any_of("s.status", filters.status)
+    add_date_range(where, filters, "i.created")
+    query = f"""
             SELECT
             i.issue_id,
             i.key,
@@ -376,76 +659,41 @@ async def get_average_times():
         FROM
             stories s
         JOIN issues i ON s.issue_id = i.issue_id
+        {where.sql()}
     """
-    data = await fetch_from_db(query)
-    #return data
-    return [
-        {
-            "issue_id": record["issue_id"],
-            "key":record["key"],
-            "project":record["project"],
-            "status": record["status"],
-            "story_points": record["story_points"],
-            "owner": record["owner"]
-        }
-        for record in data
-    ]
+    data = await fetch_from_db(query, *where.params)
+    return rows_response(request, data, Story, CATEGORICAL)
 class CodeReview(BaseModel):
     issue_id: str
     changed_at: datetime
     code_review_status: str
     project: str
-
-@app.get("/code-review-history", response_model=List[CodeReview])
-async def get_code_review_history():
-        # Query to fetch all data from the code_review_history table
-        # query = """
-        #         SELECT
-        #         i.issue_id,
-        #         changed_at,
-        #         code_review_status,
-        #         project
-        #     FROM
-        #         code_review_history c
-        #     JOIN issues i on i.issue_id = c.issue_id
-        # """
-        query = """WITH ranked_reviews AS (
-            SELECT
-                crh.*,
-                ROW_NUMBER() OVER (
-                    PARTITION BY issue_id
-                    ORDER BY 
-                        CASE 
-                            WHEN code_review_status LIKE '%Not Passed%' THEN 1 
-                            ELSE 2 
-                        END,
-                        changed_at DESC
-                ) AS rn
-            FROM 
-                code_review_history crh
-        )
+    product: Optional[str]
+
+@app.get("/code-review-history", response_model=List[CodeReview], responses=COLUMNAR_RESPONSES)
+@cached("code-review-history")
+async def get_code_review_history(request: Request, filters: AnalyticsFilters = Depends(analytics_filters)):
+        # The verdict per issue is maintained during ingestion (see insert_issue_data),
+        # so this is an indexed lookup instead of ranking the whole review history
+        where = WhereClause()
+        where.any_of("v.project", filters.project)
+        add_product_filter(where, filters, "v.project")
+        where.any_of("v.code_review_status", filters.status)
+        add_date_range(where, filters, "v.changed_at")
+        query = f"""
         SELECT
-            i.issue_id,
-            changed_at,
-            code_review_status,
-            i.project
-        FROM 
-            ranked_reviews rr
-        JOIN issues i on i.issue_id = rr.issue_id
-        WHERE 
-            rn = 1;
+            v.issue_id,
+            v.changed_at,
+            v.code_review_status,
+            v.project,
+            p.product
+        FROM
+            code_review_verdicts v
+        LEFT JOIN products p ON p.project = v.project
+        {where.sql()}
         """
-        data = await fetch_from_db(query)
-        
-        return [
-        {
-            "issue_id": record["issue_id"],
-            "changed_at":record["changed_at"],
-            "code_review_status":record["code_review_status"],
-            "project":record["project"]
-        }
-        for record in data
-    ]
+        data = await fetch_from_db(query, *where.params)
+        return rows_response(request, data, CodeReview, CATEGORICAL)
 
 
 @app.get("/fetch-jira-data/story")
@@ -453,11 +701,14 @@ async def fetch_jira_data_story():
     """
     Fetch all issues from a Jira project and store them in the database.
     """
+    import requests
+
     url = f"{JIRA_BASE_URL}/rest/api/3/search"
     auth = (JIRA_EMAIL, JIRA_API_TOKEN)
     start_at = 0
     max_results = 100
     total_issues = 0
+    synced_projects = set()
 
     while True:
         params = {
@@ -478,6 +729,7 @@ async def fetch_jira_data_story():
 
         for issue in issues:
             await insert_issue_data(issue, "story", issue['fields']['project']['key'])
+            synced_projects.add(issue['fields']['project']['key'])
 
         # Check if we've fetched all issues
         if start_at + len(issues) >= data.get("total", 0):
@@ -486,6 +738,7 @@ async def fetch_jira_data_story():
         # Update startAt for the next page
         start_at += max_results
 
+    await publish_sync(synced_projects)
     return {"message": f"Fetched and stored data for {total_issues} issues in project {issue['fields']['project']['key']}"}
 
 @app.get("/fetch-jira-data/bug")
@@ -493,11 +746,14 @@ async def fetch_jira_data_bug():
     """
     Fetch all issues from a Jira project and store them in the database.
     """
+    import requests
+
     url = f"{JIRA_BASE_URL}/rest/api/3/search"
     auth = (JIRA_EMAIL, JIRA_API_TOKEN)
     start_at = 0
     max_results = 100
     total_issues = 0
+    synced_projects = set()
 
     while True:
         params = {
@@ -518,6 +774,7 @@ async def fetch_jira_data_bug():
 
         for issue in issues:
             await insert_issue_data(issue, "bug", issue['fields']['project']['key'])
+            synced_projects.add(issue['fields']['project']['key'])
 
         # Check if we've fetched all issues
         if start_at + len(issues) >= data.get("total", 0):
@@ -526,22 +783,5 @@ async def fetch_jira_data_bug():
         # Update startAt for the next page
         start_at += max_results
 
+    await publish_sync(synced_projects)
     return {"message": f"Fetched and stored data for {total_issues} issues in project {issue['fields']['project']['key']}"}
-
-class IssueStatusHistory(BaseModel):
-    issue_id: str
-    key: str
-    project: str
-    status: str
-    from_status: str
-    changed_at_start: datetime
-    changed_at_end: datetime
-    story_points: int
-    owner: str
-    current_status: str
-
-async def fetch_from_db(query: str):
-    conn = await asyncpg.connect(DATABASE_URL)
-    data = await conn.fetch(query)
-    await conn.close()
-    return data
\ No newline at end of file
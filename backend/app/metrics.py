@@ -0,0 +1,94 @@
+from typing import List, Optional
+from pydantic import BaseModel
+from db import fetch_from_db
+from filters import AnalyticsFilters, WhereClause, add_issue_filters, add_date_range
+
+# Bug metrics engine: whitelisted dimensions, measures and a time bucket are
+# compiled into one parameterized GROUP BY over bugs joined to their issues.
+# Only names from the tables below end up in the SQL text; every filter value
+# is bound, so one query shape always produces the same statement.
+
+DIMENSIONS = {
+    "project": "i.project",
+    "product": "p.product",
+    "owner": "i.owner",
+    "resolution": "i.resolution",
+    "root_cause": "b.bug_root_cause",
+    "priority": "b.priority",
+    "status": "b.status",
+    "assignee": "b.assignee",
+}
+
+MEASURES = {
+    "count": "COUNT(*)",
+    "resolved_count": "COUNT(i.resolutiondate)",
+    "avg_resolution_days": "ROUND(AVG(EXTRACT(EPOCH FROM i.resolutiondate - i.created) / 86400)::numeric, 2)::float",
+}
+
+# Timestamp a time bucket (and the date range) applies to
+TIME_FIELDS = {
+    "created": "i.created",
+    "resolved": "i.resolutiondate",
+}
+
+BUCKETS = ("day", "week", "month", "quarter", "year")
+
+
+class MetricQuery(BaseModel):
+    dimensions: List[str] = []
+    measures: List[str] = ["count"]
+    time_field: str = "created"
+    bucket: Optional[str] = None
+    filters: AnalyticsFilters = AnalyticsFilters()
+    priority: Optional[List[str]] = None
+    root_cause: Optional[List[str]] = None
+
+
+def _whitelisted(table, name, kind):
+    if name not in table:
+        raise ValueError(f"unknown {kind}: {name!r}")
+    return table[name]
+
+
+def compile_metric(query: MetricQuery):
+    """
+    SQL text and bound parameters of a metric query; the result has a "date"
+    column when bucketed. Names outside the whitelists raise ValueError.
+    """
+    time_column = _whitelisted(TIME_FIELDS, query.time_field, "time field")
+    columns = []
+    if query.bucket:
+        if query.bucket not in BUCKETS:
+            raise ValueError(f"unknown bucket: {query.bucket!r}")
+        columns.append(f"date_trunc('{query.bucket}', {time_column})::date AS date")
+    columns += [f"{_whitelisted(DIMENSIONS, name, 'dimension')} AS {name}" for name in query.dimensions]
+    groups = len(columns)
+    columns += [f"{_whitelisted(MEASURES, name, 'measure')} AS {name}" for name in query.measures]
+
+    # issue_type first so the (issue_type, created|resolutiondate) indexes apply
+    where = WhereClause()
+    where.add("i.issue_type = 'bug'")
+    add_issue_filters(where, query.filters)
+    where.any_of("b.status", query.filters.status)
+    where.any_of("b.priority", query.priority)
+    where.any_of("b.bug_root_cause", query.root_cause)
+    add_date_range(where, query.filters, time_column)
+
+    group_by = ""
+    if groups:
+        positions = ", ".join(str(position) for position in range(1, groups + 1))
+        group_by = f"GROUP BY {positions} ORDER BY {positions}"
+    sql = f"""
+        SELECT {", ".join(columns)}
+        FROM bugs b
+        JOIN issues i ON i.issue_id = b.issue_id
+        LEFT JOIN products p ON p.project = i.project
+        {where.sql()}
+        {group_by}
+    """
+    return sql, where.params
+
+
+async def run_metric(query: MetricQuery):
+    sql, params = compile_metric(query)
+    return await fetch_from_db(sql, *params)
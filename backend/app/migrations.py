@@ -0,0 +1,151 @@
+import logging
+
+# Schema changes for databases created from an older db/init.sql.
+#
+# init.sql only runs when the database volume is created, so every table,
+# column, index and function added to it later is also listed here. Migrations
+# run at startup in order, each once (applied ones are recorded in
+# schema_migrations), and are written so that they are no-ops on a database
+# that init.sql already created in the current form.
+
+logger = logging.getLogger("migrations")
+
+MIGRATIONS = [
+    (
+        "001_bugs_priority",
+        "ALTER TABLE bugs ADD COLUMN IF NOT EXISTS priority VARCHAR(255)",
+    ),
+    (
+        "002_analytics_indexes",
+        """
+        CREATE INDEX IF NOT EXISTS idx_issues_project ON issues (project, issue_type);
+        CREATE INDEX IF NOT EXISTS idx_issues_owner ON issues (owner);
+        CREATE INDEX IF NOT EXISTS idx_status_history_issue_changed_at ON status_history (issue_id, changed_at);
+        CREATE INDEX IF NOT EXISTS idx_status_history_changed_at_issue ON status_history (changed_at, issue_id);
+        CREATE INDEX IF NOT EXISTS idx_status_history_to_status ON status_history (to_status, issue_id, changed_at);
+        CREATE INDEX IF NOT EXISTS idx_issues_type_created ON issues (issue_type, created);
+        CREATE INDEX IF NOT EXISTS idx_issues_type_resolutiondate ON issues (issue_type, resolutiondate);
+        """,
+    ),
+    (
+        "003_code_review_verdicts",
+        """
+        CREATE TABLE IF NOT EXISTS code_review_verdicts (
+            issue_id VARCHAR(255) PRIMARY KEY,
+            project VARCHAR(50) NOT NULL,
+            code_review_status VARCHAR(255),
+            changed_at TIMESTAMP NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_code_review_verdicts_project ON code_review_verdicts (project, changed_at);
+        -- Verdicts of the history ingested before the table existed
+        INSERT INTO code_review_verdicts (issue_id, project, code_review_status, changed_at)
+        SELECT DISTINCT ON (crh.issue_id) crh.issue_id, i.project, crh.code_review_status, crh.changed_at
+        FROM code_review_history crh JOIN issues i ON i.issue_id = crh.issue_id
+        ORDER BY crh.issue_id, CASE WHEN crh.code_review_status LIKE '%Not Passed%' THEN 1 ELSE 2 END, crh.changed_at DESC
+        ON CONFLICT (issue_id) DO NOTHING;
+        """,
+    ),
+    (
+        "004_products",
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            project VARCHAR(255) PRIMARY KEY,
+            product VARCHAR(255) NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_products_product ON products (product);
+        INSERT INTO products (project, product) VALUES
+            ('FFF', 'RTMS'), ('SLY', 'RTMS'), ('EXW', 'RTMS'),
+            ('PB', 'PTM/ROM'), ('SMY', 'PTM/ROM'),
+            ('AAV', 'RSB/FLEET'),
+            ('ISY', 'Integration')
+        ON CONFLICT (project) DO NOTHING;
+        """,
+    ),
+    (
+        "005_working_hours",
+        """
+        CREATE TABLE IF NOT EXISTS work_segments (
+            segment_start TIMESTAMP PRIMARY KEY,
+            segment_end TIMESTAMP NOT NULL,
+            seconds_before DOUBLE PRECISION NOT NULL,
+            calendar_version VARCHAR(64) NOT NULL
+        );
+        CREATE OR REPLACE FUNCTION working_seconds_at(t TIMESTAMP) RETURNS DOUBLE PRECISION AS $$
+            SELECT COALESCE(
+                (SELECT seconds_before + EXTRACT(EPOCH FROM LEAST(t, segment_end) - segment_start)
+                 FROM work_segments
+                 WHERE segment_start <= t
+                 ORDER BY segment_start DESC
+                 LIMIT 1),
+                0)
+        $$ LANGUAGE sql STABLE;
+        CREATE OR REPLACE FUNCTION working_hours(start_time TIMESTAMP, end_time TIMESTAMP) RETURNS DOUBLE PRECISION AS $$
+            SELECT GREATEST(working_seconds_at(end_time) - working_seconds_at(start_time), 0) / 3600.0
+        $$ LANGUAGE sql STABLE;
+        CREATE TABLE IF NOT EXISTS interval_working_hours (
+            issue_id VARCHAR(255) NOT NULL,
+            changed_at_start TIMESTAMP NOT NULL,
+            changed_at_end TIMESTAMP NOT NULL,
+            working_hours DOUBLE PRECISION NOT NULL,
+            calendar_version VARCHAR(64) NOT NULL,
+            PRIMARY KEY (issue_id, changed_at_start, changed_at_end)
+        );
+        CREATE INDEX IF NOT EXISTS idx_interval_working_hours_range
+            ON interval_working_hours (changed_at_start, changed_at_end);
+        """,
+    ),
+    (
+        "006_status_daily_counts",
+        """
+        CREATE TABLE IF NOT EXISTS status_daily_counts (
+            project VARCHAR(50) NOT NULL,
+            day DATE NOT NULL,
+            status VARCHAR(255) NOT NULL,
+            issues INTEGER NOT NULL,
+            PRIMARY KEY (project, day, status)
+        );
+        """,
+    ),
+    (
+        "007_result_cache",
+        """
+        CREATE UNLOGGED TABLE IF NOT EXISTS result_cache (
+            key TEXT PRIMARY KEY,
+            token TEXT NOT NULL,
+            value BYTEA NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_result_cache_created_at ON result_cache (created_at);
+        CREATE TABLE IF NOT EXISTS data_generations (
+            scope VARCHAR(255) PRIMARY KEY,
+            generation BIGINT NOT NULL
+        );
+        """,
+    ),
+]
+
+
+async def migrate(connection):
+    """Apply the migrations this database has not seen yet; returns their names."""
+    applied = []
+    async with connection.transaction():
+        # Workers starting together wait for the first one instead of racing it
+        await connection.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+        await connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name VARCHAR(255) PRIMARY KEY,
+                applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        done = {row["name"] for row in await connection.fetch("SELECT name FROM schema_migrations")}
+        for name, sql in MIGRATIONS:
+            if name in done:
+                continue
+            await connection.execute(sql)
+            await connection.execute("INSERT INTO schema_migrations (name) VALUES ($1)", name)
+            logger.info("applied migration %s", name)
+            applied.append(name)
+    return applied
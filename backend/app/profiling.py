@@ -0,0 +1,119 @@
+import contextvars
+import io
+import logging
+import time
+from contextlib import contextmanager
+import config
+
+# Per-request timings. The middleware in main.py starts a RequestTimings for
+# every request; db.py and the response classes add to it through timed(), and
+# the totals are returned as a Server-Timing header:
+#   db-connect  opening the database connection
+#   db          executing queries and fetching rows
+#   cache       the shared result cache and data generation lookups
+#   encode      serializing the response body
+#   app         everything else (routing, validation, Python computation)
+
+logger = logging.getLogger("profiling")
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self, profiling: bool = False):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = []
+        self.profiling = profiling
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        total = self.total()
+        phases = dict(self.phases)
+        phases["app"] = max(total - sum(phases.values()), 0.0)
+        phases["total"] = total
+        return ", ".join(f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in phases.items())
+
+
+def start_request(profiling: bool = False) -> RequestTimings:
+    timings = RequestTimings(profiling)
+    _current.set(timings)
+    return timings
+
+
+def profiling_active() -> bool:
+    """True while a sampling profile of the current request is being taken."""
+    timings = _current.get()
+    return timings is not None and timings.profiling
+
+
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.add(phase, time.perf_counter() - started)
+
+
+def record_query(query: str, args, rows: int, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.queries.append((seconds, rows))
+    if seconds * 1000 >= config.SLOW_QUERY_MS:
+        # Only the argument types: the values can be issue data
+        logger.warning(
+            "slow query: %.1f ms, %d rows\n%s\n%d args: %s",
+            seconds * 1000, rows, query.strip(), len(args), ", ".join(type(arg).__name__ for arg in args),
+        )
+
+
+def log_if_slow(method: str, path: str, timings: RequestTimings):
+    if timings.total() * 1000 >= config.SLOW_REQUEST_MS:
+        logger.warning(
+            "slow request: %s %s, %d queries, %s", method, path, len(timings.queries), timings.server_timing()
+        )
+
+
+def profile_requested(request) -> bool:
+    return config.PROFILE_REQUESTS and (
+        request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    )
+
+
+async def profile_call(call_next, request):
+    """
+    Run one request under a sampling profiler (pyinstrument, when installed) or
+    cProfile, and return the profile instead of the response.
+    """
+    from fastapi.responses import HTMLResponse, PlainTextResponse
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        await call_next(request)
+        profiler.stop()
+        return HTMLResponse(profiler.output_html())
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    await call_next(request)
+    profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(50)
+    return PlainTextResponse(output.getvalue())
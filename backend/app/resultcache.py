@@ -0,0 +1,411 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+import asyncpg
+from fastapi import Request, Response
+from pydantic import BaseModel
+import config
+import db
+from filters import AnalyticsFilters, projects_for_products
+from fastjson import FastJSONResponse
+from columnar import representation
+from profiling import profiling_active, timed
+
+# Cache of analytics results in two tiers: an LRU in every worker process, and
+# the UNLOGGED result_cache table shared by all workers. Results are kept as
+# encoded responses (status, headers, body bytes), never as Python objects. Data only changes when
+# a /fetch-jira-data sync runs, so entries are valid until the data generation
+# they were computed under moves on. The generation counters live in the
+# data_generations table, so a sync in one worker invalidates all of them.
+
+logger = logging.getLogger("resultcache")
+
+MISSING = object()
+
+
+def _shared() -> bool:
+    # Only the running app has a pool; scripts and tests stay in-process
+    return config.RESULT_CACHE_SHARED and db.pool is not None
+
+
+class DataGeneration:
+    """
+    Counters bumped by every successful sync. Results computed for a set of
+    projects only depend on those projects' counters, everything else on the
+    global one. bump() without projects invalidates everything.
+
+    With the shared tier the counters mirror the data_generations table:
+    publish() increments them there and refresh() reloads them, at most every
+    RESULT_CACHE_GENERATION_POLL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.epoch = 0
+        self.generation = 0
+        self.projects = {}
+        self._refreshed = float("-inf")
+
+    def bump(self, projects=None):
+        with self._lock:
+            if projects is None:
+                self.epoch += 1
+                return
+            self.generation += 1
+            for project in projects:
+                self.projects[project] = self.projects.get(project, 0) + 1
+
+    def token(self, projects=None):
+        if projects is None:
+            return (self.epoch, self.generation)
+        return (self.epoch,) + tuple((project, self.projects.get(project, 0)) for project in sorted(projects))
+
+    async def publish(self, connection, projects=None):
+        """bump() for every worker; connection is the one the sync wrote with."""
+        if not _shared():
+            self.bump(projects)
+            return
+        # Lower-case scopes cannot clash with Jira project keys
+        scopes = ["epoch"] if projects is None else ["all"] + sorted(projects)
+        try:
+            await connection.execute(
+                """
+                INSERT INTO data_generations (scope, generation)
+                SELECT scope, 1 FROM unnest($1::text[]) AS scope
+                ON CONFLICT (scope) DO UPDATE SET generation = data_generations.generation + 1
+                """,
+                scopes,
+            )
+        except asyncpg.PostgresError as error:
+            logger.warning("could not publish data generation: %s", error)
+            self.bump(projects)
+            return
+        await self.refresh(force=True)
+
+    async def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not _shared() or (not force and now - self._refreshed < config.RESULT_CACHE_GENERATION_POLL):
+            return
+        # Claimed before awaiting, so concurrent requests don't all query
+        self._refreshed = now
+        try:
+            with timed("cache"):
+                async with db.pool.acquire() as connection:
+                    rows = await connection.fetch("SELECT scope, generation FROM data_generations")
+        except (asyncpg.PostgresError, OSError) as error:
+            logger.warning("could not load data generations: %s", error)
+            return
+        counters = {row["scope"]: row["generation"] for row in rows}
+        with self._lock:
+            self.epoch = counters.pop("epoch", 0)
+            self.generation = counters.pop("all", 0)
+            self.projects = counters
+
+
+class ResultCache:
+    """
+    LRU cache capped by entry count and by the encoded size of the results.
+    Entries older than ttl seconds are dropped as well.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, token):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != token or time.monotonic() - entry[3] > self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, token, value, size=None):
+        if size is None:
+            size = len(_encode(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (token, value, size, time.monotonic())
+            self.size += size
+            while self._entries and (self.size > self.max_bytes or len(self._entries) > self.max_entries):
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        size = self._entries.pop(key)[2]
+        self.size -= size
+
+
+class SharedCache:
+    """
+    Encoded responses in the UNLOGGED result_cache table, readable by every
+    worker. Entries expire after ttl seconds; once max_bytes / 10 have been
+    written since the last sweep, the oldest entries beyond max_bytes go.
+    Database errors (e.g. the table is missing) count as misses.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._written = 0
+
+    async def get(self, key, token):
+        """The encoded response, or None."""
+        if not _shared():
+            return None
+        try:
+            with timed("cache"):
+                async with db.pool.acquire() as connection:
+                    payload = await connection.fetchval(
+                        """
+                        SELECT value FROM result_cache
+                        WHERE key = $1 AND token = $2 AND created_at > NOW() - make_interval(secs => $3)
+                        """,
+                        key, repr(token), float(self.ttl),
+                    )
+        except (asyncpg.PostgresError, OSError) as error:
+            logger.warning("shared result cache unavailable: %s", error)
+            return None
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return payload
+
+    async def put(self, key, token, payload: bytes):
+        if not _shared() or len(payload) > self.max_bytes:
+            return
+        try:
+            with timed("cache"):
+                async with db.pool.acquire() as connection:
+                    await connection.execute(
+                        """
+                        INSERT INTO result_cache (key, token, value, size, created_at)
+                        VALUES ($1, $2, $3, $4, NOW())
+                        ON CONFLICT (key) DO UPDATE
+                        SET token = EXCLUDED.token, value = EXCLUDED.value,
+                            size = EXCLUDED.size, created_at = EXCLUDED.created_at
+                        """,
+                        key, repr(token), payload, len(payload),
+                    )
+                    self._written += len(payload)
+                    if self._written > self.max_bytes // 10:
+                        self._written = 0
+                        await self._evict(connection)
+        except (asyncpg.PostgresError, OSError) as error:
+            logger.warning("shared result cache unavailable: %s", error)
+
+    async def _evict(self, connection):
+        await connection.execute(
+            """
+            DELETE FROM result_cache
+            WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, created_at, SUM(size) OVER (ORDER BY created_at DESC, key) AS total
+                    FROM result_cache
+                ) newest
+                WHERE total > $1 OR created_at <= NOW() - make_interval(secs => $2)
+            )
+            """,
+            self.max_bytes, float(self.ttl),
+        )
+
+
+def _encode(frozen) -> bytes:
+    """A frozen response as one line of JSON (status, headers) followed by the body."""
+    status_code, headers, body = frozen
+    head = {"status": status_code, "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers]}
+    return json.dumps(head).encode() + b"\n" + body
+
+
+def _decode(payload):
+    """The frozen response in payload, or MISSING when it is not one."""
+    try:
+        head, body = bytes(payload).split(b"\n", 1)
+        head = json.loads(head)
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in head["headers"]]
+        return (int(head["status"]), headers, body)
+    except (ValueError, KeyError, TypeError, AttributeError):  # e.g. written by an older version
+        return MISSING
+
+
+data_generation = DataGeneration()
+result_cache = ResultCache(
+    config.RESULT_CACHE_MAX_BYTES, config.RESULT_CACHE_MAX_ENTRIES, config.RESULT_CACHE_TTL
+)
+shared_cache = SharedCache(config.RESULT_CACHE_SHARED_MAX_BYTES, config.RESULT_CACHE_TTL)
+
+
+# Filter parameters whose values are a set: their order doesn't change the
+# result, so it is left out of cache keys. The order of other lists does, e.g.
+# dimension and measure set the column order and the ORDER BY.
+UNORDERED_PARAMETERS = {"project", "product", "owner", "status", "issue_type", "priority", "root_cause", "assignee"}
+
+
+def _normalize(value, unordered=False):
+    if isinstance(value, BaseModel):
+        value = value.model_dump() if hasattr(value, "model_dump") else value.dict()
+    if isinstance(value, dict):
+        return {
+            key: _normalize(item, key in UNORDERED_PARAMETERS) for key, item in value.items() if item is not None
+        }
+    if isinstance(value, set) or (unordered and isinstance(value, (list, tuple))):
+        return sorted(_normalize(item) for item in value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def cache_key(name: str, arguments: dict):
+    params = {
+        key: _normalize(value, key in UNORDERED_PARAMETERS)
+        for key, value in arguments.items()
+        if value is not None and not isinstance(value, (Request, Response))
+    }
+    for value in arguments.values():
+        if isinstance(value, Request):
+            params["representation"] = representation(value)
+    return name + ":" + json.dumps(params, sort_keys=True, default=str)
+
+
+def _scope(projects, products):
+    if not projects and not products:
+        return None
+    scope = set(projects or [])
+    if products:
+        product_projects = set(projects_for_products(products))
+        scope = scope & product_projects if projects else product_projects
+    return scope
+
+
+def request_projects(arguments: dict):
+    """Projects a request is restricted to, or None when it reads all of them."""
+    for value in arguments.values():
+        if isinstance(value, AnalyticsFilters):
+            return _scope(value.project, value.product)
+    project = arguments.get("project")
+    if project:
+        return set(project) if isinstance(project, (list, tuple, set)) else {project}
+    return None
+
+
+def _query_state(query_params):
+    """Query parameters normalized like cache keys: lists keep their order, value sets don't."""
+    values = {}
+    for key, value in query_params.multi_items():
+        values.setdefault(key, []).append(value)
+    return sorted((key, sorted(items) if key in UNORDERED_PARAMETERS else items) for key, items in values.items())
+
+
+def etag(request: Request):
+    """
+    Weak validator of a cached endpoint's response: it only changes when the data
+    generation of the requested projects moves on, or after RESULT_CACHE_TTL.
+    """
+    query_params = request.query_params
+    scope = _scope(query_params.getlist("project"), query_params.getlist("product"))
+    state = (
+        request.url.path,
+        _query_state(query_params),
+        representation(request),
+        data_generation.token(scope),
+        int(time.time() // result_cache.ttl),
+    )
+    return 'W/"' + hashlib.sha1(repr(state).encode()).hexdigest()[:20] + '"'
+
+
+def _freeze(result):
+    """
+    The status, headers and body of an endpoint's result. Results that are not
+    a Response yet (plain dicts and lists) are encoded as JSON first.
+    """
+    if not isinstance(result, Response):
+        result = FastJSONResponse(result)
+    headers = [(name, value) for name, value in result.raw_headers if name != b"content-length"]
+    return (result.status_code, headers, bytes(result.body))
+
+
+def _thaw(frozen):
+    # A new Response per request, as responses are not shared
+    status_code, headers, body = frozen
+    response = Response(content=body, status_code=status_code)
+    response.raw_headers = [(b"content-length", str(len(body)).encode())] + list(headers)
+    return response
+
+
+def cached(name: str):
+    """
+    Cache an endpoint's result keyed by name plus its normalized parameters.
+    Goes between the route decorator and the function; FastAPI still sees the
+    original signature through functools.wraps.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def lookup(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = cache_key(name, bound.arguments)
+            return key, data_generation.token(request_projects(bound.arguments))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if profiling_active():
+                    return await func(*args, **kwargs)
+                await data_generation.refresh()
+                key, token = lookup(args, kwargs)
+                value = result_cache.get(key, token)
+                if value is MISSING:
+                    payload = await shared_cache.get(key, token)
+                    if payload is not None:
+                        value = _decode(payload)
+                        if value is not MISSING:
+                            result_cache.put(key, token, value, len(payload))
+                if value is MISSING:
+                    value = _freeze(await func(*args, **kwargs))
+                    payload = _encode(value)
+                    result_cache.put(key, token, value, len(payload))
+                    await shared_cache.put(key, token, payload)
+                return _thaw(value)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if profiling_active():
+                    return func(*args, **kwargs)
+                key, token = lookup(args, kwargs)
+                value = result_cache.get(key, token)
+                if value is MISSING:
+                    value = _freeze(func(*args, **kwargs))
+                    result_cache.put(key, token, value)
+                return _thaw(value)
+
+        wrapper.cache_name = name
+        return wrapper
+
+    return decorator
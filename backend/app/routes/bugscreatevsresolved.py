@@ -1,100 +1,117 @@
-from fastapi import FastAPI, HTTPException, APIRouter
-from sqlalchemy import create_engine, Column, Integer, String, Text, TIMESTAMP, func, select
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import config
-from sqlalchemy.sql import func
-
-DATABASE_URL = config.DATABASE_URL
-
-# Database setup
-#DATABASE_URL = "sqlite:///./test.db"  # Replace with your actual database URL
-Base = declarative_base()
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from fastapi import HTTPException, APIRouter, Query
+from datetime import date, datetime, time
+from typing import List, Literal, Optional
+from resultcache import cached
+from db import fetch_from_db
+from filters import WhereClause
+from metrics import MetricQuery, run_metric
 
 router = APIRouter()
 
-# Define models for issues and bugs
-class Issue(Base):
-    __tablename__ = "issues"
-    id = Column(Integer, primary_key=True, index=True)
-    issue_id = Column(String, unique=True, index=True, nullable=False)
-    key = Column(String, nullable=False)
-    summary = Column(Text, nullable=False)
-    owner = Column(String, nullable=False)
-    issue_type = Column(String, nullable=False)
-    project = Column(String, nullable=False)
-    created = Column(TIMESTAMP, nullable=False)
-    resolutiondate = Column(TIMESTAMP)
-    resolution = Column(String)
-
-class Bug(Base):
-    __tablename__ = "bugs"
-    id = Column(Integer, primary_key=True, index=True)
-    issue_id = Column(String, unique=True, index=True, nullable=False)
-    status = Column(String)
-    assignee = Column(String)
-    bug_root_cause = Column(Text)
-
-# Routes
+
+# Routes (bugs-per-day / bugs-per-week are aliases of /metrics/bugs)
 @router.get("/bugs-per-day")
-def get_bugs_per_day():
-    session = SessionLocal()
-    try:
-        # Query for bugs created per day
-        created_query = select(
-            func.date(Issue.created).label("day"),
-            func.count().label("created_count")
-        ).group_by(func.date(Issue.created))
-
-        # Query for bugs resolved per day
-        resolved_query = select(
-            func.date(Issue.resolutiondate).label("day"),
-            func.count().label("resolved_count")
-        ).group_by(func.date(Issue.resolutiondate))
-
-        created_per_day = session.execute(created_query).fetchall()
-        resolved_per_day = session.execute(resolved_query).fetchall()
-
-        # Format results into dictionaries
-        created_per_day_data = [{"day": row[0], "created_count": row[1]} for row in created_per_day]
-        resolved_per_day_data = [{"day": row[0], "resolved_count": row[1]} for row in resolved_per_day]
-
-        return {"created_per_day": created_per_day_data, "resolved_per_day": resolved_per_day_data}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
-    finally:
-        session.close()
+@cached("bugs-per-day")
+async def get_bugs_per_day():
+    created = await run_metric(MetricQuery(bucket="day"))
+    resolved = await run_metric(MetricQuery(time_field="resolved", bucket="day"))
+
+    created_per_day_data = [{"day": row["date"], "created_count": row["count"]} for row in created]
+    resolved_per_day_data = [{"day": row["date"], "resolved_count": row["count"]} for row in resolved]
 
+    return {"created_per_day": created_per_day_data, "resolved_per_day": resolved_per_day_data}
 
 
+def iso_week(day):
+    # 'IYYY-IW' label of the Monday of the week; ISO year, so 2024-12-30 is 2025-01
+    if day is None:
+        return None
+    year, week, _ = day.isocalendar()
+    return f"{year}-{week:02d}"
+
 
 @router.get("/bugs-per-week")
-def get_bugs_per_week():
-    session = SessionLocal()
+@cached("bugs-per-week")
+async def get_bugs_per_week():
+    created = await run_metric(MetricQuery(bucket="week"))
+    resolved = await run_metric(MetricQuery(time_field="resolved", bucket="week"))
+
+    created_per_week_data = [{"week": iso_week(row["date"]), "created_count": row["count"]} for row in created]
+    resolved_per_week_data = [{"week": iso_week(row["date"]), "resolved_count": row["count"]} for row in resolved]
+
+    return {"created_per_week": created_per_week_data, "resolved_per_week": resolved_per_week_data}
+
+
+# Bucket sizes for the created-vs-resolved series (date_trunc unit -> series step)
+BUCKETS = {
+    "day": "1 day",
+    "week": "1 week",
+    "month": "1 month",
+}
+
+@router.get("/created-vs-resolved")
+@cached("bugs-created-vs-resolved")
+async def get_created_vs_resolved(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    bucket: Literal["day", "week", "month"] = "day",
+    project: Optional[List[str]] = Query(None),
+):
+    """
+    Bugs created and resolved per bucket in [date_from, date_to], joined onto a
+    generate_series date spine so every bucket is present (zero-filled).
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+
+    step = BUCKETS[bucket]
+    where = WhereClause()
+    start = where.param(datetime.combine(date_from, time.min))
+    end = where.param(datetime.combine(date_to, time.min))
+    where.add("i.issue_type = 'bug'")
+    where.any_of("i.project", project)
+
+    # bucket and step come from the whitelist above, dates and projects are bound
+    query = f"""
+        WITH spine AS (
+            SELECT generate_series(
+                date_trunc('{bucket}', {start}::timestamp),
+                date_trunc('{bucket}', {end}::timestamp),
+                interval '{step}'
+            ) AS bucket
+        ),
+        created AS (
+            SELECT date_trunc('{bucket}', i.created) AS bucket, COUNT(*) AS created_count
+            FROM issues i
+            {where.sql()}
+              AND i.created >= date_trunc('{bucket}', {start}::timestamp)
+              AND i.created < date_trunc('{bucket}', {end}::timestamp) + interval '{step}'
+            GROUP BY 1
+        ),
+        resolved AS (
+            SELECT date_trunc('{bucket}', i.resolutiondate) AS bucket, COUNT(*) AS resolved_count
+            FROM issues i
+            {where.sql()}
+              AND i.resolutiondate >= date_trunc('{bucket}', {start}::timestamp)
+              AND i.resolutiondate < date_trunc('{bucket}', {end}::timestamp) + interval '{step}'
+            GROUP BY 1
+        )
+        SELECT
+            s.bucket::date AS date,
+            COALESCE(c.created_count, 0) AS created_count,
+            COALESCE(r.resolved_count, 0) AS resolved_count
+        FROM spine s
+        LEFT JOIN created c ON c.bucket = s.bucket
+        LEFT JOIN resolved r ON r.bucket = s.bucket
+        ORDER BY s.bucket
+    """
     try:
-        # Query for bugs created per week
-        created_query = select(
-            func.to_char(Issue.created, 'YYYY-IW').label("week"),
-            func.count().label("created_count")
-        ).group_by(func.to_char(Issue.created, 'YYYY-IW'))
-
-        # Query for bugs resolved per week
-        resolved_query = select(
-            func.to_char(Issue.resolutiondate, 'YYYY-IW').label("week"),
-            func.count().label("resolved_count")
-        ).group_by(func.to_char(Issue.resolutiondate, 'YYYY-IW'))
-
-        created_per_week = session.execute(created_query).fetchall()
-        resolved_per_week = session.execute(resolved_query).fetchall()
-
-        # Format results into dictionaries
-        created_per_week_data = [{"week": row[0], "created_count": row[1]} for row in created_per_week]
-        resolved_per_week_data = [{"week": row[0], "resolved_count": row[1]} for row in resolved_per_week]
-
-        return {"created_per_week": created_per_week_data, "resolved_per_week": resolved_per_week_data}
+        data = await fetch_from_db(query, *where.params)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
-    finally:
-        session.close()
+
+    series = [
+        {"date": row["date"], "created_count": row["created_count"], "resolved_count": row["resolved_count"]}
+        for row in data
+    ]
+    return {"bucket": bucket, "series": series}
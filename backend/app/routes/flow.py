@@ -0,0 +1,225 @@
+import asyncio
+from datetime import date, timedelta
+from fastapi import APIRouter, Depends, Query, Request
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+import db
+from resultcache import cached
+from fastjson import FastJSONResponse
+from columnar import COLUMNAR_RESPONSES, rows_response
+from db import fetch_from_db
+from filters import AnalyticsFilters, WhereClause, analytics_filters, add_issue_filters, add_date_range
+from flowcounts import counts_current, extend_counts
+from metrics import BUCKETS
+
+router = APIRouter()
+
+# Flow metrics of resolved issues, in calendar days:
+#   lead time   created -> resolutiondate
+#   cycle time  first change into the start status -> resolutiondate
+# Percentiles and histograms are computed in the database, so only one row per
+# group and histogram bin comes back. The period is the resolution date's
+# bucket, and date_from/date_to apply to the resolution date as well.
+
+DIMENSIONS = {
+    "project": "i.project",
+    "product": "p.product",
+    "issue_type": "i.issue_type",
+}
+PERCENTILES = (0.5, 0.75, 0.85, 0.95)
+
+Dimension = Literal[tuple(DIMENSIONS)]
+Bucket = Literal[BUCKETS]
+
+
+class FlowGroup(BaseModel):
+    period: Optional[date] = None
+    project: Optional[str] = None
+    product: Optional[str] = None
+    issue_type: Optional[str] = None
+    count: int
+    mean_days: float
+    p50_days: float
+    p75_days: float
+    p85_days: float
+    p95_days: float
+    max_days: float
+    # Issues per bin of bin_days; the last bin also holds everything longer
+    histogram: List[int]
+
+
+class FlowDistribution(BaseModel):
+    metric: str
+    groups_by: List[str]
+    bin_days: float
+    groups: List[FlowGroup]
+
+
+async def flow_distribution(
+    metric: str,
+    start_column: str,
+    start_status: Optional[str],
+    dimensions: List[str],
+    bucket: Optional[str],
+    bin_days: float,
+    bins: int,
+    filters: AnalyticsFilters,
+):
+    where = WhereClause()
+    where.add("i.resolutiondate IS NOT NULL")
+    add_issue_filters(where, filters)
+    add_date_range(where, filters, "i.resolutiondate")
+    started = ""
+    if start_status is not None:
+        # Index-only scan of (to_status, issue_id, changed_at)
+        started = f"""
+            JOIN (
+                SELECT issue_id, MIN(changed_at) AS started
+                FROM status_history
+                WHERE to_status = {where.param(start_status)}
+                GROUP BY issue_id
+            ) s ON s.issue_id = i.issue_id"""
+
+    columns = [f"date_trunc('{bucket}', i.resolutiondate)::date AS period"] if bucket else []
+    columns += [f"{DIMENSIONS[name]} AS {name}" for name in dimensions]
+    names = (["period"] if bucket else []) + dimensions
+    durations = f"""
+        WITH durations AS (
+            SELECT {"".join(column + ", " for column in columns)}
+                (EXTRACT(EPOCH FROM i.resolutiondate - {start_column}) / 86400)::float AS days
+            FROM issues i
+            LEFT JOIN products p ON p.project = i.project{started}
+            {where.sql()}
+        )
+    """
+    group_columns = "".join(name + ", " for name in names)
+    positions = ", ".join(str(position) for position in range(1, len(names) + 1))
+    group_by = f"GROUP BY {positions} ORDER BY {positions}" if names else ""
+    stats_query = f"""
+        {durations}
+        SELECT {group_columns}
+            COUNT(*) AS count,
+            AVG(days) AS mean_days,
+            percentile_cont(ARRAY{list(PERCENTILES)}) WITHIN GROUP (ORDER BY days) AS percentiles,
+            MAX(days) AS max_days
+        FROM durations
+        WHERE days >= 0
+        {group_by}
+    """
+    histogram_params = list(where.params)
+    histogram_where = WhereClause(histogram_params)
+    histogram_query = f"""
+        {durations}
+        SELECT {group_columns}
+            LEAST(FLOOR(days / {histogram_where.param(bin_days)})::int, {histogram_where.param(bins)} - 1) AS bin,
+            COUNT(*) AS count
+        FROM durations
+        WHERE days >= 0
+        GROUP BY {", ".join(str(position) for position in range(1, len(names) + 2))}
+    """
+    stats, histogram_rows = await asyncio.gather(
+        fetch_from_db(stats_query, *where.params),
+        fetch_from_db(histogram_query, *histogram_params),
+    )
+
+    histograms = {}
+    for record in histogram_rows:
+        key = tuple(record[name] for name in names)
+        histograms.setdefault(key, [0] * bins)[record["bin"]] = record["count"]
+
+    groups = []
+    for record in stats:
+        if not record["count"]:
+            continue
+        key = tuple(record[name] for name in names)
+        group = {name: record[name] for name in names}
+        group["count"] = record["count"]
+        group["mean_days"] = round(record["mean_days"], 2)
+        for fraction, value in zip(PERCENTILES, record["percentiles"]):
+            group[f"p{round(fraction * 100)}_days"] = round(value, 2)
+        group["max_days"] = round(record["max_days"], 2)
+        group["histogram"] = histograms.get(key, [0] * bins)
+        groups.append(group)
+    return FastJSONResponse({"metric": metric, "groups_by": names, "bin_days": bin_days, "groups": groups})
+
+
+@router.get("/lead-time", response_model=FlowDistribution)
+@cached("flow-lead-time")
+async def get_lead_time(
+    dimension: List[Dimension] = Query([]),
+    bucket: Optional[Bucket] = None,
+    bin_days: float = Query(7.0, gt=0),
+    bins: int = Query(20, ge=1, le=200),
+    filters: AnalyticsFilters = Depends(analytics_filters),
+):
+    """
+    Lead time (created -> resolved) distribution of resolved issues per group,
+    e.g. /flow/lead-time?dimension=product&bucket=quarter
+    """
+    return await flow_distribution(
+        "lead-time", "i.created", None, list(dict.fromkeys(dimension)), bucket, bin_days, bins, filters
+    )
+
+
+@router.get("/cycle-time", response_model=FlowDistribution)
+@cached("flow-cycle-time")
+async def get_cycle_time(
+    start_status: str = "in progress",
+    dimension: List[Dimension] = Query([]),
+    bucket: Optional[Bucket] = None,
+    bin_days: float = Query(1.0, gt=0),
+    bins: int = Query(30, ge=1, le=200),
+    filters: AnalyticsFilters = Depends(analytics_filters),
+):
+    """
+    Cycle time (first change into start_status -> resolved) distribution of
+    resolved issues per group; issues that never entered start_status are left out.
+    """
+    return await flow_distribution(
+        "cycle-time", "s.started", start_status, list(dict.fromkeys(dimension)), bucket, bin_days, bins, filters
+    )
+
+
+class FlowCount(BaseModel):
+    day: date
+    status: str
+    issues: int
+
+
+@router.get("/cfd", response_model=List[FlowCount], responses=COLUMNAR_RESPONSES)
+@cached("flow-cfd")
+async def get_cumulative_flow(
+    request: Request,
+    project: Optional[List[str]] = Query(None),
+    product: Optional[List[str]] = Query(None),
+    status: Optional[List[str]] = Query(None),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """
+    Cumulative flow: issues per status at the end of each day in [date_from,
+    date_to] (default: the last 90 days), summed over the selected projects.
+    A range scan of status_daily_counts, however long the projects have existed.
+    """
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=90)
+    # Carry the counts forward to today on the first request of a day without a sync
+    if not counts_current():
+        async with db.connection() as connection:
+            await extend_counts(connection)
+
+    where = WhereClause()
+    where.any_of("c.project", project)
+    if product:
+        where.add("c.project IN (SELECT project FROM products WHERE product = ANY({}))", product)
+    where.add("c.day BETWEEN {} AND {}", date_from, date_to)
+    where.any_of("c.status", status)
+    query = f"""
+        SELECT c.day, c.status, SUM(c.issues)::int AS issues
+        FROM status_daily_counts c
+        {where.sql()}
+        GROUP BY c.day, c.status
+        ORDER BY c.day, c.status
+    """
+    data = await fetch_from_db(query, *where.params)
+    return rows_response(request, data, FlowCount, ("status",))
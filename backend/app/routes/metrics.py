@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List, Literal, Optional
+from resultcache import cached
+from fastjson import FastJSONResponse
+from filters import AnalyticsFilters, analytics_filters
+from metrics import BUCKETS, DIMENSIONS, MEASURES, TIME_FIELDS, MetricQuery, run_metric
+
+router = APIRouter()
+
+Dimension = Literal[tuple(DIMENSIONS)]
+Measure = Literal[tuple(MEASURES)]
+TimeField = Literal[tuple(TIME_FIELDS)]
+Bucket = Literal[BUCKETS]
+
+
+@router.get("/bugs")
+@cached("metrics-bugs")
+async def get_bug_metrics(
+    dimension: List[Dimension] = Query([]),
+    measure: List[Measure] = Query(["count"]),
+    time_field: TimeField = "created",
+    bucket: Optional[Bucket] = None,
+    priority: Optional[List[str]] = Query(None),
+    root_cause: Optional[List[str]] = Query(None),
+    filters: AnalyticsFilters = Depends(analytics_filters),
+):
+    """
+    Bug metrics grouped by any of the whitelisted dimensions, optionally bucketed
+    by the created or resolved date. date_from/date_to apply to time_field, status
+    filters the bug status, e.g.
+    /metrics/bugs?dimension=project&dimension=priority&bucket=week&time_field=resolved
+    """
+    query = MetricQuery(
+        dimensions=list(dict.fromkeys(dimension)),
+        measures=list(dict.fromkeys(measure)),
+        time_field=time_field,
+        bucket=bucket,
+        filters=filters,
+        priority=priority,
+        root_cause=root_cause,
+    )
+    rows = await run_metric(query)
+    return FastJSONResponse({
+        "dimensions": (["date"] if bucket else []) + query.dimensions,
+        "measures": query.measures,
+        "rows": rows,
+    })
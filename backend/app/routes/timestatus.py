@@ -1,11 +1,14 @@
 
-from fastapi import APIRouter
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Query, Request
 from pydantic import BaseModel
-from typing import List
-import asyncpg
+from typing import List, Optional
+from datetime import date
 import config
-import pandas as pd
+from resultcache import cached
+from fastjson import FastJSONResponse
+from columnar import COLUMNAR_RESPONSES, rows_response
+from db import fetch_from_db
+from filters import AnalyticsFilters, WhereClause, analytics_filters, add_issue_filters, add_date_range
 
 router = APIRouter()
 
@@ -15,30 +18,8 @@ JIRA_API_TOKEN = config.JIRA_API_TOKEN
 JIRA_EMAIL = config.JIRA_EMAIL
 DATABASE_URL = config.DATABASE_URL
 
-# Define Turkish public holidays
-TURKISH_HOLIDAYS = [
-    "2024-01-01",  # New Year's Day
-    "2024-04-23",  # National Sovereignty and Children's Day
-    "2024-05-01",  # Labor and Solidarity Day
-    "2024-05-19",  # Commemoration of Atatürk, Youth and Sports Day
-    "2024-07-15",  # Democracy and National Unity Day
-    "2024-08-30",  # Victory Day
-    "2024-10-29",  # Republic Day
-    # Add additional holidays (e.g., religious holidays)
-]
-
-WORKING_HOURS_START = 9  # Start of the working day
-WORKING_HOURS_END = 18  # End of the working day
-LUNCH_START = 12         # 12:00 PM
-LUNCH_END = 13           # 1:00 PM
-
-# Product mapping moved to frontend
-PRODUCT_MAPPING = {
-    "RTMS": ["FFF", "SLY", "EXW"],
-    "PTM/ROM": ["PB", "SMY"],
-    "RSB/FLEET": ["AAV"],
-    "Integration": ["ISY"]
-}
+# Low-cardinality columns, dictionary-encoded in Arrow/Parquet responses
+CATEGORICAL = ("project", "status", "owner", "current_status", "product", "assignee")
 
 class TimeStatusStory(BaseModel):
     issue_id: str
@@ -54,131 +35,64 @@ class TimeStatusStory(BaseModel):
     working_hours: float
     product: str
 
-async def fetch_from_db(query: str):
-    conn = await asyncpg.connect(DATABASE_URL)
-    data = await conn.fetch(query)
-    await conn.close()
-    return data
-
-@router.get("/stories", response_model=List[TimeStatusStory])
-async def get_average_times():
-    query = """
+def interval_filters(filters: AnalyticsFilters):
+    params = []
+    issue_where = WhereClause(params)
+    issue_where.add("i.owner <> 'None'")
+    add_issue_filters(issue_where, filters)
+    where = WhereClause(params)
+    where.add("t.status = 'in progress'")
+    add_date_range(where, filters, "t.changed_at_start")
+    return params, issue_where, where
+
+def time_in_status_query(table: str, columns: List[str], issue_where: WhereClause, where: WhereClause):
+    """
+    Working hours per issue in a status, summed in the database. Closed intervals
+    are read from interval_working_hours; open ones (ending at NOW() in UTC, as
+    the pandas version did) and any not cached yet go through working_hours().
+    Only projects that belong to a product are reported.
+    """
+    inner_columns = "".join(f"            s.{column},\n" for column in columns)
+    group_columns = "".join(f", t.{column}" for column in columns)
+    return f"""
+        WITH intervals AS (
             SELECT
             s.issue_id,
             i.key,
             i.project,
-            sh.from_status AS from_status,
             sh.to_status AS status,
             sh.changed_at AS changed_at_start,
-            COALESCE(LEAD(sh.changed_at) OVER (PARTITION BY s.issue_id ORDER BY sh.changed_at), NOW()) AS changed_at_end,
-            s.story_points,
-            i.owner,
-            s.status AS current_status
+            COALESCE(LEAD(sh.changed_at) OVER (PARTITION BY s.issue_id ORDER BY sh.changed_at), NOW() AT TIME ZONE 'UTC') AS changed_at_end,
+{inner_columns}            i.owner,
+            s.status AS current_status,
+            p.product
         FROM
             status_history sh
         JOIN issues i ON sh.issue_id = i.issue_id
-        JOIN stories s ON s.issue_id = i.issue_id
-        where s.status = 'Closed'
-    """
-    data = await fetch_from_db(query)
-
-    df = pd.DataFrame(data, columns=["issue_id","key","project","from_status","status","changed_at_start","changed_at_end","story_points","owner","current_status"])
-    df = df[df["status"] == "in progress"]
-    df = df[df["owner"] != "None"]
-    
-     # Ensure necessary datetime columns exist
-    if "changed_at_start" not in df.columns or "changed_at_end" not in df.columns:
-        return "Data does not contain required time columns."
-
-    # Convert time columns to datetime
-    df["changed_at_start"] = pd.to_datetime(df["changed_at_start"], utc=True, format='mixed')
-    df["changed_at_end"] = pd.to_datetime(df["changed_at_end"], utc=True, format='mixed')
-
-    # Calculate working hours for each row
-    df["working_hours"] = df.apply(
-        lambda row: calculate_working_hours(row["changed_at_start"], row["changed_at_end"]), axis=1
-    )
-
-    df["product"] = df["project"].map(
-        lambda x: next((product for product, projects in PRODUCT_MAPPING.items() if x in projects), None)
-    )
-
-    # Remove rows where product mapping was not found
-    df = df.dropna(subset=["product"])
-
-    #df.drop(["changed_at_start"], axis=1);
-    grouped_df = (
-        df.groupby(["issue_id", "key", "project", "status", "story_points", "owner", "current_status","product"], as_index=False)
-        .agg({"working_hours": "sum"})
-    )
-    grouped_df["working_hours"] = grouped_df["working_hours"].round(2)
-    return grouped_df.to_dict(orient="records")
-
-    #return data
-    return [
-        {
-            "issue_id": record["issue_id"],
-            "key":record["key"],
-            "project":record["project"],
-            "status": record["status"],
-            "from_status": record["from_status"],
-            "changed_at_start": record["changed_at_start"],
-            "changed_at_end": record["changed_at_end"],
-            "story_points": record["story_points"],
-            "owner": record["owner"],
-            "current_status": record["current_status"]
-        }
-        for record in data
-    ]
-
-def calculate_working_hours(start_time, end_time):
-    """
-    Calculate the working hours between two datetime objects,
-    excluding weekends, Turkish holidays, and a lunch break.
+        JOIN {table} s ON s.issue_id = i.issue_id
+        JOIN products p ON p.project = i.project
+        where s.status = 'Closed' {issue_where.sql("AND")}
+        )
+        SELECT
+            t.issue_id, t.key, t.project, t.status{group_columns}, t.owner, t.current_status, t.product,
+            ROUND(SUM(COALESCE(c.working_hours, working_hours(t.changed_at_start, t.changed_at_end)))::numeric, 2)::float AS working_hours
+        FROM intervals t
+        LEFT JOIN interval_working_hours c
+            ON c.issue_id = t.issue_id
+            AND c.changed_at_start = t.changed_at_start
+            AND c.changed_at_end = t.changed_at_end
+        {where.sql()}
+        GROUP BY t.issue_id, t.key, t.project, t.status{group_columns}, t.owner, t.current_status, t.product
     """
-    if not start_time or not end_time:
-        return 0
-
-    holidays = [datetime.strptime(date, "%Y-%m-%d").date() for date in TURKISH_HOLIDAYS]
-    total_hours = 0
-    current = start_time
-
-    while current < end_time:
-        if current.weekday() < 5 and current.date() not in holidays:  # Weekday and not a holiday
-            start_of_day = current.replace(hour=WORKING_HOURS_START, minute=0, second=0, microsecond=0)
-            end_of_day = current.replace(hour=WORKING_HOURS_END, minute=0, second=0, microsecond=0)
-            lunch_start = current.replace(hour=LUNCH_START, minute=0, second=0, microsecond=0)
-            lunch_end = current.replace(hour=LUNCH_END, minute=0, second=0, microsecond=0)
-
-            if end_time < start_of_day:
-                break;
-
-            # Adjust current time to the start of the working day if before start
-            if current < start_of_day:
-                current = min(end_time, start_of_day)
-
-            # Skip to the next day if the current time is beyond the end of the working day
-            if current >= end_of_day:
-                current += timedelta(days=1)
-                current = current.replace(hour=WORKING_HOURS_START, minute=0, second=0, microsecond=0)
-                continue
-
-            # Calculate working hours for the current day
-            effective_end_time = min(end_of_day, end_time)
-
-            if current < lunch_start:  # Before lunch
-                total_hours += (min(lunch_start, effective_end_time) - current).total_seconds() / 3600.0
-                current = min(effective_end_time, lunch_end)  # Skip to after lunch if necessary
-            if current >= lunch_end:  # After lunch
-                total_hours += (effective_end_time - max(current, lunch_end)).total_seconds() / 3600.0
-
-        # Move to the next day
-        current += timedelta(days=1)
-        current = current.replace(hour=WORKING_HOURS_START, minute=0, second=0, microsecond=0)
-
-    # Convert total hours from timedelta to float hours
-    total_hours_in_hours = total_hours.total_seconds() / 3600 if isinstance(total_hours, timedelta) else total_hours
-    return total_hours_in_hours
+
+@router.get("/stories", response_model=List[TimeStatusStory], responses=COLUMNAR_RESPONSES)
+@cached("timestatus-stories")
+async def get_time_status_stories(request: Request, filters: AnalyticsFilters = Depends(analytics_filters)):
+    params, issue_where, where = interval_filters(filters)
+    issue_where.add("s.story_points IS NOT NULL")
+    query = time_in_status_query("stories", ["story_points"], issue_where, where)
+    data = await fetch_from_db(query, *params)
+    return rows_response(request, data, TimeStatusStory, CATEGORICAL)
 
 class TimeStatusBug(BaseModel):
     issue_id: str
@@ -194,55 +108,248 @@ class TimeStatusBug(BaseModel):
     working_hours: float
     product: str
 
-@router.get("/bugs", response_model=List[TimeStatusBug])
-async def get_average_times():
-    query = """
+@router.get("/bugs", response_model=List[TimeStatusBug], responses=COLUMNAR_RESPONSES)
+@cached("timestatus-bugs")
+async def get_time_status_bugs(request: Request, filters: AnalyticsFilters = Depends(analytics_filters)):
+    params, issue_where, where = interval_filters(filters)
+    query = time_in_status_query("bugs", [], issue_where, where)
+    data = await fetch_from_db(query, *params)
+    return rows_response(request, data, TimeStatusBug, CATEGORICAL)
+
+class AssigneeTimeStory(BaseModel):
+    issue_id: str
+    key: str
+    project: str
+    product: str
+    story_points: int
+    assignee: str
+    status: str
+    working_hours: float
+
+class AssigneeTimeBug(BaseModel):
+    issue_id: str
+    key: str
+    project: str
+    product: str
+    assignee: str
+    status: str
+    working_hours: float
+
+def assignee_filters(filters: AnalyticsFilters, assignee: Optional[List[str]]):
+    params = []
+    issue_where = WhereClause(params)
+    add_issue_filters(issue_where, filters)
+    where = WhereClause(params)
+    where.any_of("t.status", filters.status or ["in progress"])
+    where.any_of("t.assignee", assignee)
+    add_date_range(where, filters, "t.changed_at_start")
+    return params, issue_where, where
+
+def assignee_time_query(table: str, columns: List[str], issue_where: WhereClause, where: WhereClause):
+    """
+    Working hours per issue, assignee and status. Status and assignee changes of
+    an issue are merged into one timeline sorted by time (a sweep line over both
+    histories, one sort per issue rather than a join of every status interval
+    with every assignee interval); each segment between two consecutive changes
+    carries the latest status and the latest assignee. An issue starts with the
+    from_assignee of its first assignee change, or its current assignee, and is
+    counted from its first status change on, like time_in_status_query.
+    Unassigned time is attributed to 'None' (NULL in older rows is read as such).
+    """
+    issue_columns = "".join(f"            s.{column},\n" for column in columns)
+    group_columns = "".join(f", se.{column}" for column in columns)
+    return f"""
+        WITH selected AS (
             SELECT
-            s.issue_id,
+            i.issue_id,
             i.key,
             i.project,
-            sh.from_status AS from_status,
+            p.product,
+            i.created,
+{issue_columns}            s.assignee AS current_assignee
+        FROM
+            issues i
+        JOIN {table} s ON s.issue_id = i.issue_id
+        JOIN products p ON p.project = i.project
+        where s.status = 'Closed' {issue_where.sql("AND")}
+        ),
+        events AS (
+            -- kind 0: status change, 1: assignee change
+            SELECT sh.issue_id, sh.changed_at AS at, 0 AS kind, sh.to_status AS status, NULL::varchar AS assignee
+            FROM status_history sh JOIN selected se ON se.issue_id = sh.issue_id
+            UNION ALL
+            SELECT ah.issue_id, ah.changed_at, 1, NULL, COALESCE(ah.to_assignee, 'None')
+            FROM assignee_history ah JOIN selected se ON se.issue_id = ah.issue_id
+            UNION ALL
+            SELECT se.issue_id, se.created, 1, NULL, COALESCE(
+                (SELECT ah.from_assignee FROM assignee_history ah
+                 WHERE ah.issue_id = se.issue_id ORDER BY ah.changed_at LIMIT 1),
+                se.current_assignee, 'None')
+            FROM selected se
+        ),
+        marked AS (
+            -- Each change opens a group that lasts until the next change of its kind
+            SELECT
+                issue_id, at, kind, status, assignee,
+                SUM(1 - kind) OVER timeline AS status_group,
+                SUM(kind) OVER timeline AS assignee_group,
+                LEAD(at) OVER timeline AS next_at
+            FROM events
+            WINDOW timeline AS (PARTITION BY issue_id ORDER BY at, kind ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        ),
+        segments AS (
+            SELECT
+                issue_id,
+                at AS changed_at_start,
+                COALESCE(next_at, NOW() AT TIME ZONE 'UTC') AS changed_at_end,
+                FIRST_VALUE(status) OVER (PARTITION BY issue_id, status_group ORDER BY at, kind) AS status,
+                FIRST_VALUE(assignee) OVER (PARTITION BY issue_id, assignee_group ORDER BY at, kind) AS assignee
+            FROM marked
+        )
+        SELECT
+            se.issue_id, se.key, se.project, se.product{group_columns}, t.assignee, t.status,
+            ROUND(SUM(working_hours(t.changed_at_start, t.changed_at_end))::numeric, 2)::float AS working_hours
+        FROM segments t
+        JOIN selected se ON se.issue_id = t.issue_id
+        WHERE t.status IS NOT NULL
+          AND t.assignee IS NOT NULL
+          AND t.assignee <> 'None'
+          AND t.changed_at_end > t.changed_at_start
+          {where.sql("AND")}
+        GROUP BY se.issue_id, se.key, se.project, se.product{group_columns}, t.assignee, t.status
+    """
+
+@router.get("/stories/by-assignee", response_model=List[AssigneeTimeStory], responses=COLUMNAR_RESPONSES)
+@cached("timestatus-stories-by-assignee")
+async def get_story_times_by_assignee(
+    request: Request,
+    assignee: Optional[List[str]] = Query(None),
+    filters: AnalyticsFilters = Depends(analytics_filters),
+):
+    """
+    Working hours of closed stories per assignee and status (status filter,
+    default "in progress"), following reassignments instead of the owner.
+    """
+    params, issue_where, where = assignee_filters(filters, assignee)
+    issue_where.add("s.story_points IS NOT NULL")
+    query = assignee_time_query("stories", ["story_points"], issue_where, where)
+    data = await fetch_from_db(query, *params)
+    return rows_response(request, data, AssigneeTimeStory, CATEGORICAL)
+
+@router.get("/bugs/by-assignee", response_model=List[AssigneeTimeBug], responses=COLUMNAR_RESPONSES)
+@cached("timestatus-bugs-by-assignee")
+async def get_bug_times_by_assignee(
+    request: Request,
+    assignee: Optional[List[str]] = Query(None),
+    filters: AnalyticsFilters = Depends(analytics_filters),
+):
+    """Working hours of closed bugs per assignee and status, like /stories/by-assignee."""
+    params, issue_where, where = assignee_filters(filters, assignee)
+    query = assignee_time_query("bugs", [], issue_where, where)
+    data = await fetch_from_db(query, *params)
+    return rows_response(request, data, AssigneeTimeBug, CATEGORICAL)
+
+class WeeklyProjectHours(BaseModel):
+    week: date
+    project: str
+    working_hours: float
+
+class WeeklyProductHours(BaseModel):
+    week: date
+    product: str
+    working_hours: float
+
+class WeeklyStatusHours(BaseModel):
+    status: str
+    by_project: List[WeeklyProjectHours]
+    by_product: List[WeeklyProductHours]
+
+@router.get("/weekly", response_model=WeeklyStatusHours)
+@cached("timestatus-weekly")
+async def get_weekly_status_hours(
+    status: str = "in progress",
+    filters: AnalyticsFilters = Depends(analytics_filters),
+):
+    """
+    Working hours stories spent in a status per week, by project and by
+    product, both aggregated in the database. Intervals are cut at week
+    boundaries and at date_from/date_to, so each week gets the hours that fell
+    into it.
+    """
+    params = []
+    issue_where = WhereClause(params)
+    add_issue_filters(issue_where, filters)
+    where = WhereClause(params)
+    where.add("t.status = {}", status)
+    piece_start = ["t.changed_at_start", "w.week"]
+    piece_end = ["t.changed_at_end", "w.week + interval '1 week'"]
+    # Intervals overlapping the range, cut to it
+    if filters.date_from is not None:
+        piece_start.append(where.param(filters.date_from))
+        where.add(f"t.changed_at_end > {piece_start[-1]}")
+    if filters.date_to is not None:
+        piece_end.append(where.param(filters.date_to))
+        where.add(f"t.changed_at_start < {piece_end[-1]}")
+    query = f"""
+        WITH intervals AS (
+            SELECT
+            s.issue_id,
+            i.project,
             sh.to_status AS status,
             sh.changed_at AS changed_at_start,
-            COALESCE(LEAD(sh.changed_at) OVER (PARTITION BY s.issue_id ORDER BY sh.changed_at), NOW()) AS changed_at_end,
-            i.owner,
-            s.status AS current_status
+            COALESCE(LEAD(sh.changed_at) OVER (PARTITION BY s.issue_id ORDER BY sh.changed_at), NOW() AT TIME ZONE 'UTC') AS changed_at_end,
+            p.product
         FROM
             status_history sh
         JOIN issues i ON sh.issue_id = i.issue_id
-        JOIN bugs s ON s.issue_id = i.issue_id
-        where s.status = 'Closed'
+        JOIN stories s ON s.issue_id = i.issue_id
+        LEFT JOIN products p ON p.project = i.project
+        {issue_where.sql()}
+        ),
+        pieces AS (
+            SELECT
+                t.issue_id, t.project, t.product, t.changed_at_start, t.changed_at_end, w.week,
+                GREATEST({", ".join(piece_start)}) AS piece_start,
+                LEAST({", ".join(piece_end)}) AS piece_end
+            FROM intervals t
+            CROSS JOIN LATERAL generate_series(
+                date_trunc('week', t.changed_at_start), t.changed_at_end, interval '1 week'
+            ) AS w(week)
+            {where.sql()}
+        )
+        SELECT
+            p.week::date AS week,
+            p.project,
+            p.product,
+            GROUPING(p.project) = 1 AS by_product,
+            -- An interval that is not cut is read from the cache like everywhere else
+            ROUND(SUM(CASE
+                WHEN p.piece_start = p.changed_at_start AND p.piece_end = p.changed_at_end
+                    THEN COALESCE(c.working_hours, working_hours(p.piece_start, p.piece_end))
+                ELSE working_hours(p.piece_start, p.piece_end)
+            END)::numeric, 2)::float AS working_hours
+        FROM pieces p
+        LEFT JOIN interval_working_hours c
+            ON c.issue_id = p.issue_id
+            AND c.changed_at_start = p.changed_at_start
+            AND c.changed_at_end = p.changed_at_end
+        WHERE p.piece_start < p.piece_end
+        GROUP BY GROUPING SETS ((p.week, p.project), (p.week, p.product))
+        ORDER BY 1, 2, 3
     """
-    data = await fetch_from_db(query)
-
-    df = pd.DataFrame(data, columns=["issue_id","key","project","from_status","status","changed_at_start","changed_at_end","owner","current_status"])
-    df = df[df["status"] == "in progress"]
-    df = df[df["owner"] != "None"]
-    
-     # Ensure necessary datetime columns exist
-    if "changed_at_start" not in df.columns or "changed_at_end" not in df.columns:
-        return "Data does not contain required time columns."
-
-    # Convert time columns to datetime
-    df["changed_at_start"] = pd.to_datetime(df["changed_at_start"], utc=True, format='mixed')
-    df["changed_at_end"] = pd.to_datetime(df["changed_at_end"], utc=True, format='mixed')
-
-    # Calculate working hours for each row
-    df["working_hours"] = df.apply(
-        lambda row: calculate_working_hours(row["changed_at_start"], row["changed_at_end"]), axis=1
-    )
-
-    df["product"] = df["project"].map(
-        lambda x: next((product for product, projects in PRODUCT_MAPPING.items() if x in projects), None)
-    )
-
-    # Remove rows where product mapping was not found
-    df = df.dropna(subset=["product"])
-
-    #df.drop(["changed_at_start"], axis=1);
-    grouped_df = (
-        df.groupby(["issue_id", "key", "project", "status", "owner", "current_status","product"], as_index=False)
-        .agg({"working_hours": "sum"})
-    )
-    grouped_df["working_hours"] = grouped_df["working_hours"].round(2)
-    return grouped_df.to_dict(orient="records")
\ No newline at end of file
+    data = await fetch_from_db(query, *params)
+
+    return FastJSONResponse({
+        "status": status,
+        "by_project": [
+            {"week": record["week"], "project": record["project"], "working_hours": record["working_hours"]}
+            for record in data
+            if not record["by_product"]
+        ],
+        # Projects without a product only appear by project
+        "by_product": [
+            {"week": record["week"], "product": record["product"], "working_hours": record["working_hours"]}
+            for record in data
+            if record["by_product"] and record["product"] is not None
+        ],
+    })
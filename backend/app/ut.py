@@ -1,25 +1,66 @@
+import os
 import unittest as ut
-from datetime import datetime, timedelta
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
 
-# Constants for the tests
-TURKISH_HOLIDAYS = ["2024-01-01", "2024-04-23", "2024-05-01"]
-WORKING_HOURS_START = 7  # Start of the working day
-WORKING_HOURS_END = 16  # End of the working day
-LUNCH_START = 10  # Lunch break starts
-LUNCH_END = 11  # Lunch break ends
+import asyncio
+import contextlib
+import pickle
 
-# The function to be tested
-def calculate_working_hours(start_time, end_time):
+import asyncpg
+import orjson
+import pandas as pd
+from pydantic import BaseModel
+from fastapi import Request, Response
+from fastapi.testclient import TestClient
+
+import businesscalendar
+from businesscalendar import BusinessCalendar, calculate_working_hours, get_calendar, sync_work_segments
+import columnar
+import config
+import db
+import flowcounts
+import profiling
+import main
+import metrics
+import resultcache
+import routes.flow
+import routes.timestatus
+from filters import (
+    AnalyticsFilters, Page, WhereClause, add_date_range, add_issue_filters, add_keyset, add_product_filter,
+    keyset_order,
+)
+from metrics import MetricQuery, compile_metric
+from migrations import migrate
+from routes.bugscreatevsresolved import iso_week
+from routes.timestatus import assignee_filters, assignee_time_query
+
+# Tests of SQL run against a database created from db/init.sql, inside a
+# transaction that is rolled back; they are skipped when this is not set
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# Constants of the default calendar.json
+HOLIDAYS = [str(day) for day in get_calendar().holidays]
+WORKING_HOURS_START = 9  # Start of the working day
+WORKING_HOURS_END = 18  # End of the working day
+LUNCH_START = 12  # Lunch break starts
+LUNCH_END = 13  # Lunch break ends
+
+
+def working_hours(start_time, end_time):
+    return float(calculate_working_hours([start_time], [end_time])[0])
+
+
+# Day-by-day reference implementation (the previous routes/timestatus.py loop)
+def calculate_working_hours_loop(start_time, end_time):
     if not start_time or not end_time:
         return 0
 
-    holidays = [datetime.strptime(date, "%Y-%m-%d").date() for date in TURKISH_HOLIDAYS]
+    holidays = [datetime.strptime(date, "%Y-%m-%d").date() for date in HOLIDAYS]
     total_hours = 0
     current = start_time
-    print(f'start_time: {start_time}')
-    print(f'end_time: {end_time}')
-    print(f'current: {current}')
-    print(f'current < end_time {current < end_time}')
+
     while current < end_time:
         if current.weekday() < 5 and current.date() not in holidays:  # Weekday and not a holiday
             start_of_day = current.replace(hour=WORKING_HOURS_START, minute=0, second=0, microsecond=0)
@@ -27,11 +68,12 @@ def calculate_working_hours(start_time, end_time):
             lunch_start = current.replace(hour=LUNCH_START, minute=0, second=0, microsecond=0)
             lunch_end = current.replace(hour=LUNCH_END, minute=0, second=0, microsecond=0)
 
-            print(f'current < start_of_day {current < start_of_day}')
+            if end_time < start_of_day:
+                break
+
             if current < start_of_day:
-                current = start_of_day
+                current = min(end_time, start_of_day)
 
-            print(f'current < end_of_day {current >= end_of_day}')
             if current >= end_of_day:
                 current += timedelta(days=1)
                 current = current.replace(hour=WORKING_HOURS_START, minute=0, second=0, microsecond=0)
@@ -39,59 +81,897 @@ def calculate_working_hours(start_time, end_time):
 
             effective_end_time = min(end_of_day, end_time)
 
-            print(f'current < lunch_start {current < lunch_start}')
             if current < lunch_start:  # Before lunch
                 total_hours += (min(lunch_start, effective_end_time) - current).total_seconds() / 3600.0
                 current = min(effective_end_time, lunch_end)  # Skip to after lunch if necessary
-
             if current >= lunch_end:  # After lunch
                 total_hours += (effective_end_time - max(current, lunch_end)).total_seconds() / 3600.0
 
         current += timedelta(days=1)
         current = current.replace(hour=WORKING_HOURS_START, minute=0, second=0, microsecond=0)
-        print(f'total hours: {total_hours}');
-        print(f'current: {current}')
-        print(f'end_time: {end_time}')
 
     return total_hours
 
 # Unit test class
 class TestCalculateWorkingHours(ut.TestCase):
     def test_same_day_full_day(self):
-        start_time = datetime(2024, 10, 30, 7, 31)
-        end_time = datetime(2024, 10, 30, 8, 2)
-        print(calculate_working_hours(start_time, end_time))
-        self.assertAlmostEqual(calculate_working_hours(start_time, end_time), 8.0)
-
-    # def test_same_day_partial_day(self):
-    #     start_time = datetime(2024, 11, 1, 10, 0)
-    #     end_time = datetime(2024, 11, 1, 15, 0)
-    #     self.assertAlmostEqual(calculate_working_hours(start_time, end_time), 4.0)
-
-    # def test_lunch_break_excluded(self):
-    #     start_time = datetime(2024, 11, 1, 11, 0)
-    #     end_time = datetime(2024, 11, 1, 14, 0)
-    #     self.assertAlmostEqual(calculate_working_hours(start_time, end_time), 2.0)
-
-    # def test_weekend_excluded(self):
-    #     start_time = datetime(2024, 11, 2, 9, 0)  # Saturday
-    #     end_time = datetime(2024, 11, 2, 18, 0)
-    #     self.assertEqual(calculate_working_hours(start_time, end_time), 0)
-
-    # def test_holiday_excluded(self):
-    #     start_time = datetime(2024, 4, 23, 9, 0)  # Holiday
-    #     end_time = datetime(2024, 4, 23, 18, 0)
-    #     self.assertEqual(calculate_working_hours(start_time, end_time), 0)
-
-    # def test_multiple_days(self):
-    #     start_time = datetime(2024, 11, 1, 15, 0)  # Friday
-    #     end_time = datetime(2024, 11, 4, 12, 0)  # Monday
-    #     self.assertAlmostEqual(calculate_working_hours(start_time, end_time), 9.0)
-
-    # def test_cross_lunch_period(self):
-    #     start_time = datetime(2024, 11, 1, 11, 30)
-    #     end_time = datetime(2024, 11, 1, 13, 30)
-    #     self.assertAlmostEqual(calculate_working_hours(start_time, end_time), 1.0)
+        start_time = datetime(2024, 10, 30, 9, 0)
+        end_time = datetime(2024, 10, 30, 18, 0)
+        self.assertAlmostEqual(working_hours(start_time, end_time), 8.0)
+
+    def test_same_day_partial_day(self):
+        start_time = datetime(2024, 11, 1, 10, 0)
+        end_time = datetime(2024, 11, 1, 15, 0)
+        self.assertAlmostEqual(working_hours(start_time, end_time), 4.0)
+
+    def test_lunch_break_excluded(self):
+        start_time = datetime(2024, 11, 1, 11, 0)
+        end_time = datetime(2024, 11, 1, 14, 0)
+        self.assertAlmostEqual(working_hours(start_time, end_time), 2.0)
+
+    def test_weekend_excluded(self):
+        start_time = datetime(2024, 11, 2, 9, 0)  # Saturday
+        end_time = datetime(2024, 11, 2, 18, 0)
+        self.assertEqual(working_hours(start_time, end_time), 0)
+
+    def test_holiday_excluded(self):
+        start_time = datetime(2024, 4, 23, 9, 0)  # Holiday
+        end_time = datetime(2024, 4, 23, 18, 0)
+        self.assertEqual(working_hours(start_time, end_time), 0)
+
+    def test_multiple_days(self):
+        start_time = datetime(2024, 11, 1, 15, 0)  # Friday
+        end_time = datetime(2024, 11, 4, 12, 0)  # Monday
+        self.assertAlmostEqual(working_hours(start_time, end_time), 6.0)
+
+    def test_cross_lunch_period(self):
+        start_time = datetime(2024, 11, 1, 11, 30)
+        end_time = datetime(2024, 11, 1, 13, 30)
+        self.assertAlmostEqual(working_hours(start_time, end_time), 1.0)
+
+    def test_start_during_lunch(self):
+        # The loop dropped the afternoon when an interval started during lunch
+        start_time = datetime(2024, 11, 1, 12, 30)
+        end_time = datetime(2024, 11, 1, 15, 0)
+        self.assertAlmostEqual(working_hours(start_time, end_time), 2.0)
+
+    def test_end_before_start(self):
+        start_time = datetime(2024, 11, 1, 15, 0)
+        end_time = datetime(2024, 11, 1, 10, 0)
+        self.assertEqual(working_hours(start_time, end_time), 0)
+
+    def test_missing_end(self):
+        hours = calculate_working_hours(pd.Series([pd.Timestamp("2024-11-01 10:00")]), pd.Series([pd.NaT]))
+        self.assertEqual(hours[0], 0)
+
+    def test_matches_loop(self):
+        rng = random.Random(0)
+        starts, ends = [], []
+        for _ in range(2000):
+            start_time = datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60))
+            if start_time.weekday() < 5 and LUNCH_START <= start_time.hour < LUNCH_END:
+                continue
+            starts.append(start_time)
+            ends.append(start_time + timedelta(minutes=rng.randint(0, 60 * 24 * 40)))
+        hours = calculate_working_hours(starts, ends)
+        for start_time, end_time, value in zip(starts, ends, hours):
+            self.assertAlmostEqual(value, calculate_working_hours_loop(start_time, end_time))
+
+    def test_timezone_aware_input(self):
+        start_time = pd.to_datetime(["2024-11-01 10:00"], utc=True)
+        end_time = pd.to_datetime(["2024-11-01 15:00"], utc=True)
+        self.assertAlmostEqual(calculate_working_hours(start_time, end_time)[0], 4.0)
+
+    def test_holiday_in_later_year(self):
+        start_time = datetime(2025, 10, 28, 9, 0)
+        end_time = datetime(2025, 10, 30, 18, 0)  # 2025-10-29 is Republic Day
+        self.assertAlmostEqual(working_hours(start_time, end_time), 16.0)
+
+    def test_outside_index_range(self):
+        start_time = datetime(2019, 11, 1, 10, 0)
+        end_time = datetime(2019, 11, 1, 15, 0)
+        self.assertAlmostEqual(working_hours(start_time, end_time), 4.0)
+
+
+class TestBusinessCalendar(ut.TestCase):
+    def test_working_day_without_lunch(self):
+        calendar = BusinessCalendar({"workday": ["09:00", "17:00"], "holidays": {}})
+        hours = calendar.working_hours([datetime(2024, 11, 1, 8, 0)], [datetime(2024, 11, 4, 12, 0)])
+        self.assertAlmostEqual(hours[0], 11.0)
+
+    def test_version_follows_settings(self):
+        settings = {"workday": ["09:00", "18:00"], "breaks": [["12:00", "13:00"]], "holidays": {}}
+        other = dict(settings, holidays={"2024-11-01": "Extra"})
+        self.assertEqual(BusinessCalendar(settings).version, BusinessCalendar(dict(settings)).version)
+        self.assertNotEqual(BusinessCalendar(settings).version, BusinessCalendar(other).version)
+
+
+class TestWhereClause(ut.TestCase):
+    def test_clauses_share_parameter_numbering(self):
+        params = []
+        issue_where, where = WhereClause(params), WhereClause(params)
+        issue_where.any_of("i.project", ["FFF", "SLY"])
+        where.add("t.changed_at >= {} AND t.changed_at < {}", datetime(2024, 1, 1), datetime(2024, 2, 1))
+        self.assertEqual(issue_where.sql(), "WHERE i.project = ANY($1)")
+        self.assertEqual(where.sql("AND"), "AND t.changed_at >= $2 AND t.changed_at < $3")
+        self.assertEqual(params, [["FFF", "SLY"], datetime(2024, 1, 1), datetime(2024, 2, 1)])
+
+    def test_empty_filters_add_nothing(self):
+        where = WhereClause()
+        where.any_of("i.project", None)
+        where.any_of("i.project", [])
+        add_issue_filters(where, AnalyticsFilters())
+        add_date_range(where, AnalyticsFilters(), "i.created")
+        self.assertEqual(where.sql(), "")
+        self.assertEqual(where.params, [])
+
+    def test_issue_filters_bind_every_value(self):
+        where = WhereClause()
+        filters = AnalyticsFilters(
+            project=["FFF"], product=["RTMS"], owner=["o'brien"], issue_type=["bug"],
+            date_from=datetime(2024, 1, 1), date_to=datetime(2024, 2, 1),
+        )
+        add_issue_filters(where, filters, issue="x")
+        add_date_range(where, filters, "x.created")
+        self.assertEqual(
+            where.conditions,
+            [
+                "x.project = ANY($1)",
+                "x.project IN (SELECT project FROM products WHERE product = ANY($2))",
+                "x.owner = ANY($3)",
+                "x.issue_type = ANY($4)",
+                "x.created >= $5",
+                "x.created < $6",
+            ],
+        )
+        self.assertEqual(
+            where.params, [["FFF"], ["RTMS"], ["o'brien"], ["bug"], datetime(2024, 1, 1), datetime(2024, 2, 1)]
+        )
+
+    def test_product_filter_on_other_column(self):
+        where = WhereClause()
+        add_product_filter(where, AnalyticsFilters(product=["RTMS", "Integration"]), "v.project")
+        self.assertEqual(where.sql(), "WHERE v.project IN (SELECT project FROM products WHERE product = ANY($1))")
+        self.assertEqual(where.params, [["RTMS", "Integration"]])
+
+    def test_keyset_cursor_and_order(self):
+        where = WhereClause()
+        page = Page(limit=50, after_changed_at=datetime(2024, 1, 1), after_issue_id="10", after_id=7)
+        add_keyset(where, page, "t.changed_at", "t.issue_id", "t.id")
+        order = keyset_order(where, page, "t.changed_at", "t.issue_id", "t.id")
+        self.assertEqual(where.sql(), "WHERE (t.changed_at, t.issue_id, t.id) > ($1, $2, $3)")
+        self.assertEqual(order, "ORDER BY t.changed_at, t.issue_id, t.id LIMIT $4")
+        self.assertEqual(where.params, [datetime(2024, 1, 1), "10", 7, 50])
+
+    def test_keyset_cursor_without_id(self):
+        where = WhereClause()
+        add_keyset(where, Page(after_changed_at=datetime(2024, 1, 1)), "t.changed_at", "t.issue_id", "t.id")
+        self.assertEqual(where.sql(), "WHERE (t.changed_at, t.issue_id) > ($1, $2)")
+        self.assertEqual(where.params, [datetime(2024, 1, 1), ""])
+
+    def test_no_order_without_paging(self):
+        self.assertEqual(keyset_order(WhereClause(), Page(), "t.changed_at", "t.issue_id", "t.id"), "")
+
+
+class TestCompileMetric(ut.TestCase):
+    def test_grouped_and_bucketed(self):
+        sql, params = compile_metric(MetricQuery(
+            dimensions=["product", "priority"],
+            measures=["count", "resolved_count"],
+            time_field="resolved",
+            bucket="week",
+            filters=AnalyticsFilters(project=["FFF"], date_from=datetime(2024, 1, 1)),
+            priority=["High"],
+        ))
+        self.assertIn("date_trunc('week', i.resolutiondate)::date AS date", sql)
+        self.assertIn("p.product AS product, b.priority AS priority", sql)
+        self.assertIn("COUNT(*) AS count, COUNT(i.resolutiondate) AS resolved_count", sql)
+        self.assertIn("GROUP BY 1, 2, 3 ORDER BY 1, 2, 3", sql)
+        self.assertIn("i.resolutiondate >= $3", sql)
+        self.assertEqual(params, [["FFF"], ["High"], datetime(2024, 1, 1)])
+
+    def test_values_are_bound_not_inlined(self):
+        sql, params = compile_metric(MetricQuery(root_cause=["x'); DROP TABLE bugs; --"]))
+        self.assertNotIn("DROP", sql)
+        self.assertEqual(params, [["x'); DROP TABLE bugs; --"]])
+
+    def test_names_outside_whitelists_rejected(self):
+        for query in (
+            MetricQuery(dimensions=["i.summary"]),
+            MetricQuery(measures=["SUM(1)"]),
+            MetricQuery(time_field="updated"),
+            MetricQuery(bucket="day', now()) --"),
+        ):
+            with self.assertRaises(ValueError):
+                compile_metric(query)
+
+
+class TestIsoWeek(ut.TestCase):
+    def test_weeks_at_year_boundaries(self):
+        self.assertEqual(iso_week(date(2024, 12, 30)), "2025-01")
+        self.assertEqual(iso_week(date(2021, 1, 4)), "2021-01")
+        self.assertEqual(iso_week(date(2020, 12, 28)), "2020-53")
+        self.assertEqual(iso_week(date(2024, 3, 4)), "2024-10")
+        self.assertIsNone(iso_week(None))
+
+
+class TestSlowQueryLog(ut.TestCase):
+    def test_argument_values_not_logged(self):
+        saved, config.SLOW_QUERY_MS = config.SLOW_QUERY_MS, 0
+        try:
+            with self.assertLogs("profiling", "WARNING") as logs:
+                profiling.record_query("SELECT * FROM issues WHERE key = $1", ("FFF-1234",), 1, 0.5)
+        finally:
+            config.SLOW_QUERY_MS = saved
+        (message,) = logs.output
+        self.assertIn("1 args: str", message)
+        self.assertNotIn("FFF-1234", message)
+
+
+class Row(BaseModel):
+    issue_id: str
+    status: str
+    changed_at: datetime
+    day: date
+    hours: float
+    points: Optional[int]
+
+
+@ut.skipUnless(columnar.PYARROW_AVAILABLE, "pyarrow not installed")
+class TestArrowTable(ut.TestCase):
+    ROWS = [
+        {"issue_id": "1", "status": "Done", "changed_at": datetime(2024, 3, 1, 9, 30), "day": date(2024, 3, 1),
+         "hours": 1.5, "points": 3},
+        {"issue_id": "2", "status": "Done", "changed_at": datetime(2024, 3, 1, 12, 0, tzinfo=timezone(timedelta(hours=3))),
+         "day": date(2024, 3, 2), "hours": 0.0, "points": None},
+        {"issue_id": "3", "status": "In Progress", "changed_at": None, "day": None, "hours": None, "points": 5},
+    ]
+
+    def test_column_types_follow_model(self):
+        table = columnar.arrow_table(self.ROWS, Row, categorical=("status",))
+        pa = columnar.pa  # imported by the first columnar call
+        self.assertEqual(table.column_names, ["issue_id", "status", "changed_at", "day", "hours", "points"])
+        self.assertEqual(table.schema.field("issue_id").type, pa.string())
+        self.assertEqual(table.schema.field("status").type, pa.dictionary(pa.int32(), pa.string()))
+        self.assertEqual(table.schema.field("changed_at").type, pa.timestamp("us"))
+        self.assertEqual(table.schema.field("day").type, pa.date32())
+        self.assertEqual(table.schema.field("hours").type, pa.float64())
+        self.assertEqual(table.schema.field("points").type, pa.int64())
+
+    def test_values_nulls_and_aware_timestamps(self):
+        table = columnar.arrow_table(self.ROWS, Row, categorical=("status",))
+        status = table.column("status").combine_chunks()
+        self.assertEqual(status.dictionary.to_pylist(), ["Done", "In Progress"])
+        self.assertEqual(status.to_pylist(), ["Done", "Done", "In Progress"])
+        # Aware values are converted to naive UTC
+        self.assertEqual(table.column("changed_at").to_pylist(), [datetime(2024, 3, 1, 9, 30), datetime(2024, 3, 1, 9, 0), None])
+        self.assertEqual(table.column("points").to_pylist(), [3, None, 5])
+        self.assertEqual(table.column("hours").null_count, 1)
+
+    def test_arrow_round_trip_to_pandas(self):
+        table = columnar.arrow_table(self.ROWS, Row, categorical=("status",))
+        df = table.to_pandas()
+        self.assertIsInstance(df["status"].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_dtype(df["changed_at"]))
+        self.assertEqual(df["points"].isna().tolist(), [False, True, False])
+
+
+class RecordingConnection:
+    """Records what is executed; fetchval answers by a fragment of the query."""
+
+    def __init__(self, values=None):
+        self.executed = []
+        self.values = values or {}
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+    async def execute(self, query, *args):
+        self.executed.append((query, args))
+
+    async def fetchval(self, query, *args):
+        return next((value for fragment, value in self.values.items() if fragment in query), None)
+
+
+class TestApplyStatusChanges(ut.TestCase):
+    def setUp(self):
+        self.saved = flowcounts._extended_through
+        flowcounts._extended_through = date.today()  # nothing to carry forward
+        self.connection = RecordingConnection()
+
+    def tearDown(self):
+        flowcounts._extended_through = self.saved
+
+    def deltas(self, changes):
+        asyncio.run(flowcounts.apply_status_changes(self.connection, "FFF", changes))
+        if not self.connection.executed:
+            return None
+        (query, (project, days, statuses, deltas)), = self.connection.executed
+        self.assertEqual(project, "FFF")
+        return sorted(zip(days, statuses, deltas))
+
+    def test_change_moves_one_issue(self):
+        day = date(2024, 3, 1)
+        self.assertEqual(
+            self.deltas([(day, None, "To Do"), (day, "To Do", "In Progress")]),
+            [(day, "In Progress", 1)],
+        )
+
+    def test_deltas_summed_per_day_and_status(self):
+        monday, tuesday = date(2024, 3, 4), date(2024, 3, 5)
+        self.assertEqual(
+            self.deltas([
+                (monday, "To Do", "In Progress"),
+                (monday, "To Do", "In Progress"),
+                (tuesday, "In Progress", "Done"),
+            ]),
+            [(monday, "In Progress", 2), (monday, "To Do", -2), (tuesday, "Done", 1), (tuesday, "In Progress", -1)],
+        )
+
+    def test_same_status_and_zero_deltas_dropped(self):
+        day = date(2024, 3, 1)
+        self.assertIsNone(self.deltas([
+            (day, "Done", "Done"),
+            (day, "To Do", "In Progress"),
+            (day, "In Progress", "To Do"),
+        ]))
+
+
+class TestBackfillDerivedTables(ut.TestCase):
+    def setUp(self):
+        self.saved = flowcounts._extended_through
+        flowcounts._extended_through = date.today()
+
+    def tearDown(self):
+        flowcounts._extended_through = self.saved
+
+    def backfilled(self, segments_rewritten, intervals_empty=False, counts_empty=False):
+        connection = RecordingConnection({
+            "FROM interval_working_hours": intervals_empty,
+            "FROM status_daily_counts": counts_empty,
+        })
+        asyncio.run(main.backfill_derived_tables(connection, segments_rewritten))
+        self.assertIn("pg_advisory_xact_lock", connection.executed[0][0])
+        return [
+            table for table in ("INSERT INTO interval_working_hours", "TRUNCATE status_daily_counts")
+            if any(table in query for query, _ in connection.executed)
+        ]
+
+    def test_complete_tables_not_scanned(self):
+        self.assertEqual(self.backfilled(False), [])
+
+    def test_first_start_fills_both(self):
+        self.assertEqual(
+            self.backfilled(False, intervals_empty=True, counts_empty=True),
+            ["INSERT INTO interval_working_hours", "TRUNCATE status_daily_counts"],
+        )
+
+    def test_calendar_change_refills_intervals(self):
+        self.assertEqual(self.backfilled(True), ["INSERT INTO interval_working_hours"])
+
+
+class SegmentsConnection(RecordingConnection):
+    """A work_segments table starting at first_segment and the oldest status change."""
+
+    def __init__(self, first_change, first_segment, version):
+        super().__init__()
+        self.first_change = first_change
+        self.stored = {"first": first_segment, "last": datetime.now() + timedelta(days=400), "version": version}
+        self.queries = 0
+        self.copied = None
+
+    async def fetchval(self, query, *args):
+        self.queries += 1
+        return self.first_change
+
+    async def fetchrow(self, query, *args):
+        self.queries += 1
+        return self.stored
+
+    async def fetch(self, query, *args):
+        return []
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied = records
+        self.stored = dict(self.stored, first=records[0][0])
+
+
+class TestExtendWorkSegments(ut.TestCase):
+    def setUp(self):
+        self.saved = businesscalendar._segments_cover
+        self.calendar = BusinessCalendar({"workday": ["09:00", "17:00"], "holidays": {}})
+
+    def tearDown(self):
+        businesscalendar._segments_cover = self.saved
+
+    def extend(self, connection, first_change):
+        return asyncio.run(businesscalendar.extend_work_segments(connection, self.calendar, first_change))
+
+    def test_covered_range_not_queried_again(self):
+        connection = SegmentsConnection(datetime(2024, 1, 1), datetime(2024, 1, 1, 9), self.calendar.version)
+        self.assertFalse(self.extend(connection, datetime(2024, 5, 1)))
+        queries = connection.queries
+        self.assertFalse(self.extend(connection, datetime(2024, 6, 3, 10)))
+        self.assertEqual(connection.queries, queries)
+        self.assertIsNone(connection.copied)
+
+    def test_older_change_extends_table(self):
+        connection = SegmentsConnection(datetime(2024, 1, 1), datetime(2024, 1, 1, 9), self.calendar.version)
+        self.extend(connection, datetime(2024, 5, 1))
+        # A sync ingested a change from before the table's first day
+        connection.first_change = datetime(2022, 3, 1, 11)
+        self.assertTrue(self.extend(connection, datetime(2022, 3, 1, 11)))
+        self.assertEqual(connection.copied[0][0], datetime(2022, 3, 1, 9))
+        self.assertFalse(self.extend(connection, datetime(2022, 3, 2)))
+
+
+class FakeConnection:
+    """Stands in for the pool connections of the shared result cache."""
+
+    def __init__(self, table):
+        self.table = table
+
+    async def fetch(self, query):
+        return []  # data_generations
+
+    async def fetchval(self, query, key, token, ttl):
+        return self.table.get((key, token))
+
+    async def execute(self, query, *args):
+        if query.strip().startswith("INSERT INTO result_cache"):
+            key, token, payload, size = args
+            self.table[(key, token)] = payload
+
+
+class FakePool:
+    def __init__(self):
+        self.table = {}
+
+    def acquire(self):
+        pool = self
+
+        class Acquire:
+            async def __aenter__(self):
+                return FakeConnection(pool.table)
+
+            async def __aexit__(self, *exc):
+                pass
+
+        return Acquire()
+
+
+UNPICKLED = []
+
+
+def _record_unpickle():
+    UNPICKLED.append(True)
+
+
+class Exploit:
+    # Unpickling this calls _record_unpickle
+    def __reduce__(self):
+        return (_record_unpickle, ())
+
+
+class TestSharedResultCache(ut.TestCase):
+    def setUp(self):
+        self.pool, self.saved = FakePool(), (db.pool, config.RESULT_CACHE_SHARED)
+        db.pool, config.RESULT_CACHE_SHARED = self.pool, True
+        resultcache.result_cache.clear()
+        self.calls = 0
+
+        @resultcache.cached("ut-shared")
+        async def endpoint(project: str = None):
+            self.calls += 1
+            return Response(content=b"rows", media_type="text/csv", headers={"X-Rows": "2"})
+
+        self.endpoint = endpoint
+
+    def tearDown(self):
+        db.pool, config.RESULT_CACHE_SHARED = self.saved
+        resultcache.result_cache.clear()
+
+    def test_hit_from_other_worker_keeps_headers(self):
+        asyncio.run(self.endpoint())
+        resultcache.result_cache.clear()  # as in a worker that never computed it
+        response = asyncio.run(self.endpoint())
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(response.body, b"rows")
+        self.assertEqual(response.headers["content-type"], "text/csv; charset=utf-8")
+        self.assertEqual(response.headers["x-rows"], "2")
+        self.assertEqual(response.headers["content-length"], "4")
+
+    def test_stored_payload_is_never_unpickled(self):
+        asyncio.run(self.endpoint())
+        for key in self.pool.table:
+            self.pool.table[key] = pickle.dumps(Exploit())
+        resultcache.result_cache.clear()
+        response = asyncio.run(self.endpoint())
+        self.assertEqual(UNPICKLED, [])
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(response.body, b"rows")
+
+
+class TestConditionalGet(ut.TestCase):
+    # The lifespan is not run (no with block), so there is no pool and the
+    # cache and data generation stay in-process
+    def setUp(self):
+        self.queries = 0
+
+        async def fetch_from_db(query, *args):
+            self.queries += 1
+            return [{"project": "FFF", "count": 3}]
+
+        self.saved = metrics.fetch_from_db
+        metrics.fetch_from_db = fetch_from_db
+        resultcache.result_cache.clear()
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        metrics.fetch_from_db = self.saved
+        resultcache.result_cache.clear()
+
+    def get(self, tag=None, project="FFF"):
+        headers = {"If-None-Match": tag} if tag else {}
+        return self.client.get("/metrics/bugs", params={"dimension": "project", "project": project}, headers=headers)
+
+    def test_same_etag_is_not_modified(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()["rows"], [{"project": "FFF", "count": 3}])
+        tag = first.headers["ETag"]
+
+        second = self.get(tag)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(second.headers["ETag"], tag)
+        self.assertEqual(self.queries, 1)
+
+    def test_cached_result_served_without_query(self):
+        self.get()
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["rows"], [{"project": "FFF", "count": 3}])
+        self.assertEqual(self.queries, 1)
+
+    def test_order_of_dimensions_is_part_of_the_key(self):
+        first = self.client.get("/metrics/bugs", params={"dimension": ["project", "priority"]})
+        second = self.client.get("/metrics/bugs", params={"dimension": ["priority", "project"]})
+        self.assertEqual(first.json()["dimensions"], ["project", "priority"])
+        self.assertEqual(second.json()["dimensions"], ["priority", "project"])
+        self.assertEqual(self.queries, 2)
+
+    def test_order_of_filter_values_is_not(self):
+        self.client.get("/metrics/bugs", params={"project": ["FFF", "SLY"]})
+        self.client.get("/metrics/bugs", params={"project": ["SLY", "FFF"]})
+        self.assertEqual(self.queries, 1)
+
+    def test_etag_follows_order_of_dimensions(self):
+        tag = self.client.get("/metrics/bugs", params={"dimension": ["project", "priority"]}).headers["ETag"]
+        response = self.client.get(
+            "/metrics/bugs", params={"dimension": ["priority", "project"]}, headers={"If-None-Match": tag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["dimensions"], ["priority", "project"])
+
+        response = self.client.get(
+            "/metrics/bugs", params={"dimension": ["project", "priority"], "project": ["SLY", "FFF"]}
+        )
+        tag = response.headers["ETag"]
+        response = self.client.get(
+            "/metrics/bugs", params={"project": ["FFF", "SLY"], "dimension": ["project", "priority"]},
+            headers={"If-None-Match": tag},
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_sync_of_project_changes_tag(self):
+        tag = self.get().headers["ETag"]
+        resultcache.data_generation.bump(["SLY"])
+        self.assertEqual(self.get(tag).status_code, 304)
+
+        resultcache.data_generation.bump(["FFF"])
+        response = self.get(tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], tag)
+        self.assertEqual(self.queries, 2)
+
+
+class TestFlowDistribution(ut.TestCase):
+    STATS = [
+        {"product": "RTMS", "count": 4, "mean_days": 3.14159, "percentiles": [2.0, 3.333, 4.5, 9.876], "max_days": 10.0},
+        {"product": "Integration", "count": 0, "mean_days": None, "percentiles": None, "max_days": None},
+    ]
+    HISTOGRAM = [
+        {"product": "RTMS", "bin": 0, "count": 3},
+        {"product": "RTMS", "bin": 2, "count": 1},
+    ]
+
+    def setUp(self):
+        self.queries = []
+
+        async def fetch_from_db(query, *args):
+            self.queries.append((query, args))
+            return self.STATS if "percentile_cont" in query else self.HISTOGRAM
+
+        self.saved = routes.flow.fetch_from_db
+        routes.flow.fetch_from_db = fetch_from_db
+        resultcache.result_cache.clear()
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        routes.flow.fetch_from_db = self.saved
+        resultcache.result_cache.clear()
+
+    def test_groups_percentiles_and_histogram(self):
+        response = self.client.get(
+            "/flow/cycle-time", params={"dimension": "product", "bin_days": 2, "bins": 4, "project": "FFF"}
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["groups_by"], ["product"])
+        self.assertEqual(body["groups"], [{
+            "product": "RTMS", "count": 4, "mean_days": 3.14,
+            "p50_days": 2.0, "p75_days": 3.33, "p85_days": 4.5, "p95_days": 9.88, "max_days": 10.0,
+            "histogram": [3, 0, 1, 0],
+        }])
+
+    def test_values_are_bound(self):
+        self.client.get("/flow/cycle-time", params={"start_status": "in review", "bin_days": 2, "bins": 4, "project": "FFF"})
+        (stats_query, stats_args), (histogram_query, histogram_args) = sorted(
+            self.queries, key=lambda query: "percentile_cont" not in query[0]
+        )
+        self.assertNotIn("in review", stats_query + histogram_query)
+        self.assertEqual(stats_args, (["FFF"], "in review"))
+        self.assertEqual(histogram_args, stats_args + (2.0, 4))
+
+
+@ut.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL not set")
+class DatabaseTestCase(ut.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await asyncpg.connect(TEST_DATABASE_URL)
+        self.transaction = self.connection.transaction()
+        await self.transaction.start()
+
+    async def asyncTearDown(self):
+        await self.transaction.rollback()
+        await self.connection.close()
+
+    async def add_issue(
+        self, issue_id, created, table="stories", assignee="None", statuses=(), assignees=(), project="FFF"
+    ):
+        """A closed issue; statuses are (changed_at, from, to), assignees (changed_at, from, to)."""
+        await self.connection.execute(
+            """
+            INSERT INTO issues (issue_id, key, summary, owner, issue_type, project, created)
+            VALUES ($1, $1, 'test', 'owner', $2, $3, $4)
+            """,
+            issue_id, table[:-1], project, created,
+        )
+        if table == "stories":
+            await self.connection.execute(
+                "INSERT INTO stories (issue_id, story_points, status, assignee) VALUES ($1, 3, 'Closed', $2)",
+                issue_id, assignee,
+            )
+        else:
+            await self.connection.execute(
+                "INSERT INTO bugs (issue_id, status, assignee) VALUES ($1, 'Closed', $2)", issue_id, assignee
+            )
+        await self.connection.executemany(
+            "INSERT INTO status_history (issue_id, changed_at, from_status, to_status) VALUES ($1, $2, $3, $4)",
+            [(issue_id, *change) for change in statuses],
+        )
+        await self.connection.executemany(
+            "INSERT INTO assignee_history (issue_id, changed_at, from_assignee, to_assignee) VALUES ($1, $2, $3, $4)",
+            [(issue_id, *change) for change in assignees],
+        )
+
+
+class TestAssigneeTime(DatabaseTestCase):
+    # Monday 2024-11-04 to Wednesday 2024-11-06, working days of 8 hours
+    STATUSES = [
+        (datetime(2024, 11, 4, 9, 0), "To Do", "in progress"),
+        (datetime(2024, 11, 6, 18, 0), "in progress", "Closed"),
+    ]
+
+    async def hours(self, issue_id):
+        await sync_work_segments(self.connection, get_calendar())
+        params, issue_where, where = assignee_filters(AnalyticsFilters(), None)
+        issue_where.add("i.issue_id = {}", issue_id)
+        rows = await self.connection.fetch(assignee_time_query("stories", ["story_points"], issue_where, where), *params)
+        return {(row["assignee"], row["status"]): row["working_hours"] for row in rows}
+
+    async def test_reassigned_unassigned_and_reassigned_again(self):
+        await self.add_issue(
+            "ut-assignee-1",
+            datetime(2024, 11, 4, 8, 0),
+            assignee="bob",
+            statuses=self.STATUSES,
+            assignees=[
+                (datetime(2024, 11, 4, 14, 0), "alice", None),  # unassigned, as stored by older syncs
+                (datetime(2024, 11, 5, 9, 0), "None", "bob"),
+            ],
+        )
+        self.assertEqual(
+            await self.hours("ut-assignee-1"),
+            {("alice", "in progress"): 4.0, ("bob", "in progress"): 16.0},
+        )
+
+    async def test_reassigned_twice(self):
+        await self.add_issue(
+            "ut-assignee-2",
+            datetime(2024, 11, 4, 8, 0),
+            assignee="alice",
+            statuses=self.STATUSES,
+            assignees=[
+                (datetime(2024, 11, 5, 9, 0), "alice", "bob"),
+                (datetime(2024, 11, 6, 9, 0), "bob", "alice"),
+            ],
+        )
+        self.assertEqual(
+            await self.hours("ut-assignee-2"),
+            {("alice", "in progress"): 16.0, ("bob", "in progress"): 8.0},
+        )
+
+    async def test_without_assignee_history(self):
+        await self.add_issue("ut-assignee-3", datetime(2024, 11, 4, 8, 0), assignee="carol", statuses=self.STATUSES)
+        self.assertEqual(await self.hours("ut-assignee-3"), {("carol", "in progress"): 24.0})
+
+    async def test_never_assigned(self):
+        await self.add_issue("ut-assignee-4", datetime(2024, 11, 4, 8, 0), statuses=self.STATUSES)
+        self.assertEqual(await self.hours("ut-assignee-4"), {})
+
+
+class TestMigrations(DatabaseTestCase):
+    async def test_code_review_verdicts_backfilled_once(self):
+        await self.add_issue("ut-review-1", datetime(2024, 11, 4, 8, 0))
+        await self.connection.executemany(
+            "INSERT INTO code_review_history (issue_id, code_review_status, changed_at) VALUES ($1, $2, $3)",
+            [
+                ("ut-review-1", "Not Passed", datetime(2024, 11, 4, 10, 0)),
+                ("ut-review-1", "Passed", datetime(2024, 11, 5, 10, 0)),
+            ],
+        )
+        await migrate(self.connection)
+        # As on a database from before the table was filled during ingestion
+        await self.connection.execute("DELETE FROM code_review_verdicts WHERE issue_id = 'ut-review-1'")
+        await self.connection.execute("DELETE FROM schema_migrations WHERE name = '003_code_review_verdicts'")
+
+        self.assertEqual(await migrate(self.connection), ["003_code_review_verdicts"])
+        verdict = await self.connection.fetchval(
+            "SELECT code_review_status FROM code_review_verdicts WHERE issue_id = 'ut-review-1'"
+        )
+        self.assertEqual(verdict, "Not Passed")
+        self.assertEqual(await migrate(self.connection), [])
+
+
+class TestWeeklyStatusHours(DatabaseTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await sync_work_segments(self.connection, get_calendar())
+        # Friday 2024-11-08 09:00 to Tuesday 2024-11-12 12:00 in progress
+        await self.add_issue(
+            "ut-weekly-1",
+            datetime(2024, 11, 8, 8, 0),
+            project="UTW",
+            statuses=[
+                (datetime(2024, 11, 8, 9, 0), "To Do", "in progress"),
+                (datetime(2024, 11, 12, 12, 0), "in progress", "Closed"),
+            ],
+        )
+        self.saved = routes.timestatus.fetch_from_db
+        routes.timestatus.fetch_from_db = self.connection.fetch
+        resultcache.result_cache.clear()
+
+    async def asyncTearDown(self):
+        routes.timestatus.fetch_from_db = self.saved
+        resultcache.result_cache.clear()
+        await super().asyncTearDown()
+
+    async def weeks(self, **filters):
+        response = await routes.timestatus.get_weekly_status_hours(
+            status="in progress", filters=AnalyticsFilters(project=["UTW"], **filters)
+        )
+        return {str(row["week"]): row["working_hours"] for row in orjson.loads(response.body)["by_project"]}
+
+    async def test_interval_split_at_week_boundary(self):
+        self.assertEqual(await self.weeks(), {"2024-11-04": 8.0, "2024-11-11": 11.0})
+
+    async def test_interval_cut_to_date_range(self):
+        self.assertEqual(await self.weeks(date_from=datetime(2024, 11, 11, 12, 0)), {"2024-11-11": 8.0})
+        self.assertEqual(await self.weeks(date_to=datetime(2024, 11, 11)), {"2024-11-04": 8.0})
+
+
+class TestInsertIssueData(DatabaseTestCase):
+    ISSUE = {
+        "id": "ut-sync-1",
+        "key": "UTS-1",
+        "fields": {
+            "summary": "test",
+            "customfield_10180": None,
+            "created": "2024-11-04T08:00:00.000+0000",
+            "resolutiondate": None,
+            "resolution": None,
+            "customfield_10104": None,
+            "status": {"name": "Closed"},
+            "assignee": None,
+            "priority": {"name": "High"},
+        },
+        "changelog": {"histories": [
+            {"created": "2024-11-04T09:00:00.000+0000", "items": [{"field": "status", "fromString": "Open", "toString": "in progress"}]},
+            {"created": "2024-11-05T09:00:00.000+0000", "items": [{"field": "status", "fromString": "in progress", "toString": "Closed"}]},
+        ]},
+    }
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        connection = self.connection
+
+        class Pool:
+            @contextlib.asynccontextmanager
+            async def acquire(self):
+                yield connection
+
+        self.refreshed = []
+        # work_segments synced by earlier tests was rolled back with them
+        self.addCleanup(setattr, businesscalendar, "_segments_cover", businesscalendar._segments_cover)
+        businesscalendar._segments_cover = None
+
+        async def refresh_issue_intervals(connection, issue_id, calendar_version):
+            self.refreshed.append(issue_id)
+            await saved_refresh(connection, issue_id, calendar_version)
+
+        saved_pool, saved_refresh = main.db_pool, main.refresh_issue_intervals
+        main.db_pool, main.refresh_issue_intervals = Pool(), refresh_issue_intervals
+        self.addCleanup(setattr, main, "db_pool", saved_pool)
+        self.addCleanup(setattr, main, "refresh_issue_intervals", saved_refresh)
+
+    async def test_intervals_only_refreshed_for_new_changes(self):
+        await main.insert_issue_data(self.ISSUE, "bug", "UTS")
+        self.assertEqual(self.refreshed, ["ut-sync-1"])
+        hours = await self.connection.fetchval(
+            "SELECT working_hours FROM interval_working_hours WHERE issue_id = 'ut-sync-1'"
+        )
+        self.assertAlmostEqual(hours, 8.0)
+
+        # A resync of the unchanged issue costs no interval queries
+        await main.insert_issue_data(self.ISSUE, "bug", "UTS")
+        self.assertEqual(self.refreshed, ["ut-sync-1"])
+
+
+class TestKeysetPagination(DatabaseTestCase):
+    async def test_pages_across_equal_timestamps(self):
+        changed_at = datetime(2024, 11, 4, 10, 0)
+        await self.add_issue(
+            "ut-keyset-1",
+            datetime(2024, 11, 4, 8, 0),
+            project="UT",
+            statuses=[
+                (changed_at, "To Do", "in progress"),
+                (changed_at, "in progress", "review"),
+                (changed_at, "review", "Closed"),
+            ],
+        )
+        saved = main.fetch_from_db
+        main.fetch_from_db = lambda query, *params: self.connection.fetch(query, *params)
+        self.addCleanup(setattr, main, "fetch_from_db", saved)
+        request = Request({"type": "http", "method": "GET", "path": "/average-times", "headers": [], "query_string": b""})
+
+        seen, page = [], Page(limit=1)
+        while True:
+            response = await main.get_average_times(request, AnalyticsFilters(project=["UT"]), page)
+            rows = orjson.loads(response.body)
+            if not rows:
+                break
+            seen += [row["status"] for row in rows]
+            last = rows[-1]
+            page = Page(
+                limit=1,
+                after_changed_at=datetime.fromisoformat(last["changed_at_start"]),
+                after_issue_id=last["issue_id"],
+                after_id=last["id"],
+            )
+        self.assertEqual(sorted(seen), ["Closed", "in progress", "review"])
+
 
 if __name__ == "__main__":
     ut.main()
@@ -30,7 +30,8 @@ CREATE TABLE bugs (
     issue_id VARCHAR(255) UNIQUE NOT NULL,
     status VARCHAR(255),
     assignee VARCHAR(255),
-    bug_root_cause TEXT
+    bug_root_cause TEXT,
+    priority VARCHAR(255)
 );
 
 -- Status History Table
@@ -63,3 +64,109 @@ CREATE TABLE code_review_history (
     code_review_result VARCHAR(255),
     UNIQUE (issue_id, code_review_status, changed_at)
 );
+
+-- Everything below (and bugs.priority) was added after the first release;
+-- the backend applies the same changes to older databases at startup (see
+-- backend migrations.py), so keep both in step.
+
+-- Indexes for filtered / paginated analytics queries
+CREATE INDEX idx_issues_project ON issues (project, issue_type);
+CREATE INDEX idx_issues_owner ON issues (owner);
+CREATE INDEX idx_status_history_issue_changed_at ON status_history (issue_id, changed_at);
+CREATE INDEX idx_status_history_changed_at_issue ON status_history (changed_at, issue_id);
+-- First entry into a status per issue (cycle time)
+CREATE INDEX idx_status_history_to_status ON status_history (to_status, issue_id, changed_at);
+CREATE INDEX idx_issues_type_created ON issues (issue_type, created);
+CREATE INDEX idx_issues_type_resolutiondate ON issues (issue_type, resolutiondate);
+
+-- Code Review Verdicts Table: one row per issue holding the "worst then latest"
+-- code review result, maintained while ingesting the changelog
+CREATE TABLE code_review_verdicts (
+    issue_id VARCHAR(255) PRIMARY KEY,
+    project VARCHAR(50) NOT NULL,
+    code_review_status VARCHAR(255),
+    changed_at TIMESTAMP NOT NULL
+);
+CREATE INDEX idx_code_review_verdicts_project ON code_review_verdicts (project, changed_at);
+
+-- Products Table: the product dimension, one row per Jira project. Endpoints
+-- join it to filter and group by product; the backend reads it at startup, so
+-- restart it after changing products.
+CREATE TABLE products (
+    project VARCHAR(255) PRIMARY KEY,
+    product VARCHAR(255) NOT NULL
+);
+CREATE INDEX idx_products_product ON products (product);
+INSERT INTO products (project, product) VALUES
+    ('FFF', 'RTMS'), ('SLY', 'RTMS'), ('EXW', 'RTMS'),
+    ('PB', 'PTM/ROM'), ('SMY', 'PTM/ROM'),
+    ('AAV', 'RSB/FLEET'),
+    ('ISY', 'Integration');
+
+-- Work Segments Table: the business calendar (see backend businesscalendar.py),
+-- one row per working window of every business day. seconds_before is the
+-- working time from the first segment up to segment_start.
+CREATE TABLE work_segments (
+    segment_start TIMESTAMP PRIMARY KEY,
+    segment_end TIMESTAMP NOT NULL,
+    seconds_before DOUBLE PRECISION NOT NULL,
+    calendar_version VARCHAR(64) NOT NULL
+);
+
+-- Working seconds from the start of the calendar up to t
+CREATE FUNCTION working_seconds_at(t TIMESTAMP) RETURNS DOUBLE PRECISION AS $$
+    SELECT COALESCE(
+        (SELECT seconds_before + EXTRACT(EPOCH FROM LEAST(t, segment_end) - segment_start)
+         FROM work_segments
+         WHERE segment_start <= t
+         ORDER BY segment_start DESC
+         LIMIT 1),
+        0)
+$$ LANGUAGE sql STABLE;
+
+-- Working hours between two timestamps: two index lookups and a subtraction
+CREATE FUNCTION working_hours(start_time TIMESTAMP, end_time TIMESTAMP) RETURNS DOUBLE PRECISION AS $$
+    SELECT GREATEST(working_seconds_at(end_time) - working_seconds_at(start_time), 0) / 3600.0
+$$ LANGUAGE sql STABLE;
+
+-- Interval Working Hours Table: working hours of closed status intervals,
+-- computed once with the calendar version noted in calendar_version
+CREATE TABLE interval_working_hours (
+    issue_id VARCHAR(255) NOT NULL,
+    changed_at_start TIMESTAMP NOT NULL,
+    changed_at_end TIMESTAMP NOT NULL,
+    working_hours DOUBLE PRECISION NOT NULL,
+    calendar_version VARCHAR(64) NOT NULL,
+    PRIMARY KEY (issue_id, changed_at_start, changed_at_end)
+);
+CREATE INDEX idx_interval_working_hours_range ON interval_working_hours (changed_at_start, changed_at_end);
+
+-- Status Daily Counts Table: issues per status at the end of each day and
+-- project, maintained incrementally from new status changes (see backend
+-- flowcounts.py); rebuilt from status_history at startup when empty
+CREATE TABLE status_daily_counts (
+    project VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    status VARCHAR(255) NOT NULL,
+    issues INTEGER NOT NULL,
+    PRIMARY KEY (project, day, status)
+);
+
+-- Shared result cache (see backend resultcache.py): encoded analytics responses
+-- readable by every backend worker. UNLOGGED, as it can always be recomputed;
+-- a crash simply empties it.
+CREATE UNLOGGED TABLE result_cache (
+    key TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    value BYTEA NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX idx_result_cache_created_at ON result_cache (created_at);
+
+-- Data generation counters bumped by every sync, per project ('all' and
+-- 'epoch' are the global ones); cached results are tagged with them
+CREATE TABLE data_generations (
+    scope VARCHAR(255) PRIMARY KEY,
+    generation BIGINT NOT NULL
+);
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode
+import pandas as pd
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+
+# Client for the backend API, shared by every page.
+#
+# BACKEND_URL is the one place the backend's address is configured; pages pass
+# paths such as "/flow/cfd". Requests go through one keep-alive session.
+#
+# 200 responses are kept per URL and parameters. Within an endpoint's TTL a
+# stored response is returned without asking the backend at all, so widget
+# interactions don't download the same payload again. After the TTL it is
+# still returned as is for up to STALE_SECONDS, while a background thread
+# revalidates it (stale-while-revalidate); older responses are revalidated
+# before returning. The backend tags analytics responses with an ETag that only
+# changes when a sync changed the data, so revalidating sends If-None-Match and
+# usually comes back as an empty 304.
+BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000").rstrip("/")
+DEFAULT_TTL = float(os.getenv("API_CACHE_TTL", 60))
+STALE_SECONDS = float(os.getenv("API_CACHE_STALE", 600))
+# Per-endpoint TTLs in seconds, by path prefix (longest match wins)
+TTLS = {
+    "/products": 3600,
+    "/ready": 0,
+}
+TIMEOUT = 60
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+MAX_ENTRIES = 64
+_responses = OrderedDict()
+_refreshing = set()
+_lock = threading.Lock()
+
+# Pages load their endpoints concurrently on this pool (see load_all)
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("API_WORKERS", 8)), thread_name_prefix="api-client")
+
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+def url(path):
+    """Absolute URL of a backend path; absolute URLs are returned unchanged."""
+    if path.startswith(("http://", "https://")):
+        return path
+    return BACKEND_URL + "/" + path.lstrip("/")
+
+
+def ttl_for(full_url):
+    path = full_url[len(BACKEND_URL):] if full_url.startswith(BACKEND_URL) else full_url
+    matches = [prefix for prefix in TTLS if path.startswith(prefix)]
+    return TTLS[max(matches, key=len)] if matches else DEFAULT_TTL
+
+
+def clear():
+    """Forget every stored response, e.g. for a "Reload Data" button."""
+    with _lock:
+        _responses.clear()
+
+
+def _key(url, params, accept=None):
+    key = url
+    if params:
+        key += "?" + urlencode(sorted(params.items()), doseq=True)
+    if accept:
+        key += " " + accept
+    return key
+
+
+def _fetch(key, full_url, params, headers, cached, **kwargs):
+    """Send the request, revalidating cached when given; returns the response to use."""
+    headers = dict(headers)
+    if cached is not None and "ETag" in cached.headers:
+        headers["If-None-Match"] = cached.headers["ETag"]
+    kwargs.setdefault("timeout", TIMEOUT)
+    response = _session.get(full_url, params=params, headers=headers, **kwargs)
+    now = time.monotonic()
+    if response.status_code == 304 and cached is not None:
+        with _lock:
+            if key in _responses:
+                _responses[key] = (cached, now)
+                _responses.move_to_end(key)
+        return cached
+
+    if response.status_code == 200:
+        with _lock:
+            _responses[key] = (response, now)
+            _responses.move_to_end(key)
+            while len(_responses) > MAX_ENTRIES:
+                _responses.popitem(last=False)
+    return response
+
+
+def _revalidate(key, full_url, params, headers, cached, kwargs):
+    try:
+        _fetch(key, full_url, params, headers, cached, **kwargs)
+    except requests.exceptions.RequestException:
+        pass  # Keep serving the stored response; the next call tries again
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def get(path, params=None, **kwargs):
+    """
+    Drop-in replacement for requests.get, taking a backend path or a URL.
+    Returns a stored response while it is fresh (or stale and being refreshed).
+    """
+    full_url = url(path)
+    headers = dict(kwargs.pop("headers", None) or {})
+    key = _key(full_url, params, headers.get("Accept"))
+    with _lock:
+        entry = _responses.get(key)
+
+    if entry is not None:
+        cached, fetched_at = entry
+        age = time.monotonic() - fetched_at
+        ttl = ttl_for(full_url)
+        if age < ttl:
+            return cached
+        if age < ttl + STALE_SECONDS:
+            with _lock:
+                start = key not in _refreshing
+                _refreshing.add(key)
+            if start:
+                threading.Thread(
+                    target=_revalidate,
+                    args=(key, full_url, params, headers, cached, kwargs),
+                    daemon=True,
+                ).start()
+            return cached
+        return _fetch(key, full_url, params, headers, cached, **kwargs)
+
+    return _fetch(key, full_url, params, headers, None, **kwargs)
+
+
+def get_frame(path, params=None, columns=None, **kwargs):
+    """
+    Fetch a list endpoint as a DataFrame. Asks for the Arrow representation, which
+    arrives with typed timestamp and categorical columns and needs no parsing;
+    falls back to JSON when the backend doesn't offer it. Returns None on failure.
+    """
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers["Accept"] = f"{ARROW_STREAM}, application/json;q=0.5"
+    response = get(path, params=params, headers=headers, **kwargs)
+    if response.status_code != 200:
+        return None
+    if response.headers.get("Content-Type", "").startswith(ARROW_STREAM):
+        return pa.ipc.open_stream(response.content).read_pandas()
+    return pd.DataFrame(response.json(), columns=columns)
+
+
+def load_all(calls):
+    """
+    Run calls ({name: function without arguments}) concurrently and yield
+    (name, future) in the order they finish, so a page can draw each section as
+    soon as its data is there. future.result() raises what the call raised.
+    Streamlit elements must only be created by the caller, not by the calls.
+    """
+    futures = {_executor.submit(call): name for name, call in calls.items()}
+    for future in as_completed(futures):
+        yield futures[future], future
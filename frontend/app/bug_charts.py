@@ -0,0 +1,92 @@
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+import api_client
+
+# Created vs. resolved bug charts, shared by the bug statistics pages
+
+# Fetch a dense created/resolved series from the `/bugs/created-vs-resolved` endpoint.
+# Runs on the api_client pool, so errors are raised to the page instead of shown here.
+def fetch_created_vs_resolved(start_date, end_date, bucket, project=None):
+    params = {"date_from": start_date.isoformat(), "date_to": end_date.isoformat(), "bucket": bucket}
+    if project:
+        params["project"] = project
+    response = api_client.get("/bugs/created-vs-resolved", params=params)
+    response.raise_for_status()
+    series = pd.DataFrame(response.json()["series"], columns=["date", "created_count", "resolved_count"])
+    series["date"] = pd.to_datetime(series["date"])
+    return series
+
+def draw_daily(final_df):
+    # Create a Plotly figure
+    fig = go.Figure()
+
+    # Add the first data series to the plot
+    fig.add_trace(
+        go.Scatter(
+            x=final_df['date'],
+            y=final_df['created_count'],
+            mode='lines+markers',
+            name='Created'
+        )
+    )
+
+    # Add the second data series to the plot
+    fig.add_trace(
+        go.Scatter(
+            x=final_df['date'],
+            y=final_df['resolved_count'],
+            mode='lines+markers',
+            name='Resolved'
+        )
+    )
+
+    # Customize the chart
+    fig.update_layout(
+        title='',
+        xaxis_title='Date',
+        yaxis_title='Value',
+        template='plotly_dark',  # You can change the template to 'plotly', 'ggplot2', etc.
+        xaxis=dict(tickangle=45),  # Rotate x-axis labels for better readability
+    )
+
+    # Display the plot in Streamlit
+    st.plotly_chart(fig)
+
+def draw_weekly(weekly_data):
+    weekly_data = weekly_data.rename(columns={"date": "week_start"})
+
+    # Create a Plotly figure
+    fig = go.Figure()
+
+    # Add the first data series (created count) to the plot
+    fig.add_trace(
+        go.Bar(
+            x=weekly_data['week_start'],
+            y=weekly_data['created_count'],
+            name='Created Count',
+            marker_color='blue'
+        )
+    )
+
+    # Add the second data series (resolved count) to the plot
+    fig.add_trace(
+        go.Bar(
+            x=weekly_data['week_start'],
+            y=weekly_data['resolved_count'],
+            name='Resolved Count',
+            marker_color='orange'
+        )
+    )
+
+    # Customize the chart
+    fig.update_layout(
+        title='',
+        xaxis_title='Week Starting Date',
+        yaxis_title='Count',
+        template='plotly_dark',
+        xaxis=dict(tickangle=45, type='category'),  # Adjust x-axis type for datetime display
+    )
+
+    # Display the plot in Streamlit
+    st.plotly_chart(fig)
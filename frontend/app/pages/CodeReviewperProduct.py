@@ -1,40 +1,34 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import requests
+import api_client
 
-API_URL = "http://backend:8000/code-review-history"
-
-# Product mapping moved to frontend
-PRODUCT_MAPPING = {
-    "RTMS": ["FFF", "SLY", "EXW"],
-    "PTM/ROM": ["PB", "SMY"],
-    "RSB/FLEET": ["AAV"],
-    "Integration": ["ISY"]
-}
+API_URL = "/code-review-history"
+PRODUCTS_URL = "/products"
 
 
 def fetch_code_review_data():
     """Fetch raw code review data from the FastAPI backend."""
-    response = requests.get(API_URL)
+    response = api_client.get(API_URL)
     if response.status_code == 200:
         return response.json()
-    else:
-        st.error("Failed to fetch data from backend.")
-        return []
+    return None
+
+
+def fetch_products():
+    """Product names from the backend's products table."""
+    response = api_client.get(PRODUCTS_URL)
+    if response.status_code == 200:
+        return sorted(response.json())
+    return []
 
 
 def group_and_count_by_product(data):
     """Group raw data by product and calculate counts."""
-    # Convert raw data into a DataFrame
+    # Convert raw data into a DataFrame; the backend joins each project's product
     df = pd.DataFrame(data)
-    
-    # Map projects to products
-    df["product"] = df["project"].map(
-        lambda x: next((product for product, projects in PRODUCT_MAPPING.items() if x in projects), None)
-    )
 
-    # Remove rows where product mapping was not found
+    # Remove rows of projects that belong to no product
     df = df.dropna(subset=["product"])
 
     # Group and count by product and review_result
@@ -45,15 +39,24 @@ def group_and_count_by_product(data):
 def main():
     st.title("Code Review Results by Product")
 
-    # Fetch raw data from the API
-    st.write("Loading data...")
-    raw_data = fetch_code_review_data()
+    # Fetch raw data and the product list from the API at the same time
+    placeholder = st.empty()
+    placeholder.info("Loading data...")
+    results = {
+        name: future.result()
+        for name, future in api_client.load_all({"reviews": fetch_code_review_data, "products": fetch_products})
+    }
+    placeholder.empty()
+    raw_data = results["reviews"]
+    if raw_data is None:
+        st.error("Failed to fetch data from backend.")
+        return
     if not raw_data:
         return
 
     # Sidebar filter for products
     st.sidebar.header("Filters")
-    all_products = sorted(PRODUCT_MAPPING.keys())
+    all_products = results["products"]
     selected_products = st.sidebar.multiselect("Select Products:", options=all_products, default=all_products)
 
     # Process raw data to calculate counts
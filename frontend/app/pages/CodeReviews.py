@@ -1,17 +1,15 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import requests
+import api_client
 from datetime import datetime, timedelta
 
 # API URL to get code review history data
-API_URL = "http://backend:8000/code-review-history"
+API_URL = "/code-review-history"
 
 # Fetch data from the API
-@st.cache_data
-
 def fetch_code_review_data():
-    response = requests.get(API_URL)
+    response = api_client.get(API_URL)
     if response.status_code == 200:
         df = pd.DataFrame(response.json())
         df['changed_at'] = pd.to_datetime(df['changed_at'])
@@ -23,7 +21,7 @@ def fetch_code_review_data():
 # Main Streamlit app
 st.title("Code Review Results Overview")
 if st.button("Reload Data"):
-        st.cache_data.clear()
+        api_client.clear()
 # Fetch data
 data = fetch_code_review_data()
 
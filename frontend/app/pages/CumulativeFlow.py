@@ -0,0 +1,66 @@
+import streamlit as st
+import api_client
+from datetime import datetime, timedelta
+import plotly.express as px
+
+API_URL = "/flow/cfd"
+PRODUCTS_URL = "/products"
+
+def fetch_products():
+    """Projects per product from the backend's products table."""
+    response = api_client.get(PRODUCTS_URL)
+    if response.status_code == 200:
+        return response.json()
+    return {}
+
+def fetch_cumulative_flow(date_from, date_to, product=None, project=None):
+    """Daily issue counts per status, read from the backend's daily snapshot table."""
+    params = {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()}
+    if product:
+        params["product"] = product
+    if project:
+        params["project"] = project
+    return api_client.get_frame(API_URL, params=params, columns=["day", "status", "issues"])
+
+def main():
+    st.title("Cumulative Flow")
+
+    # Sidebar filters
+    st.sidebar.header("Filters")
+    today = datetime.now().date()
+    date_from = st.sidebar.date_input("From", today - timedelta(weeks=26))
+    date_to = st.sidebar.date_input("To", today)
+    products = fetch_products()
+    product = st.sidebar.selectbox("Product", ["All"] + sorted(products))
+    if product == "All":
+        projects = sorted(key for keys in products.values() for key in keys)
+    else:
+        projects = products[product]
+    project = st.sidebar.selectbox("Project", ["All"] + projects)
+
+    df = fetch_cumulative_flow(
+        date_from,
+        date_to,
+        product=None if product == "All" else product,
+        project=None if project == "All" else project,
+    )
+    if df is None:
+        st.error("Failed to fetch data from backend.")
+        return
+    if df.empty:
+        st.info("No status changes in the selected range.")
+        return
+
+    # Stacked areas, one band per status
+    fig = px.area(
+        df,
+        x="day",
+        y="issues",
+        color="status",
+        title="Issues per Status",
+        labels={"day": "Day", "issues": "Issues", "status": "Status"},
+    )
+    st.plotly_chart(fig)
+
+if __name__ == "__main__":
+    main()
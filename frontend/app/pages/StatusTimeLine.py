@@ -1,15 +1,26 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import requests
+import api_client
+from datetime import datetime, timedelta
 
-API_URL = "http://backend:8000/average-times"
+API_URL = "/average-times"
+PRODUCTS_URL = "/products"
 
-def fetch_data():
-    """Fetch data from the FastAPI backend."""
-    response = requests.get(API_URL)
+def fetch_projects():
+    """Projects of every product, from the backend's products table."""
+    response = api_client.get(PRODUCTS_URL)
     if response.status_code == 200:
-        df = pd.DataFrame(response.json())
+        return sorted(project for projects in response.json().values() for project in projects)
+    st.error("Failed to fetch projects from backend.")
+    return []
+
+def fetch_data(params=None):
+    """Fetch data from the FastAPI backend, filtered on the server."""
+    df = api_client.get_frame(API_URL, params=params)
+    if df is not None:
+        if df.empty:
+            return df
         # Convert date columns to datetime objects
         df['changed_at_start'] = pd.to_datetime(df['changed_at_start'], utc=True, format='mixed')
         df['changed_at_end'] = pd.to_datetime(df['changed_at_end'], utc=True, format='mixed')
@@ -21,21 +32,27 @@ def fetch_data():
 def main():
     st.title("Project and Owner Timeline Viewer")
 
+    # Sidebar filters (project and date range are applied by the backend)
+    st.sidebar.header("Filters")
+    project_filter = st.sidebar.selectbox("Project:", options=["All"] + fetch_projects())
+    today = datetime.now().date()
+    date_from = st.sidebar.date_input("From", today - timedelta(days=30))
+    date_to = st.sidebar.date_input("To", today)
+
+    params = {"date_from": date_from.isoformat(), "date_to": (date_to + timedelta(days=1)).isoformat()}
+    if project_filter != "All":
+        params["project"] = project_filter
+
     # Fetch data from the backend
     st.write("Loading data...")
-    data = fetch_data()
+    data = fetch_data(params)
 
     if data.empty:
         return
 
-    # Sidebar filters
-    st.sidebar.header("Filters")
-    project_filter = st.sidebar.text_input("Project (contains):")
     owner_filter = st.sidebar.selectbox("Owner:", options=["All"] + sorted(data['owner'].dropna().unique().tolist()))
 
     # Apply filters
-    if project_filter:
-        data = data[data['project'].str.contains(project_filter, case=False, na=False)]
     if owner_filter and owner_filter != "All":
         data = data[data['owner'] == owner_filter]
 
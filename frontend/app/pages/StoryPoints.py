@@ -1,15 +1,13 @@
 import streamlit as st
 import pandas as pd
-import requests
+import api_client
 
-API_URL = "http://backend:8000/stories"
+API_URL = "/stories"
 
-@st.cache_data
 def fetch_data():
     """Fetch data from the FastAPI backend."""
-    response = requests.get(API_URL)
-    if response.status_code == 200:
-        df = pd.DataFrame(response.json(),columns=["issue_id","key","project","status","story_points","owner"])
+    df = api_client.get_frame(API_URL, columns=["issue_id","key","project","status","story_points","owner"])
+    if df is not None:
         return df
     else:
         st.error("Failed to fetch data from backend.")
@@ -27,7 +25,7 @@ def calculate_metrics(data, only_closed):
         data = data[data['status'] == "Closed"]
 
     # Total story points per owner
-    total_points_per_owner = data.groupby('owner')['story_points'].sum()
+    total_points_per_owner = data.groupby('owner', observed=True)['story_points'].sum()
 
     # Total story points grouped by story points per owner (matrix form)
     df = data
@@ -40,7 +38,8 @@ def calculate_metrics(data, only_closed):
         aggfunc='sum',
         fill_value=0,
         margins=True,
-        margins_name='Sum'
+        margins_name='Sum',
+        observed=True
     )
 
     # Total number of stories per story points per owner (matrix form)
@@ -52,7 +51,8 @@ def calculate_metrics(data, only_closed):
         aggfunc='count',
         fill_value=0,
         margins=True,
-        margins_name='Sum'
+        margins_name='Sum',
+        observed=True
     )
 
     return total_points_per_owner, points_grouped_by_sp_per_owner, total_stories_per_sp_per_owner
@@ -63,7 +63,7 @@ def main():
     # Fetch data from the backend
     st.write("Loading data...")
     if st.button("Reload Data"):
-        st.cache_data.clear()
+        api_client.clear()
         #st.experimental_rerun()
     data = fetch_data()
 
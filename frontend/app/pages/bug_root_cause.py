@@ -1,19 +1,19 @@
 import streamlit as st
 import pandas as pd
 import requests
+import api_client
 import plotly.express as px
 
 # Define the backend endpoint
-ENDPOINT = "http://backend:8000/bugsrootcause/rootcause"
+ENDPOINT = "/bugsrootcause/rootcause"
 
 # Page Title
 st.title("Bug Root Cause Analysis")
 
 # Fetch data from the backend
-@st.cache_data(ttl=600)  # Cache data for 10 minutes
 def fetch_data(endpoint):
     try:
-        response = requests.get(endpoint)
+        response = api_client.get(endpoint)
         response.raise_for_status()
         data = response.json()
         return data["root_causes"]
@@ -1,218 +1,49 @@
 import streamlit as st
 import requests
-import pandas as pd
-import altair as alt
-from datetime import datetime
-import plotly.graph_objects as go
+import api_client
+from functools import partial
+from datetime import datetime, timedelta
+from bug_charts import draw_daily, draw_weekly, fetch_created_vs_resolved
 
-# API Base URL
-API_BASE_URL = "http://backend:8000/bugsproduct"  # Replace with your actual API base URL
-
-# Function to fetch data from the `/bugs-per-day` endpoint
-def fetch_bugs_per_day():
-    try:
-        response = requests.get(f"{API_BASE_URL}/bugs-per-day")
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching daily data: {e}")
-        return None
-
-# Function to fetch data from the `/bugs-per-week` endpoint
-def fetch_bugs_per_week(product=None):
+# Projects grouped by product, from the backend's products table
+def fetch_projects():
     try:
-        url = f"{API_BASE_URL}/bugs-per-week"
-        if product:
-            url += f"?product={product}"
-        response = requests.get(url)
+        response = api_client.get("/products")
         response.raise_for_status()
-        return response.json()
+        return [project for projects in response.json().values() for project in projects]
     except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching weekly data: {e}")
-        return None
-
-# Function to filter data by date range
-def filter_date_range(df, start_date, end_date, date_col):
-    df[date_col] = pd.to_datetime(df[date_col])
-    return df[(df[date_col] >= start_date) & (df[date_col] <= end_date)]
+        st.error(f"Error fetching projects: {e}")
+        return []
 
 # Main Streamlit application
 def main():
-    st.title("Bug Statistics")
-
-    # Generate the date range from July 15, 2024, to the current date
-    start_date = "2024-07-15"
-    end_date = "2024-12-02"
-    date_range = pd.date_range(start=start_date, end=end_date)
+    st.title("Bug Statistics per Project")
 
-    # Create a DataFrame with all days in the date range
-    date_df = pd.DataFrame({'date': date_range})
+    # Date range for the charts (the backend fills in empty days/weeks)
+    end_date = datetime.now().date()
+    start_date = st.sidebar.date_input("Start Date", end_date - timedelta(weeks=20))
+    end_date = st.sidebar.date_input("End Date", end_date)
 
     # Product selection dropdown
-    projects = ["All", "SLY", "FFF", "EXW", "SMY", "PB", "AAV", "ISY"]  # Add product names here or fetch them dynamically if needed
+    projects = ["All"] + fetch_projects()
     selected_projects = st.selectbox("Select a Project", projects)
+    project = None if selected_projects == "All" else selected_projects
 
     # Tabs for daily and weekly data
     tab1, tab2 = st.tabs(["Daily Data", "Weekly Data"])
-
-    daily_data = fetch_bugs_per_day()
-
-    # Daily Data Tab
-    with tab1:
-        project=None if selected_projects == "All" else selected_projects
-
-        if daily_data:
-            # Prepare dataframes for created and resolved data
-            created_df = pd.DataFrame(daily_data["created_per_day"])
-            resolved_df = pd.DataFrame(daily_data["resolved_per_day"])
-
-            #st.dataframe(created_df)
-
-            if project != None:
-                created_df = created_df[created_df["project"]==project]
-                resolved_df = resolved_df[resolved_df["project"]==project]
-            else:
-                created_df = created_df.groupby('day').agg(created_count=('created_count', 'sum')).reset_index()
-                resolved_df = resolved_df.groupby('day').agg(resolved_count=('resolved_count', 'sum')).reset_index()
-            
-            #st.dataframe(created_df)
-
-            # Ensure that the 'date' column in date_df and the keys in created_df and resolved_df are datetime
-            date_df['date'] = pd.to_datetime(date_df['date'])
-            created_df['day'] = pd.to_datetime(created_df['day'])
-            resolved_df['day'] = pd.to_datetime(resolved_df['day'])
-
-            # Merge the date_df with created_df to get the count for created issues
-            created_df = date_df.merge(created_df, left_on='date', right_on='day', how='left')
-            created_df = created_df.rename(columns={'count': 'created_count'}).drop(columns=['day'])
-
-            # Merge the date_df with resolved_df to get the count for resolved issues
-            resolved_df = date_df.merge(resolved_df, left_on='date', right_on='day', how='left')
-            resolved_df = resolved_df.rename(columns={'count': 'resolved_count'}).drop(columns=['day'])
-
-            # Merge the created_df and resolved_df to get the final DataFrame
-            final_df = pd.merge(created_df, resolved_df, on='date', how='outer')
-
-            # Fill NaN values with 0 (no issues created or resolved on that day)
-            final_df.fillna(0, inplace=True)
-
-            # Create a Plotly figure
-            fig = go.Figure()
-
-            # Add the first data series to the plot
-            fig.add_trace(
-                go.Scatter(
-                    x=final_df['date'],
-                    y=final_df['created_count'],
-                    mode='lines+markers',
-                    name='Created'
-                )
-            )
-
-            # Add the second data series to the plot
-            fig.add_trace(
-                go.Scatter(
-                    x=final_df['date'],
-                    y=final_df['resolved_count'],
-                    mode='lines+markers',
-                    name='Resolved'
-                )
-            )
-
-            # Customize the chart
-            fig.update_layout(
-                title='',
-                xaxis_title='Date',
-                yaxis_title='Value',
-                template='plotly_dark',  # You can change the template to 'plotly', 'ggplot2', etc.
-                xaxis=dict(tickangle=45),  # Rotate x-axis labels for better readability
-            )
-
-            # Display the plot in Streamlit
-            st.plotly_chart(fig)
-
-    # Weekly Data Tab
-    with tab2:
-        #weekly_data = fetch_bugs_per_week(product=None if selected_product == "All" else selected_product)
-
-        if daily_data:
-            # Prepare dataframes for created and resolved data
-            created_df = pd.DataFrame(daily_data["created_per_day"])
-            resolved_df = pd.DataFrame(daily_data["resolved_per_day"])
-
-            #st.dataframe(created_df)
-
-            if project != None:
-                created_df = created_df[created_df["project"]==project]
-                resolved_df = resolved_df[resolved_df["project"]==project]
-            else:
-                created_df = created_df.groupby('day').agg(created_count=('created_count', 'sum')).reset_index()
-                resolved_df = resolved_df.groupby('day').agg(resolved_count=('resolved_count', 'sum')).reset_index()
-            
-            #st.dataframe(created_df)
-
-            # Ensure that the 'date' column in date_df and the keys in created_df and resolved_df are datetime
-            date_df['date'] = pd.to_datetime(date_df['date'])
-            created_df['day'] = pd.to_datetime(created_df['day'])
-            resolved_df['day'] = pd.to_datetime(resolved_df['day'])
-
-            # Merge the date_df with created_df to get the count for created issues
-            created_df = date_df.merge(created_df, left_on='date', right_on='day', how='left')
-            created_df = created_df.rename(columns={'count': 'created_count'}).drop(columns=['day'])
-
-            # Merge the date_df with resolved_df to get the count for resolved issues
-            resolved_df = date_df.merge(resolved_df, left_on='date', right_on='day', how='left')
-            resolved_df = resolved_df.rename(columns={'count': 'resolved_count'}).drop(columns=['day'])
-
-            # Merge the created_df and resolved_df to get the final DataFrame
-            final_df = pd.merge(created_df, resolved_df, on='date', how='outer')
-
-            # Fill NaN values with 0 (no issues created or resolved on that day)
-            final_df.fillna(0, inplace=True)
-
-            # Group the data by week starting from July 15, 2024, and aggregate counts
-            final_df['week_start'] = final_df['date'].dt.to_period('W').dt.start_time  # Set week start dates
-
-            # Aggregating counts by week
-            weekly_data = final_df.groupby('week_start').agg(
-                created_count=('created_count', 'sum'),
-                resolved_count=('resolved_count', 'sum')
-            ).reset_index()
-
-            # Create a Plotly figure
-            fig = go.Figure()
-
-            # Add the first data series (created count) to the plot
-            fig.add_trace(
-                go.Bar(
-                    x=weekly_data['week_start'],
-                    y=weekly_data['created_count'],
-                    name='Created Count',
-                    marker_color='blue'
-                )
-            )
-
-            # Add the second data series (resolved count) to the plot
-            fig.add_trace(
-                go.Bar(
-                    x=weekly_data['week_start'],
-                    y=weekly_data['resolved_count'],
-                    name='Resolved Count',
-                    marker_color='orange'
-                )
-            )
-
-            # Customize the chart
-            fig.update_layout(
-                title='',
-                xaxis_title='Week Starting Date',
-                yaxis_title='Count',
-                template='plotly_dark',
-                xaxis=dict(tickangle=45, type='category'),  # Adjust x-axis type for datetime display
-            )
-
-            # Display the plot in Streamlit
-            st.plotly_chart(fig)
+    sections = {"day": (tab1.empty(), draw_daily), "week": (tab2.empty(), draw_weekly)}
+    for placeholder, _ in sections.values():
+        placeholder.info("Loading...")
+
+    # Both series load at once; each tab is drawn as soon as its own data arrives
+    calls = {bucket: partial(fetch_created_vs_resolved, start_date, end_date, bucket, project) for bucket in sections}
+    for bucket, future in api_client.load_all(calls):
+        placeholder, draw = sections[bucket]
+        with placeholder.container():
+            try:
+                draw(future.result())
+            except requests.exceptions.RequestException as e:
+                st.error(f"Error fetching {bucket} data: {e}")
 
 if __name__ == "__main__":
     main()
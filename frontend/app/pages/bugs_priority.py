@@ -1,12 +1,13 @@
 import streamlit as st
 import requests
+import api_client
 import pandas as pd
 import plotly.express as px
 
 def fetch_data(api_url):
     """Fetch data from the backend API."""
     try:
-        response = requests.get(api_url)
+        response = api_client.get(api_url)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -27,7 +28,7 @@ def main():
     st.title("Stacked Bar Chart per Project")
 
     # API endpoint URL
-    api_url = st.text_input("Enter the API endpoint URL:", "http://backend:8000/bugspriorityproject/priority")
+    api_url = st.text_input("Enter the API endpoint URL:", api_client.url("/bugspriorityproject/priority"))
 
     if api_url:
         # Fetch data from the API
@@ -1,14 +1,14 @@
 import pandas as pd
-import requests
+import api_client
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 
-API_URL = "http://backend:8000/timestatus/stories"
+API_URL = "/timestatus/stories/by-assignee"
 
 # Fetch data from the API
 def fetch_average_time():
-    response = requests.get(API_URL)
+    response = api_client.get(API_URL)
     if response.status_code == 200:
         return response.json()
     else:
@@ -27,12 +27,13 @@ def main():
 
     # Convert raw data to a DataFrame
     df = pd.DataFrame(raw_data)
-    
 
-    # Calculate time in progress per story point per owner
-    df['time_per_story_point_owner'] = df['working_hours'] / df['story_points']
+    # A story worked on by several assignees counts for each of them by their
+    # share of its hours, so its points are not counted twice
+    issue_hours = df.groupby("issue_id")["working_hours"].transform("sum")
+    df["story_points"] = (df["story_points"] * df["working_hours"] / issue_hours).fillna(0)
     grouped_df = (
-        df.groupby(["owner","product"], as_index=False)
+        df.groupby(["assignee","product"], as_index=False)
         .agg({"working_hours": "sum", "story_points":"sum"})
     )
     grouped_df = grouped_df[grouped_df["working_hours"] != 0]
@@ -46,13 +47,13 @@ def main():
     grouped_df = grouped_df.sort_values(by='average_time_per_sp', ascending=True)
 
     # Display owner metrics as a table
-    st.subheader("Average Time in Progress per Story Point per Owner")
+    st.subheader("Average Time in Progress per Story Point per Assignee")
     st.dataframe(grouped_df)
 
     # Plot average time per story point per owner
-    fig_owner = px.bar(grouped_df, x='owner', y='average_time_per_sp',
-                       title="Average Time in Progress per Story Point per Owner",
-                       labels={'average_time_per_sp': 'Average Time (hours)', 'owner': 'Owner'})
+    fig_owner = px.bar(grouped_df, x='assignee', y='average_time_per_sp',
+                       title="Average Time in Progress per Story Point per Assignee",
+                       labels={'average_time_per_sp': 'Average Time (hours)', 'assignee': 'Assignee'})
     
     # Add benchmark line
     fig_owner.add_hline(
@@ -89,9 +90,9 @@ def main():
     grouped_df = grouped_df.sort_values(by='story_points', ascending=False)
 
     # Plot average time per story point per owner
-    fig_owner_sp = px.bar(grouped_df, x='owner', y='story_points',
-                       title="Total Story Point per Owner",
-                       labels={'story_points': 'Average Time (hours)', 'owner': 'Owner'})
+    fig_owner_sp = px.bar(grouped_df, x='assignee', y='story_points',
+                       title="Total Story Point per Assignee",
+                       labels={'story_points': 'Average Time (hours)', 'assignee': 'Assignee'})
     
     # Add benchmark line
     fig_owner_sp.add_hline(
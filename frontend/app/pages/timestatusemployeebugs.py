@@ -1,14 +1,14 @@
 import pandas as pd
-import requests
+import api_client
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 
-API_URL = "http://backend:8000/timestatus/bugs"
+API_URL = "/timestatus/bugs/by-assignee"
 
 # Fetch data from the API
 def fetch_average_time():
-    response = requests.get(API_URL)
+    response = api_client.get(API_URL)
     if response.status_code == 200:
         return response.json()
     else:
@@ -27,16 +27,17 @@ def main():
 
     # Convert raw data to a DataFrame
     df = pd.DataFrame(raw_data)
-    df["count"] = df.apply(
-        lambda row: (1), axis=1
-    ) 
+    # A bug worked on by several assignees counts for each of them by their
+    # share of its hours
+    issue_hours = df.groupby("issue_id")["working_hours"].transform("sum")
+    df["count"] = (df["working_hours"] / issue_hours).fillna(0)
 
     #st.dataframe(df)   
 
     # Calculate time in progress per story point per owner
     #df['time_per_bug_owner'] = df['working_hours'] / df['story_points']
     grouped_df = (
-        df.groupby(["owner","product"], as_index=False)
+        df.groupby(["assignee","product"], as_index=False)
         .agg({"working_hours": "sum", "count":"sum"})
     )
     grouped_df = grouped_df[grouped_df["working_hours"] != 0]
@@ -50,13 +51,13 @@ def main():
     grouped_df = grouped_df.sort_values(by='average_time_per_bug', ascending=True)
 
     # Display owner metrics as a table
-    st.subheader("Average Time in Progress per Bug per Owner")
+    st.subheader("Average Time in Progress per Bug per Assignee")
     st.dataframe(grouped_df)
 
     # Plot average time per story point per owner
-    fig_owner = px.bar(grouped_df, x='owner', y='average_time_per_bug',
-                       title="Average Time in Progress per Bug per Owner",
-                       labels={'average_time_per_bug': 'Average Time (hours)', 'owner': 'Owner'})
+    fig_owner = px.bar(grouped_df, x='assignee', y='average_time_per_bug',
+                       title="Average Time in Progress per Bug per Assignee",
+                       labels={'average_time_per_bug': 'Average Time (hours)', 'assignee': 'Assignee'})
     
     # Add benchmark line
     fig_owner.add_hline(
@@ -93,9 +94,9 @@ def main():
     grouped_df = grouped_df.sort_values(by='count', ascending=False)
 
     # Plot average time per story point per owner
-    fig_owner_bug = px.bar(grouped_df, x='owner', y='count',
-                       title="Total Number of Bugs per Owner",
-                       labels={'count': 'Average Time (hours)', 'owner': 'Owner'})
+    fig_owner_bug = px.bar(grouped_df, x='assignee', y='count',
+                       title="Total Number of Bugs per Assignee",
+                       labels={'count': 'Average Time (hours)', 'assignee': 'Assignee'})
     
     # Add benchmark line
     fig_owner_bug.add_hline(
@@ -0,0 +1,187 @@
+import asyncio
+import contextlib
+import http.server
+import threading
+import time
+import unittest as ut
+from datetime import datetime
+
+import api_client
+import utils
+
+
+class Backend(http.server.BaseHTTPRequestHandler):
+    """Answers every path with one JSON body tagged with the current ETag."""
+
+    protocol_version = "HTTP/1.1"
+    tag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        Backend.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.headers.get("If-None-Match") == Backend.tag:
+            self.send_response(304)
+            self.send_header("ETag", Backend.tag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = ('[{"tag": %s}]' % Backend.tag).encode()
+        self.send_response(200)
+        self.send_header("ETag", Backend.tag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestStaleWhileRevalidate(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Backend)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.saved = (api_client.BACKEND_URL, api_client.DEFAULT_TTL, api_client.STALE_SECONDS)
+        api_client.BACKEND_URL = f"http://127.0.0.1:{self.server.server_port}"
+        api_client.DEFAULT_TTL, api_client.STALE_SECONDS = 0.2, 0.5
+        api_client.clear()
+        Backend.tag = '"v1"'
+        Backend.requests = []
+
+    def tearDown(self):
+        api_client.BACKEND_URL, api_client.DEFAULT_TTL, api_client.STALE_SECONDS = self.saved
+        api_client.clear()
+
+    def wait_for_revalidation(self):
+        deadline = time.monotonic() + 5
+        while api_client._refreshing and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_fresh_response_not_requested_again(self):
+        first = api_client.get("/flow/cfd", params={"project": "FFF"})
+        second = api_client.get("/flow/cfd", params={"project": "FFF"})
+        self.assertIs(second, first)
+        self.assertEqual(first.json(), [{"tag": "v1"}])
+        self.assertEqual(len(Backend.requests), 1)
+
+    def test_parameters_are_part_of_the_key(self):
+        api_client.get("/flow/cfd", params={"project": "FFF"})
+        api_client.get("/flow/cfd", params={"project": "SLY"})
+        self.assertEqual(len(Backend.requests), 2)
+
+    def test_stale_response_returned_while_revalidated(self):
+        first = api_client.get("/flow/cfd")
+        time.sleep(0.3)
+        Backend.tag = '"v2"'
+        stale = api_client.get("/flow/cfd")
+        self.assertIs(stale, first)
+        self.wait_for_revalidation()
+        self.assertEqual(Backend.requests[-1], ("/flow/cfd", '"v1"'))
+        # The revalidated response replaced the stale one
+        self.assertEqual(api_client.get("/flow/cfd").json(), [{"tag": "v2"}])
+        self.assertEqual(len(Backend.requests), 2)
+
+    def test_not_modified_keeps_stored_response(self):
+        first = api_client.get("/flow/cfd")
+        time.sleep(0.3)
+        api_client.get("/flow/cfd")
+        self.wait_for_revalidation()
+        self.assertEqual(Backend.requests[-1], ("/flow/cfd", '"v1"'))
+        self.assertIs(api_client.get("/flow/cfd"), first)
+        self.assertEqual(len(Backend.requests), 2)
+
+    def test_expired_response_revalidated_before_returning(self):
+        first = api_client.get("/flow/cfd")
+        time.sleep(0.8)
+        Backend.tag = '"v2"'
+        response = api_client.get("/flow/cfd")
+        self.assertIsNot(response, first)
+        self.assertEqual(response.json(), [{"tag": "v2"}])
+        self.assertEqual(Backend.requests[-1], ("/flow/cfd", '"v1"'))
+
+    def test_clear_forgets_responses(self):
+        api_client.get("/flow/cfd")
+        api_client.clear()
+        api_client.get("/flow/cfd")
+        self.assertEqual(Backend.requests, [("/flow/cfd", None), ("/flow/cfd", None)])
+
+
+class Record(dict):
+    """Stands in for asyncpg records: keys() and values in column order."""
+
+    def __iter__(self):
+        return iter(self.values())
+
+
+class FakePool:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def fetch(self, query, *args, timeout=None):
+        self.queries.append((query, args))
+        return self.rows
+
+
+class TestDatabaseHelpers(ut.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.pool = FakePool([])
+        self.saved = utils._get_pool
+        utils._get_pool = lambda: (self.loop, self.pool)
+
+    def tearDown(self):
+        utils._get_pool = self.saved
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def test_filters_are_bound_parameters(self):
+        utils.fetch_issues_data(project_filter="FFF", assignee_filter=["alice", "bob"])
+        (query, args), = self.pool.queries
+        self.assertIn("i.project = ANY($1)", query)
+        self.assertIn("COALESCE(s.assignee, b.assignee) = ANY($2)", query)
+        self.assertNotIn("COALESCE(s.status, b.status) = ANY", query)
+        self.assertEqual(args, (["FFF"], ["alice", "bob"]))
+
+    def test_no_filters_no_where(self):
+        utils.fetch_status_history()
+        (query, args), = self.pool.queries
+        self.assertNotIn("WHERE", query)
+        self.assertEqual(args, ())
+
+    def test_empty_result_keeps_typed_columns(self):
+        df = utils.fetch_assignee_history(project_filter=["FFF"])
+        self.assertEqual(list(df.columns), ["issue_id", "changed_at", "from_assignee", "to_assignee"])
+        self.assertEqual(str(df["changed_at"].dtype), "datetime64[ns]")
+        self.assertEqual(str(df["to_assignee"].dtype), "category")
+
+    def test_rows_converted_to_dtypes(self):
+        self.pool.rows = [
+            Record(issue_id="1", changed_at=datetime(2024, 3, 1, 9), from_status="To Do", to_status="Done"),
+            Record(issue_id="2", changed_at=datetime(2024, 3, 2, 9), from_status="To Do", to_status="To Do"),
+        ]
+        df = utils.fetch_status_history()
+        self.assertEqual(df["issue_id"].tolist(), ["1", "2"])
+        self.assertEqual(str(df["to_status"].dtype), "category")
+        self.assertEqual(df["changed_at"].iloc[1], datetime(2024, 3, 2, 9))
+
+    def test_untyped_query_takes_columns_from_rows(self):
+        self.pool.rows = [Record(project="FFF", issues=3)]
+        df = utils.fetch_frame("SELECT project, COUNT(*) AS issues FROM issues GROUP BY project")
+        self.assertEqual(df.to_dict("records"), [{"project": "FFF", "issues": 3}])
+
+
+if __name__ == "__main__":
+    ut.main()
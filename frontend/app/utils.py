@@ -1,75 +1,143 @@
 import asyncio
+import os
+import threading
 import asyncpg
 import pandas as pd
 
-# Database configuration
-DB_CONFIG = {
-    "user": "postgres",
-    "password": "password",
-    "database": "jira_data",
-    "host": "db",
-    "port": 5432,
+# Direct database access for pages that need data no endpoint serves.
+#
+# Streamlit runs every script rerun on its own thread, while an asyncpg pool
+# belongs to the event loop it was created on. So one event loop runs in a
+# daemon thread for the whole process and owns one pool; the helpers below are
+# plain functions that hand their query to that loop and wait for the result.
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:password@db:5432/jira_data")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 5))
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", 60))
+
+_loop = None
+_pool = None
+_lock = threading.Lock()
+
+
+def _get_pool():
+    """The process-wide loop and pool, started on first use."""
+    global _loop, _pool
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="db-pool", daemon=True).start()
+            _loop = loop
+        if _pool is None:
+            _pool = asyncio.run_coroutine_threadsafe(
+                asyncpg.create_pool(DATABASE_URL, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE),
+                _loop,
+            ).result()
+    return _loop, _pool
+
+
+async def _fetch(pool, query, args):
+    async with pool.acquire() as connection:
+        return await connection.fetch(query, *args, timeout=DB_QUERY_TIMEOUT)
+
+
+def fetch_frame(query, *args, dtypes=None):
+    """
+    Run a parameterized query ($1, $2, ... placeholders) on the shared pool and
+    return the rows as a DataFrame. dtypes ({column: dtype}) fixes the columns
+    and their types, so an empty result still has them.
+    """
+    loop, pool = _get_pool()
+    rows = asyncio.run_coroutine_threadsafe(_fetch(pool, query, args), loop).result()
+    if dtypes is not None:
+        columns = list(dtypes)
+    else:
+        columns = list(rows[0].keys()) if rows else []
+    df = pd.DataFrame([tuple(row) for row in rows], columns=columns)
+    return df.astype(dtypes) if dtypes else df
+
+
+def _any_of(conditions, params, column, values):
+    """column = ANY($n) for a value or a list of values; nothing for None."""
+    if values is None:
+        return
+    if isinstance(values, str):
+        values = [values]
+    params.append(list(values))
+    conditions.append(f"{column} = ANY(${len(params)})")
+
+
+def _where(conditions):
+    return "WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+ISSUE_DTYPES = {
+    "issue_id": "object",
+    "key": "object",
+    "summary": "object",
+    "owner": "category",
+    "issue_type": "category",
+    "project": "category",
+    "product": "category",
+    "created": "datetime64[ns]",
+    "resolutiondate": "datetime64[ns]",
+    "resolution": "category",
+    "status": "category",
+    "assignee": "category",
+    "story_points": "Int64",
 }
 
-# Helper function to create a database connection
-async def get_db_connection():
-    return await asyncpg.connect(**DB_CONFIG)
-
-# Fetch issues data
-async def fetch_issues_data(project_filter=None, status_filter=None, assignee_filter=None):
-    query = "SELECT * FROM issues WHERE 1=1"
-    params = []
-    
-    if project_filter:
-        query += " AND project = $1"
-        params.append(project_filter)
-    if status_filter:
-        query += f" AND status = ${len(params) + 1}"
-        params.append(status_filter)
-    if assignee_filter:
-        query += f" AND assignee = ${len(params) + 1}"
-        params.append(assignee_filter)
-
-    conn = await get_db_connection()
-    rows = await conn.fetch(query, *params)
-    await conn.close()
-    
-    return pd.DataFrame(rows)
+# Fetch issues with the status and assignee of their story or bug row
+def fetch_issues_data(project_filter=None, status_filter=None, assignee_filter=None):
+    conditions, params = [], []
+    _any_of(conditions, params, "i.project", project_filter)
+    _any_of(conditions, params, "COALESCE(s.status, b.status)", status_filter)
+    _any_of(conditions, params, "COALESCE(s.assignee, b.assignee)", assignee_filter)
+    query = f"""
+        SELECT
+            i.issue_id, i.key, i.summary, i.owner, i.issue_type, i.project, p.product,
+            i.created, i.resolutiondate, i.resolution,
+            COALESCE(s.status, b.status) AS status,
+            COALESCE(s.assignee, b.assignee) AS assignee,
+            s.story_points
+        FROM issues i
+        LEFT JOIN stories s ON s.issue_id = i.issue_id
+        LEFT JOIN bugs b ON b.issue_id = i.issue_id
+        LEFT JOIN products p ON p.project = i.project
+        {_where(conditions)}
+    """
+    return fetch_frame(query, *params, dtypes=ISSUE_DTYPES)
 
 # Fetch status history data
-async def fetch_status_history(project_filter=None):
-    query = """
-        SELECT h.issue_id, h.status, h.changed_at
-        FROM issue_status_history h
+def fetch_status_history(project_filter=None):
+    conditions, params = [], []
+    _any_of(conditions, params, "i.project", project_filter)
+    query = f"""
+        SELECT h.issue_id, h.changed_at, h.from_status, h.to_status
+        FROM status_history h
         JOIN issues i ON h.issue_id = i.issue_id
-        WHERE 1=1
+        {_where(conditions)}
+        ORDER BY h.issue_id, h.changed_at
     """
-    params = []
-    if project_filter:
-        query += " AND i.project = $1"
-        params.append(project_filter)
-    
-    conn = await get_db_connection()
-    rows = await conn.fetch(query, *params)
-    await conn.close()
-    
-    return pd.DataFrame(rows,columns=["issue_id","status","changed_at"])
+    return fetch_frame(
+        query,
+        *params,
+        dtypes={"issue_id": "object", "changed_at": "datetime64[ns]", "from_status": "category", "to_status": "category"},
+    )
 
 # Fetch assignee history data
-async def fetch_assignee_history(project_filter=None):
-    query = """
-        SELECT h.issue_id, h.assignee, h.changed_at
-        FROM issue_assignee_history h
+def fetch_assignee_history(project_filter=None):
+    conditions, params = [], []
+    _any_of(conditions, params, "i.project", project_filter)
+    query = f"""
+        SELECT h.issue_id, h.changed_at, h.from_assignee, h.to_assignee
+        FROM assignee_history h
         JOIN issues i ON h.issue_id = i.issue_id
-        WHERE 1=1
+        {_where(conditions)}
+        ORDER BY h.issue_id, h.changed_at
     """
-    params = []
-    if project_filter:
-        query += " AND i.project = $1"
-        params.append(project_filter)
-    
-    conn = await get_db_connection()
-    rows = await conn.fetch(query, *params)
-    await conn.close()
-    
-    return pd.DataFrame(rows)
+    return fetch_frame(
+        query,
+        *params,
+        dtypes={"issue_id": "object", "changed_at": "datetime64[ns]", "from_assignee": "category", "to_assignee": "category"},
+    )